@@ -1,9 +1,15 @@
+import json
 import sqlite3
 import sys
 import os
 from pathlib import Path
 from datetime import datetime
 
+from app.services.payload_codec import encode_payload, is_compact
+from app.services.profiler import PROFILER
+from app.services.storage import SESSION_ID, driver_from_url, tag_feed_writer
+from app.services.validators import parse_depths
+
 
 def _resolve_db_path():
     # In a frozen executable, keep DB in a persistent user location.
@@ -15,20 +21,88 @@ def _resolve_db_path():
 
 DB_PATH = _resolve_db_path()
 
+# None means the local SQLite file at DB_PATH; see configure_backend.
+_DRIVER = None
+# Set once init_db has brought the schema current, so change_feed.writer exists.
+_TAG_FEED_WRITES = False
+
+
+def configure_backend(url=None):
+    """
+    Points get_connection at the database named by `url` (or GEOLAB_DB_URL):
+    sqlite:///path/to/geolab.db for another local file, or
+    geolab://host:port for a database served by `python -m app.main serve`.
+    Without a URL the default local file is used.
+    """
+    global _DRIVER
+    url = url or os.getenv("GEOLAB_DB_URL")
+    _DRIVER = driver_from_url(url) if url else None
+
+
+def describe_backend():
+    return _DRIVER.describe() if _DRIVER is not None else str(DB_PATH)
+
+
+def is_local_backend():
+    return _DRIVER is None or _DRIVER.name == "sqlite"
+
 
 def get_connection():
+    if _DRIVER is not None:
+        conn = _DRIVER.connect()
+        # A served database stamps writes with the id sent in the client's hello.
+        if _TAG_FEED_WRITES and _DRIVER.name == "sqlite":
+            tag_feed_writer(conn, SESSION_ID)
+        return PROFILER.wrap(conn)
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+    if _TAG_FEED_WRITES:
+        tag_feed_writer(conn, SESSION_ID)
+    return PROFILER.wrap(conn)
 
 
 def init_db():
+    """Bring the database schema up to SCHEMA_VERSION.
+
+    The applied version is stored in PRAGMA user_version, so a current
+    database costs one PRAGMA read at startup. Pending steps from MIGRATIONS
+    run in order inside one transaction; a failing step leaves the database
+    at its previous version.
+    """
+    global _TAG_FEED_WRITES
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("PRAGMA foreign_keys = ON;")
+    try:
+        if _schema_version(conn) >= SCHEMA_VERSION:
+            _TAG_FEED_WRITES = True
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock in case another instance migrated.
+            version = _schema_version(conn)
+            cur = conn.cursor()
+            for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+                step(cur)
+                cur.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+            _TAG_FEED_WRITES = True
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+
 
+def _schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _migrate_base(cur):
+    # Version 1 is the schema as it stood before versioning. Databases created
+    # by older builds report user_version 0, so this step is idempotent: tables
+    # are created if missing and the legacy column probes add what an old file
+    # lacks.
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS projects (
@@ -137,9 +211,6 @@ def init_db():
     _seed_tests(cur)
     _seed_rate_prices(cur)
 
-    conn.commit()
-    conn.close()
-
 
 def now_iso():
     return datetime.now().isoformat(timespec="seconds")
@@ -168,20 +239,115 @@ def set_app_setting(key, value):
     conn.close()
 
 
-def backup_database(target_dir):
-    out_dir = Path(target_dir).expanduser().resolve()
-    out_dir.mkdir(parents=True, exist_ok=True)
-    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_path = out_dir / f"geolab_backup_{stamp}.db"
+# Per-project aggregate over sample_tests; the source of truth the maintained
+# project_progress counters are rebuilt from and checked against.
+_PROGRESS_AGGREGATE_SQL = """
+    SELECT s.project_id,
+           SUM(CASE WHEN st.status IS NULL OR st.status != 'completed' THEN 1 ELSE 0 END) AS remaining_tests,
+           SUM(CASE WHEN st.status = 'completed' THEN 1 ELSE 0 END) AS completed_tests,
+           SUM(st.cost) AS billed_total
+    FROM sample_tests st
+    JOIN samples s ON s.id = st.sample_id
+    GROUP BY s.project_id
+"""
 
-    src = get_connection()
-    dst = sqlite3.connect(str(out_path))
-    try:
-        src.backup(dst)
-    finally:
-        dst.close()
-        src.close()
-    return out_path
+
+def check_project_progress():
+    """Compare the maintained project_progress counters against a full recount.
+
+    Returns a list of dicts (one per mismatched project) with the stored and
+    expected values; an empty list means the counters are consistent.
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT p.id AS project_id, p.file_number,
+               pp.remaining_tests, pp.completed_tests, pp.billed_total,
+               agg.remaining_tests AS expected_remaining,
+               agg.completed_tests AS expected_completed,
+               agg.billed_total AS expected_billed
+        FROM projects p
+        LEFT JOIN project_progress pp ON pp.project_id = p.id
+        LEFT JOIN ({_PROGRESS_AGGREGATE_SQL}) agg ON agg.project_id = p.id
+        """
+    ).fetchall()
+    conn.close()
+
+    mismatches = []
+    for r in rows:
+        expected = (
+            r["expected_remaining"] or 0,
+            r["expected_completed"] or 0,
+            round(r["expected_billed"] or 0.0, 2),
+        )
+        stored = None
+        if r["remaining_tests"] is not None:
+            stored = (r["remaining_tests"], r["completed_tests"], round(r["billed_total"] or 0.0, 2))
+        if stored != expected:
+            mismatches.append(
+                {
+                    "project_id": r["project_id"],
+                    "file_number": r["file_number"],
+                    "stored": stored,
+                    "expected": expected,
+                }
+            )
+    return mismatches
+
+
+def rebuild_project_progress():
+    conn = get_connection()
+    _rebuild_project_progress(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def _rebuild_project_progress(cur):
+    cur.execute("DELETE FROM project_progress;")
+    cur.execute(
+        f"""
+        INSERT INTO project_progress (project_id, remaining_tests, completed_tests, billed_total)
+        SELECT p.id,
+               COALESCE(agg.remaining_tests, 0),
+               COALESCE(agg.completed_tests, 0),
+               COALESCE(agg.billed_total, 0.0)
+        FROM projects p
+        LEFT JOIN ({_PROGRESS_AGGREGATE_SQL}) agg ON agg.project_id = p.id
+        """
+    )
+
+
+def backfill_sample_depths(reparse_all=False):
+    """Parse depth_raw into depth_from/depth_to/depth_unit in one pass.
+
+    By default only rows whose depth_from is still NULL are parsed; pass
+    reparse_all=True to re-derive every row (e.g. after the parser learns a
+    new format). Returns (updated, unparsed).
+    """
+    where = "depth_raw IS NOT NULL AND TRIM(depth_raw) <> ''"
+    if not reparse_all:
+        where += " AND depth_from IS NULL"
+    conn = get_connection()
+    rows = conn.execute(
+        f"SELECT id, depth_raw, depth_from, depth_to, depth_unit FROM samples WHERE {where}"
+    ).fetchall()
+    froms, tos, units = parse_depths(r["depth_raw"] for r in rows)
+
+    updates = []
+    unparsed = 0
+    for r, depth_from, depth_to, unit in zip(rows, froms, tos, units):
+        if depth_from is None:
+            unparsed += 1
+            continue
+        if (r["depth_from"], r["depth_to"], r["depth_unit"]) != (depth_from, depth_to, unit):
+            updates.append((depth_from, depth_to, unit, r["id"]))
+    conn.executemany(
+        "UPDATE samples SET depth_from = ?, depth_to = ?, depth_unit = ? WHERE id = ?",
+        updates,
+    )
+    conn.commit()
+    conn.close()
+    return len(updates), unparsed
 
 
 def _seed_tests(cur):
@@ -327,6 +493,16 @@ def _migrate_projects(cur):
         cur.execute("ALTER TABLE projects ADD COLUMN latitude REAL;")
     if "longitude" not in cols:
         cur.execute("ALTER TABLE projects ADD COLUMN longitude REAL;")
+    # Covers the default newest-first project list page (and the map list) so
+    # it is read straight from the index without touching the table.
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_projects_created_cover ON projects(
+            created_at, id, file_number, job_name, client_type, billing_rate_id,
+            location_text, status, latitude, longitude
+        );
+        """
+    )
 
 
 def _migrate_samples(cur):
@@ -400,3 +576,734 @@ def _migrate_settings(cur):
         );
         """
     )
+
+
+def _migrate_templates(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS test_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at TEXT NOT NULL
+        );
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS test_template_items (
+            template_id INTEGER NOT NULL,
+            test_id INTEGER NOT NULL,
+            PRIMARY KEY(template_id, test_id),
+            FOREIGN KEY(template_id) REFERENCES test_templates(id) ON DELETE CASCADE,
+            FOREIGN KEY(test_id) REFERENCES tests(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+def _migrate_progress(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS project_progress (
+            project_id INTEGER PRIMARY KEY,
+            remaining_tests INTEGER NOT NULL DEFAULT 0,
+            completed_tests INTEGER NOT NULL DEFAULT 0,
+            billed_total REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY(project_id) REFERENCES projects(id) ON DELETE CASCADE
+        );
+        """
+    )
+
+    # Counters are kept current by triggers so every write path (including the
+    # inline SQL in the UI tabs) maintains them without extra code.
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_progress_project_insert
+        AFTER INSERT ON projects
+        BEGIN
+            INSERT OR IGNORE INTO project_progress (project_id) VALUES (NEW.id);
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_progress_sample_test_insert
+        AFTER INSERT ON sample_tests
+        BEGIN
+            UPDATE project_progress
+            SET remaining_tests = remaining_tests + (CASE WHEN NEW.status IS NULL OR NEW.status != 'completed' THEN 1 ELSE 0 END),
+                completed_tests = completed_tests + (CASE WHEN NEW.status = 'completed' THEN 1 ELSE 0 END),
+                billed_total = billed_total + NEW.cost
+            WHERE project_id = (SELECT project_id FROM samples WHERE id = NEW.sample_id);
+        END;
+        """
+    )
+    # When a sample is deleted its row is gone before the cascade removes its
+    # sample_tests, so this trigger finds no project and the sample-level
+    # trigger below accounts for the removed tests instead.
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_progress_sample_test_delete
+        AFTER DELETE ON sample_tests
+        BEGIN
+            UPDATE project_progress
+            SET remaining_tests = remaining_tests - (CASE WHEN OLD.status IS NULL OR OLD.status != 'completed' THEN 1 ELSE 0 END),
+                completed_tests = completed_tests - (CASE WHEN OLD.status = 'completed' THEN 1 ELSE 0 END),
+                billed_total = billed_total - OLD.cost
+            WHERE project_id = (SELECT project_id FROM samples WHERE id = OLD.sample_id);
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_progress_sample_test_update
+        AFTER UPDATE OF sample_id, status, cost ON sample_tests
+        BEGIN
+            UPDATE project_progress
+            SET remaining_tests = remaining_tests - (CASE WHEN OLD.status IS NULL OR OLD.status != 'completed' THEN 1 ELSE 0 END),
+                completed_tests = completed_tests - (CASE WHEN OLD.status = 'completed' THEN 1 ELSE 0 END),
+                billed_total = billed_total - OLD.cost
+            WHERE project_id = (SELECT project_id FROM samples WHERE id = OLD.sample_id);
+            UPDATE project_progress
+            SET remaining_tests = remaining_tests + (CASE WHEN NEW.status IS NULL OR NEW.status != 'completed' THEN 1 ELSE 0 END),
+                completed_tests = completed_tests + (CASE WHEN NEW.status = 'completed' THEN 1 ELSE 0 END),
+                billed_total = billed_total + NEW.cost
+            WHERE project_id = (SELECT project_id FROM samples WHERE id = NEW.sample_id);
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_progress_sample_delete
+        BEFORE DELETE ON samples
+        BEGIN
+            UPDATE project_progress
+            SET remaining_tests = remaining_tests - (
+                    SELECT COUNT(1) FROM sample_tests
+                    WHERE sample_id = OLD.id AND (status IS NULL OR status != 'completed')
+                ),
+                completed_tests = completed_tests - (
+                    SELECT COUNT(1) FROM sample_tests WHERE sample_id = OLD.id AND status = 'completed'
+                ),
+                billed_total = billed_total - (
+                    SELECT COALESCE(SUM(cost), 0) FROM sample_tests WHERE sample_id = OLD.id
+                )
+            WHERE project_id = OLD.project_id;
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_progress_sample_move
+        AFTER UPDATE OF project_id ON samples
+        WHEN OLD.project_id IS NOT NEW.project_id
+        BEGIN
+            UPDATE project_progress
+            SET remaining_tests = remaining_tests - (
+                    SELECT COUNT(1) FROM sample_tests
+                    WHERE sample_id = NEW.id AND (status IS NULL OR status != 'completed')
+                ),
+                completed_tests = completed_tests - (
+                    SELECT COUNT(1) FROM sample_tests WHERE sample_id = NEW.id AND status = 'completed'
+                ),
+                billed_total = billed_total - (
+                    SELECT COALESCE(SUM(cost), 0) FROM sample_tests WHERE sample_id = NEW.id
+                )
+            WHERE project_id = OLD.project_id;
+            UPDATE project_progress
+            SET remaining_tests = remaining_tests + (
+                    SELECT COUNT(1) FROM sample_tests
+                    WHERE sample_id = NEW.id AND (status IS NULL OR status != 'completed')
+                ),
+                completed_tests = completed_tests + (
+                    SELECT COUNT(1) FROM sample_tests WHERE sample_id = NEW.id AND status = 'completed'
+                ),
+                billed_total = billed_total + (
+                    SELECT COALESCE(SUM(cost), 0) FROM sample_tests WHERE sample_id = NEW.id
+                )
+            WHERE project_id = NEW.project_id;
+        END;
+        """
+    )
+
+    # Existing databases get their counters populated once from a full recount.
+    counts = cur.execute(
+        """
+        SELECT (SELECT COUNT(1) FROM projects) AS projects,
+               (SELECT COUNT(1) FROM project_progress) AS progress
+        """
+    ).fetchone()
+    if counts["projects"] != counts["progress"]:
+        _rebuild_project_progress(cur)
+
+
+# Columns whose previous values are kept in change_log, per audited table:
+# (key column used as entity_id, plain columns, JSON payload columns).
+CHANGE_LOG_TABLES = {
+    "sample_tests": (
+        "id",
+        (
+            "cost", "status", "result_summary", "completed_date",
+            "result_value", "result_unit", "result_value2", "result_unit2",
+            "result_value3", "result_unit3", "result_value4", "result_unit4",
+            "result_notes",
+        ),
+        (),
+    ),
+    "worksheet_runs": ("sample_test_id", ("worksheet_key",), ("payload_json",)),
+    "astm1557_runs": ("sample_test_id", ("max_dry_density", "opt_moisture"), ("points_json",)),
+    "grain_size_runs": ("sample_id", (), ("payload_json",)),
+}
+
+_CHANGED_AT_SQL = "strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')"
+
+
+def _migrate_change_log(cur):
+    # Append-only history of result edits. Each row is a before-image: for an
+    # update, only the columns that changed with their old values (JSON
+    # payloads store just the top-level keys that changed); for a delete, the
+    # whole old row; for an insert, nothing. Walking a row's entries newest to
+    # oldest from its current state reconstructs it at any earlier time.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            changed_at TEXT NOT NULL,
+            op TEXT NOT NULL,
+            delta TEXT
+        );
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_change_log_entity ON change_log(entity, entity_id, changed_at);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at);")
+    for table, (key, columns, payload_columns) in CHANGE_LOG_TABLES.items():
+        _create_change_log_triggers(cur, table, key, columns, payload_columns)
+
+
+def _create_change_log_triggers(cur, table, key, columns, payload_columns):
+    tracked = columns + payload_columns
+    full_row = ", ".join(f"'{c}', OLD.{c}" for c in tracked)
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO change_log (entity, entity_id, changed_at, op)
+            VALUES ('{table}', NEW.{key}, {_CHANGED_AT_SQL}, 'I');
+        END;
+        """
+    )
+    _create_change_log_update_trigger(cur, table, key, columns, payload_columns, _payload_delta_sql)
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO change_log (entity, entity_id, changed_at, op, delta)
+            VALUES ('{table}', OLD.{key}, {_CHANGED_AT_SQL}, 'D', json_object({full_row}));
+        END;
+        """
+    )
+
+
+def _create_change_log_update_trigger(cur, table, key, columns, payload_columns, payload_delta):
+    tracked = columns + payload_columns
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in tracked)
+    removals = ", ".join(f"CASE WHEN OLD.{c} IS NEW.{c} THEN '$.{c}' ELSE '$.~' END" for c in tracked)
+    parts = [f"'{c}', OLD.{c}" for c in columns]
+    parts += [f"'{c}', {payload_delta(c)}" for c in payload_columns]
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_update
+        AFTER UPDATE ON {table}
+        WHEN {changed}
+        BEGIN
+            INSERT INTO change_log (entity, entity_id, changed_at, op, delta)
+            VALUES ('{table}', OLD.{key}, {_CHANGED_AT_SQL}, 'U', json_remove(json_object({", ".join(parts)}), {removals}));
+        END;
+        """
+    )
+
+
+def _payload_delta_sql(col):
+    # {"set": {old values of changed or removed keys}, "unset": [added keys]}
+    # when both sides are JSON objects, otherwise the whole old text.
+    return f"""CASE WHEN json_valid(OLD.{col}) AND json_valid(NEW.{col}) THEN
+                CASE WHEN json_type(OLD.{col}) = 'object' AND json_type(NEW.{col}) = 'object' THEN
+                    json_object(
+                        'set', json((
+                            SELECT json_group_object(o.key, o.value) FROM json_each(OLD.{col}) o
+                            WHERE NOT EXISTS (
+                                SELECT 1 FROM json_each(NEW.{col}) n
+                                WHERE n.key = o.key AND n.type = o.type AND n.value IS o.value
+                            )
+                        )),
+                        'unset', json((
+                            SELECT json_group_array(n.key) FROM json_each(NEW.{col}) n
+                            WHERE NOT EXISTS (SELECT 1 FROM json_each(OLD.{col}) o WHERE o.key = n.key)
+                        ))
+                    )
+                ELSE OLD.{col} END
+            ELSE OLD.{col} END"""
+
+
+def _compact_payload_delta_sql(col):
+    # Compact payloads (app.services.payload_codec) keep their fields under
+    # "f", "s" and "e", so those are diffed inside too and a one-field edit
+    # logs that field rather than the whole section. A section appears in
+    # the delta only when it changed; "e" is a list of field names, diffed as
+    # a set ("add" back / "drop" on undo). json_patch onto {} drops the null
+    # members left by unchanged parts. Other payloads use _payload_delta_sql.
+    def changed_keys(path, skip=""):
+        old_src, new_src = f"OLD.{col}, '{path}'", f"NEW.{col}, '{path}'"
+        set_sql = f"""json((
+                        SELECT json_group_object(o.key, o.value) FROM json_each({old_src}) o
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM json_each({new_src}) n
+                            WHERE n.key = o.key AND n.type = o.type AND n.value IS o.value
+                        ){skip.format(t="o")}
+                        HAVING COUNT(*) > 0
+                    ))"""
+        unset_sql = f"""json((
+                        SELECT json_group_array(n.key) FROM json_each({new_src}) n
+                        WHERE NOT EXISTS (SELECT 1 FROM json_each({old_src}) o WHERE o.key = n.key){skip.format(t="n")}
+                        HAVING COUNT(*) > 0
+                    ))"""
+        return f"'set', {set_sql}, 'unset', {unset_sql}"
+
+    def set_members(src, other):
+        return f"""json((
+                        SELECT json_group_array(x.value) FROM json_each({src}, '$.e') x
+                        WHERE x.value NOT IN (SELECT value FROM json_each({other}, '$.e'))
+                        HAVING COUNT(*) > 0
+                    ))"""
+
+    def section(members):
+        return f"json(NULLIF(json_patch('{{}}', json_object({members})), '{{}}'))"
+
+    blanks = f"'add', {set_members(f'OLD.{col}', f'NEW.{col}')}, 'drop', {set_members(f'NEW.{col}', f'OLD.{col}')}"
+    return f"""CASE WHEN json_valid(OLD.{col}) AND json_valid(NEW.{col})
+                AND json_type(OLD.{col}, '$."$v"') IS NOT NULL AND json_type(NEW.{col}, '$."$v"') IS NOT NULL THEN
+                json_patch('{{}}', json_object(
+                    {changed_keys("$", skip=" AND {t}.key NOT IN ('f', 's', 'e')")},
+                    'f', {section(changed_keys("$.f"))},
+                    's', {section(changed_keys("$.s"))},
+                    'e', {section(blanks)}
+                ))
+            ELSE {_payload_delta_sql(col)} END"""
+
+
+# Tables with optimistic-locking row versions, with the columns whose change
+# counts as a new version (bookkeeping such as updated_at does not).
+VERSIONED_TABLES = {
+    "sample_tests": (
+        "sample_id", "test_id", "cost", "status", "result_summary", "completed_date",
+        "result_value", "result_unit", "result_value2", "result_unit2",
+        "result_value3", "result_unit3", "result_value4", "result_unit4",
+        "result_notes",
+    ),
+    "worksheet_runs": ("worksheet_key", "payload_json"),
+    "grain_size_runs": ("payload_json",),
+    "calculations_runs": ("calc_key", "payload_json", "computed_json"),
+}
+
+# Change feed sources: (key column reported as entity_id, project_id expression).
+CHANGE_FEED_TABLES = {
+    "projects": ("id", "{row}.id"),
+    "samples": ("id", "{row}.project_id"),
+    "sample_tests": ("id", "(SELECT project_id FROM samples WHERE id = {row}.sample_id)"),
+    "worksheet_runs": (
+        "sample_test_id",
+        "(SELECT s.project_id FROM sample_tests st JOIN samples s ON s.id = st.sample_id WHERE st.id = {row}.sample_test_id)",
+    ),
+    "astm1557_runs": (
+        "sample_test_id",
+        "(SELECT s.project_id FROM sample_tests st JOIN samples s ON s.id = st.sample_id WHERE st.id = {row}.sample_test_id)",
+    ),
+    "grain_size_runs": ("sample_id", "(SELECT project_id FROM samples WHERE id = {row}.sample_id)"),
+    "calculations_runs": ("project_id", "{row}.project_id"),
+}
+
+
+def _migrate_concurrency(cur):
+    # row_version is bumped by trigger on every real change, so saves can
+    # detect that another workstation wrote the row since it was loaded.
+    # change_feed gets one row per insert/update/delete; clients poll it by
+    # seq and refresh only what changed.
+    for table in VERSIONED_TABLES:
+        cols = [r["name"] for r in cur.execute(f"PRAGMA table_info({table})").fetchall()]
+        if "row_version" not in cols:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0;")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_feed (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            project_id INTEGER,
+            op TEXT NOT NULL
+        );
+        """
+    )
+    for table, (key, project_sql) in CHANGE_FEED_TABLES.items():
+        new_project = project_sql.format(row="NEW")
+        old_project = project_sql.format(row="OLD")
+        versioned = VERSIONED_TABLES.get(table)
+        when = ""
+        bump = ""
+        if versioned:
+            when = "WHEN " + " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in versioned)
+            bump = f"UPDATE {table} SET row_version = OLD.row_version + 1 WHERE rowid = NEW.rowid;"
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_feed_{table}_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO change_feed (entity, entity_id, project_id, op)
+                VALUES ('{table}', NEW.{key}, {new_project}, 'I');
+            END;
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_feed_{table}_update
+            AFTER UPDATE ON {table}
+            {when}
+            BEGIN
+                {bump}
+                INSERT INTO change_feed (entity, entity_id, project_id, op)
+                VALUES ('{table}', NEW.{key}, {new_project}, 'U');
+            END;
+            """
+        )
+        # sample_tests rows removed by a sample delete cascade run after the
+        # sample is gone, so their project_id is NULL; samples' own entry
+        # carries the project.
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_feed_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_feed (entity, entity_id, project_id, op)
+                VALUES ('{table}', OLD.{key}, {old_project}, 'D');
+            END;
+            """
+        )
+
+
+def _migrate_indexes(cur):
+    # The working set loads a project by searching samples on project_id and
+    # joining sample_tests on sample_id; the unique (sample_id, test_id) index
+    # serves that join. It has no ORDER BY: the tabs sort in memory, since an
+    # ORDER BY across the join (sample name, test code) needs a temp B-tree.
+    # Older builds could assign a test to a sample twice. Keep the copy with
+    # worksheet data or results before making the pair unique.
+    cur.execute(
+        """
+        DELETE FROM sample_tests
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT st.id,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY st.sample_id, st.test_id
+                           ORDER BY (
+                               EXISTS (SELECT 1 FROM worksheet_runs w WHERE w.sample_test_id = st.id)
+                               OR EXISTS (SELECT 1 FROM astm1557_runs a WHERE a.sample_test_id = st.id)
+                           ) DESC,
+                           st.result_value IS NOT NULL DESC,
+                           st.status = 'completed' DESC,
+                           st.id
+                       ) AS rn
+                FROM sample_tests st
+                WHERE (st.sample_id, st.test_id) IN (
+                    SELECT sample_id, test_id FROM sample_tests
+                    GROUP BY sample_id, test_id HAVING COUNT(1) > 1
+                )
+            )
+            WHERE rn > 1
+        )
+        """
+    )
+    cur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_sample_tests_sample_test ON sample_tests(sample_id, test_id);"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_project_name ON samples(project_id, sample_name, id);")
+    # Both were left-prefixes of the indexes above.
+    cur.execute("DROP INDEX IF EXISTS idx_sample_tests_sample;")
+    cur.execute("DROP INDEX IF EXISTS idx_samples_project;")
+
+
+def _migrate_sample_test_project(cur):
+    # sample_tests carries its sample's project_id so project-scoped reads and
+    # updates filter sample_tests directly instead of going through samples.
+    # Triggers keep the copy in step when a test moves to another sample or a
+    # sample moves to another project; writers may leave it NULL on insert.
+    cur.execute("ALTER TABLE sample_tests ADD COLUMN project_id INTEGER;")
+    cur.execute(
+        """
+        UPDATE sample_tests
+        SET project_id = (SELECT s.project_id FROM samples s WHERE s.id = sample_tests.sample_id)
+        """
+    )
+    for event in ("INSERT", "UPDATE OF sample_id, project_id"):
+        name = "insert" if event == "INSERT" else "update"
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_sample_tests_project_{name}
+            AFTER {event} ON sample_tests
+            WHEN NEW.project_id IS NOT (SELECT project_id FROM samples WHERE id = NEW.sample_id)
+            BEGIN
+                UPDATE sample_tests
+                SET project_id = (SELECT project_id FROM samples WHERE id = NEW.sample_id)
+                WHERE id = NEW.id;
+            END;
+            """
+        )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_samples_project_move
+        AFTER UPDATE OF project_id ON samples
+        WHEN OLD.project_id IS NOT NEW.project_id
+        BEGIN
+            UPDATE sample_tests SET project_id = NEW.project_id WHERE sample_id = NEW.id;
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_sample_tests_project
+        ON sample_tests(project_id, test_id, sample_id, status, cost);
+        """
+    )
+
+
+def _migrate_compact_payloads(cur):
+    # Rewrites worksheet payloads saved as plain JSON in the compact encoding
+    # (app.services.payload_codec). The change_log entry this writes keeps the
+    # old plain form, so history before the conversion still reads back.
+    for table, key in (("grain_size_runs", "sample_id"), ("worksheet_runs", "sample_test_id")):
+        rows = cur.execute(f"SELECT {key} AS k, payload_json FROM {table}").fetchall()
+        updates = []
+        for r in rows:
+            raw = r["payload_json"]
+            if is_compact(raw):
+                continue
+            try:
+                obj = json.loads(raw) if raw else {}
+            except ValueError:
+                continue
+            if isinstance(obj, dict):
+                updates.append((encode_payload(obj), r["k"]))
+        cur.executemany(f"UPDATE {table} SET payload_json = ? WHERE {key} = ?", updates)
+
+
+def _migrate_project_locations(cur):
+    # R*Tree over project coordinates for bounding-box, radius and nearest
+    # lookups (app.services.spatial). Each project is a point, so its box has
+    # min = max. Builds without the rtree module skip the table and the
+    # service falls back to filtering projects directly.
+    try:
+        cur.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS project_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);"
+        )
+    except sqlite3.OperationalError:
+        return
+    cur.execute("DELETE FROM project_locations;")
+    cur.execute(
+        """
+        INSERT INTO project_locations (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT id, latitude, latitude, longitude, longitude
+        FROM projects
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_project_locations_insert
+        AFTER INSERT ON projects
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO project_locations (id, min_lat, max_lat, min_lon, max_lon)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_project_locations_update
+        AFTER UPDATE OF id, latitude, longitude ON projects
+        BEGIN
+            DELETE FROM project_locations WHERE id = OLD.id;
+            INSERT INTO project_locations (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_project_locations_delete
+        AFTER DELETE ON projects
+        BEGIN
+            DELETE FROM project_locations WHERE id = OLD.id;
+        END;
+        """
+    )
+
+
+def _migrate_result_lookup(cur):
+    # Result lookups across many projects (app.services.nearby_results) read
+    # only rows with a result; the partial index answers them from the index
+    # alone and skips the untested majority of sample_tests.
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_sample_tests_project_results
+        ON sample_tests(project_id, test_id, result_value, result_value2)
+        WHERE result_value IS NOT NULL OR result_value2 IS NOT NULL;
+        """
+    )
+
+
+def _migrate_gradation_metrics(cur):
+    # D10/D30/D60, Cu, Cc and fines per sample, derived from grain_size_runs
+    # by app.services.gradation. run_id/run_version record the run they were
+    # computed from; rows are filled on the first refresh, not here.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS gradation_metrics (
+            sample_id INTEGER PRIMARY KEY,
+            project_id INTEGER NOT NULL,
+            run_id INTEGER NOT NULL,
+            run_version INTEGER NOT NULL,
+            d10 REAL,
+            d30 REAL,
+            d60 REAL,
+            cu REAL,
+            cc REAL,
+            passing_no4 REAL,
+            passing_no200 REAL,
+            computed_at TEXT NOT NULL,
+            FOREIGN KEY(sample_id) REFERENCES samples(id) ON DELETE CASCADE
+        );
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gradation_metrics_project ON gradation_metrics(project_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gradation_metrics_cu ON gradation_metrics(cu);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gradation_metrics_fines ON gradation_metrics(passing_no200);")
+
+
+def _migrate_uscs_classifications(cur):
+    # Batch USCS symbols per sample (app.services.uscs). input_hash covers the
+    # inputs and rules version a symbol was derived from; symbol is NULL with
+    # a note when the results are not enough to classify.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS uscs_classifications (
+            sample_id INTEGER PRIMARY KEY,
+            project_id INTEGER NOT NULL,
+            symbol TEXT,
+            note TEXT,
+            input_hash TEXT NOT NULL,
+            classified_at TEXT NOT NULL,
+            FOREIGN KEY(sample_id) REFERENCES samples(id) ON DELETE CASCADE
+        );
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_uscs_classifications_project ON uscs_classifications(project_id, symbol);"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_uscs_classifications_symbol ON uscs_classifications(symbol);")
+
+
+def _migrate_calibrations(cur):
+    # Shared equipment calibrations (app.services.calibrations). Worksheet
+    # payloads reference one through "calibration_id"; the generated
+    # calibration_id columns expose that reference (compact or legacy
+    # payload) so the runs using a calibration are found by index.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS calibrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            equipment_id TEXT NOT NULL,
+            effective_date TEXT NOT NULL,
+            values_json TEXT NOT NULL,
+            slope REAL,
+            intercept REAL,
+            notes TEXT,
+            updated_at TEXT NOT NULL,
+            UNIQUE(kind, equipment_id, effective_date)
+        );
+        """
+    )
+    reference = (
+        "CASE WHEN json_valid(payload_json) THEN CAST(NULLIF(COALESCE("
+        "json_extract(payload_json, '$.f.calibration_id'), json_extract(payload_json, '$.calibration_id')"
+        "), '') AS INTEGER) END"
+    )
+    for table in ("grain_size_runs", "worksheet_runs"):
+        cols = [r["name"] for r in cur.execute(f"PRAGMA table_xinfo({table})").fetchall()]
+        if "calibration_id" not in cols:
+            cur.execute(
+                f"ALTER TABLE {table} ADD COLUMN calibration_id INTEGER GENERATED ALWAYS AS ({reference}) VIRTUAL;"
+            )
+        cur.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_calibration
+            ON {table}(calibration_id) WHERE calibration_id IS NOT NULL;
+            """
+        )
+    # Other workstations drop their cached calibrations from the change feed.
+    for op, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_feed_calibrations_{op}
+            AFTER {op.upper()} ON calibrations
+            BEGIN
+                INSERT INTO change_feed (entity, entity_id, project_id, op)
+                VALUES ('calibrations', {row}.id, NULL, '{op[0].upper()}');
+            END;
+            """
+        )
+
+
+def _migrate_feed_writer(cur):
+    # Each workstation stamps the feed rows it writes (see tag_feed_writer)
+    # so its poll can skip its own changes.
+    cols = [r["name"] for r in cur.execute("PRAGMA table_info(change_feed)").fetchall()]
+    if "writer" not in cols:
+        cur.execute("ALTER TABLE change_feed ADD COLUMN writer TEXT;")
+
+
+def _migrate_compact_payload_deltas(cur):
+    # Rebuilds the payload update triggers to diff inside compact payloads.
+    for table, (key, columns, payload_columns) in CHANGE_LOG_TABLES.items():
+        if not payload_columns:
+            continue
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_change_log_{table}_update;")
+        _create_change_log_update_trigger(cur, table, key, columns, payload_columns, _compact_payload_delta_sql)
+
+
+# Ordered schema steps; step N brings a database from user_version N-1 to N.
+# Append new steps here and never reorder or edit ones that have shipped.
+MIGRATIONS = (
+    _migrate_base,
+    _migrate_progress,
+    _migrate_templates,
+    _migrate_change_log,
+    _migrate_concurrency,
+    _migrate_indexes,
+    _migrate_sample_test_project,
+    _migrate_compact_payloads,
+    _migrate_project_locations,
+    _migrate_result_lookup,
+    _migrate_gradation_metrics,
+    _migrate_uscs_classifications,
+    _migrate_calibrations,
+    _migrate_feed_writer,
+    _migrate_compact_payload_deltas,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
@@ -1,12 +1,367 @@
-from app.db import init_db
+import argparse
+import os
+import sqlite3
+import tempfile
+from datetime import date
+from pathlib import Path
+
+from app.db import (
+    DB_PATH,
+    MIGRATIONS,
+    backfill_sample_depths,
+    check_project_progress,
+    configure_backend,
+    get_app_setting,
+    get_connection,
+    init_db,
+    now_iso,
+    rebuild_project_progress,
+    set_app_setting,
+)
+from app.services.backup import DEFAULT_KEEP, restore_backup, run_backup
+from app.services.calibration_runs import recompute_calibrated_runs
+from app.services.calibrations import CALIBRATION_KINDS, list_calibrations, save_calibration
+from app.services.change_log import change_log_size, compact_change_log, prune_change_log
+from app.services.gradation import gradation_metrics, refresh_gradation_metrics
+from app.services.index_advisor import build_synthetic_db, check_plans
+from app.services.map_export import TILE_URL_SETTING, export_map, fetch_assets, prefetch_tiles
+from app.services.nearby_results import nearby_result_stats
+from app.services.spatial import (
+    DEFAULT_RADIUS_MILES,
+    nearest_projects,
+    projects_within,
+    resolve_center,
+)
+from app.services.storage import DEFAULT_PORT, DatabaseServer
+from app.services.uscs import apply_uscs_results, classify_samples, uscs_classifications
 from app.ui.app import GeoLabApp
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="geolab", description="GeoLab soils lab manager.")
+    parser.add_argument(
+        "--db-url",
+        default=None,
+        help="Database to open: sqlite:///path.db or geolab://host:port (defaults to GEOLAB_DB_URL, then the local file).",
+    )
+    sub = parser.add_subparsers(dest="command")
+    progress = sub.add_parser("progress", help="Check or rebuild the per-project test counters.")
+    progress.add_argument("--rebuild", action="store_true", help="Rebuild counters from a full recount.")
+    depths = sub.add_parser("depths", help="Parse sample depth text into depth_from/depth_to.")
+    depths.add_argument("--all", action="store_true", help="Re-parse every sample, not only unparsed ones.")
+    backup = sub.add_parser("backup", help="Write a verified, compressed backup.")
+    backup.add_argument("folder", nargs="?", help="Backup folder (defaults to the one saved in Settings).")
+    backup.add_argument("--keep", type=int, default=None, help="Full backups to retain.")
+    restore = sub.add_parser("restore", help="Rebuild a database file from a backup manifest.")
+    restore.add_argument("manifest", help="Path to a geolab_backup_*.json manifest.")
+    restore.add_argument("output", help="Database file to write.")
+    hist = sub.add_parser("history", help="Compact or prune the result change log.")
+    hist.add_argument("--compact-days", type=int, default=None, help="Merge entries older than N days to one per day.")
+    hist.add_argument("--prune-days", type=int, default=None, help="Delete entries older than N days.")
+    hist.add_argument("--keep", type=int, default=None, help="Keep at most N entries per result.")
+    indexes = sub.add_parser("indexes", help="Check that the main tab queries use their indexes.")
+    indexes.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        metavar="PROJECTS",
+        help="Check against a generated database of this many projects (40 samples x 6 tests each) instead.",
+    )
+    nearby = sub.add_parser("nearby", help="List past jobs near a project or a point.")
+    nearby.add_argument("center", help='Project file number, or "lat,lon".')
+    nearby.add_argument(
+        "--radius", type=float, default=None, help=f"Miles to search (default {DEFAULT_RADIUS_MILES:g})."
+    )
+    nearby.add_argument(
+        "--nearest", type=int, default=None, metavar="K", help="List the K nearest jobs instead of a radius search."
+    )
+    nearby.add_argument(
+        "--results", action="store_true", help="Summarize lab results (EI, max density, fines) within the radius."
+    )
+    gradation = sub.add_parser("gradation", help="Update and list D10/D30/D60, Cu and Cc from grain-size runs.")
+    gradation.add_argument("--project", default=None, metavar="FILE_NUMBER", help="Limit to one project.")
+    gradation.add_argument("--rebuild", action="store_true", help="Recompute every run, not only changed ones.")
+    uscs = sub.add_parser("uscs", help="Classify samples (USCS) from gradation and Atterberg results.")
+    uscs.add_argument("--project", default=None, metavar="FILE_NUMBER", help="Limit to one project.")
+    uscs.add_argument("--rebuild", action="store_true", help="Re-classify every sample, not only changed ones.")
+    uscs.add_argument("--apply", action="store_true", help="Fill blank Sieve Part. Analysis USCS results.")
+    uscs.add_argument("--overwrite", action="store_true", help="With --apply, also replace USCS results typed by hand.")
+    cal = sub.add_parser("calibrations", help="List or save shared equipment calibrations.")
+    cal.add_argument("--kind", choices=sorted(CALIBRATION_KINDS), default=None, help="Limit the list to one kind.")
+    cal.add_argument(
+        "--save",
+        choices=sorted(CALIBRATION_KINDS),
+        default=None,
+        metavar="KIND",
+        help="Save a calibration of this kind and recompute the runs that use it.",
+    )
+    cal.add_argument("--equipment", default=None, help="Equipment ID, with --save.")
+    cal.add_argument("--date", default=None, help="Effective date YYYY-MM-DD, with --save (default today).")
+    cal.add_argument(
+        "--value",
+        action="append",
+        default=[],
+        metavar="FIELD=VALUE",
+        help="A calibrated field, e.g. hydro_cal_t1=20.5; repeat for each.",
+    )
+    map_cmd = sub.add_parser("map", help="Write the offline project map (data/map/index.html).")
+    map_cmd.add_argument(
+        "--fetch-assets", action="store_true", help="Download Leaflet into the map folder so it opens offline."
+    )
+    map_cmd.add_argument(
+        "--tiles",
+        default=None,
+        metavar="MINZ-MAXZ",
+        help="Cache map tiles over the mapped projects from the --tile-url server, e.g. 6-10.",
+    )
+    map_cmd.add_argument(
+        "--tile-url",
+        default=None,
+        metavar="TEMPLATE",
+        help="Save the tile server, e.g. https://tiles.example.com/{z}/{x}/{y}.png ('' resets to OpenStreetMap).",
+    )
+    map_cmd.add_argument("--no-clusters", action="store_true", help="Skip the precomputed zoom-level clusters.")
+    serve = sub.add_parser("serve", help="Share the local database with other workstations over TCP.")
+    serve.add_argument(
+        "--host", default="127.0.0.1", help="Address to listen on (0.0.0.0 for all interfaces; requires a token)."
+    )
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--token", default=None, help="Shared secret clients must send (defaults to GEOLAB_DB_TOKEN).")
+    args = parser.parse_args(argv)
+
+    if args.command != "serve":
+        configure_backend(args.db_url)
     init_db()
+    if args.command == "serve":
+        return _run_serve(args)
+    if args.command == "progress":
+        return _run_progress(args)
+    if args.command == "depths":
+        updated, unparsed = backfill_sample_depths(reparse_all=args.all)
+        print(f"Updated {updated} sample(s); {unparsed} depth(s) could not be parsed.")
+        return 0
+
+    if args.command == "indexes":
+        return _run_indexes(args)
+    if args.command == "nearby":
+        return _run_nearby(args)
+    if args.command == "gradation":
+        return _run_gradation(args)
+    if args.command == "uscs":
+        return _run_uscs(args)
+    if args.command == "calibrations":
+        return _run_calibrations(args)
+    if args.command == "map":
+        return _run_map(args)
+    if args.command == "history":
+        return _run_history(args)
+    if args.command == "backup":
+        return _run_backup(args)
+    if args.command == "restore":
+        print(f"Restored {restore_backup(args.manifest, args.output)}")
+        return 0
+
     app = GeoLabApp()
     app.mainloop()
+    return 0
+
+
+def _run_progress(args):
+    if args.rebuild:
+        rebuild_project_progress()
+        print("Project counters rebuilt.")
+        return 0
+    mismatches = check_project_progress()
+    for m in mismatches:
+        print(f"{m['file_number']}: stored={m['stored']} expected={m['expected']}")
+    print(f"{len(mismatches)} project(s) with stale counters.")
+    return 1 if mismatches else 0
+
+
+def _run_history(args):
+    if args.compact_days is not None:
+        before, after = compact_change_log(args.compact_days)
+        print(f"Compacted {before} entries to {after}.")
+    if args.prune_days is not None or args.keep is not None:
+        print(f"Pruned {prune_change_log(args.prune_days, args.keep)} entries.")
+    count, oldest = change_log_size()
+    print(f"{count} change log entries" + (f", oldest {oldest}." if oldest else "."))
+    return 0
+
+
+def _run_indexes(args):
+    if args.synthetic:
+        with tempfile.TemporaryDirectory(prefix="geolab_plans_") as tmp:
+            path = build_synthetic_db(Path(tmp) / "synthetic.db", MIGRATIONS, projects=args.synthetic)
+            conn = sqlite3.connect(str(path))
+            try:
+                report = check_plans(conn)
+            finally:
+                conn.close()
+    else:
+        conn = get_connection()
+        try:
+            report = check_plans(conn)
+        finally:
+            conn.close()
+    failed = 0
+    for name, plan, problems in report:
+        print(f"{'FAIL' if problems else 'ok'}  {name}")
+        for line in plan:
+            print(f"      {line}")
+        for problem in problems:
+            print(f"    ! {problem}")
+        failed += bool(problems)
+    print(f"{failed} of {len(report)} query plan(s) need attention.")
+    return 1 if failed else 0
+
+
+def _run_nearby(args):
+    try:
+        lat, lon, project_id = resolve_center(args.center)
+    except ValueError as exc:
+        print(exc)
+        return 1
+    if args.results:
+        radius = args.radius if args.radius is not None else DEFAULT_RADIUS_MILES
+        stats = nearby_result_stats(lat, lon, radius, exclude_project_id=project_id)
+        print(f"Lab results within {radius:g} mi of {lat:.5f}, {lon:.5f}:")
+        for st in stats:
+            unit = f" ({st['unit']})" if st["unit"] else ""
+            print(
+                f"  {st['metric'] + unit:<32} n={st['count']:<4} jobs={st['projects']:<3} "
+                f"mean={st['mean']:.1f}  p10={st['p10']:.1f}  median={st['median']:.1f}  p90={st['p90']:.1f}"
+            )
+        if not stats:
+            print("  No results recorded.")
+        return 0
+    if args.nearest:
+        rows = nearest_projects(lat, lon, args.nearest, exclude_id=project_id)
+        title = f"{len(rows)} nearest job(s) to {lat:.5f}, {lon:.5f}"
+    else:
+        radius = args.radius if args.radius is not None else DEFAULT_RADIUS_MILES
+        rows = projects_within(lat, lon, radius, exclude_id=project_id)
+        title = f"{len(rows)} job(s) within {radius:g} mi of {lat:.5f}, {lon:.5f}"
+    print(f"{title}:")
+    for r in rows:
+        print(f"{r['distance_miles']:8.2f} mi  {r['file_number']}  {r['job_name']}  {r['location_text'] or ''}".rstrip())
+    return 0
+
+
+def _project_id_for(file_number):
+    conn = get_connection()
+    row = conn.execute("SELECT id FROM projects WHERE file_number = ?", (file_number,)).fetchone()
+    conn.close()
+    if row is None:
+        print(f"No project with file number {file_number}.")
+    return None if row is None else row["id"]
+
+
+def _run_gradation(args):
+    project_id = _project_id_for(args.project) if args.project else None
+    if args.project and project_id is None:
+        return 1
+    updated = refresh_gradation_metrics(project_id, rebuild=args.rebuild)
+    rows = gradation_metrics(project_id)
+    print(f"Recomputed {updated} grain-size run(s); {len(rows)} sample(s) with metrics.")
+
+    def fmt(value, digits):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    for r in rows:
+        print(
+            f"  {r['file_number']:<10} {r['sample_name']:<8} {r['depth_raw'] or '':<12}"
+            f" D10={fmt(r['d10'], 4)} D30={fmt(r['d30'], 4)} D60={fmt(r['d60'], 4)}"
+            f" Cu={fmt(r['cu'], 1)} Cc={fmt(r['cc'], 2)} #200={fmt(r['passing_no200'], 1)}%"
+        )
+    return 0
+
+
+def _run_uscs(args):
+    project_id = _project_id_for(args.project) if args.project else None
+    if args.project and project_id is None:
+        return 1
+    counts = classify_samples(project_id, rebuild=args.rebuild)
+    print(
+        f"Classified {counts['classified']} sample(s); {counts['unchanged']} unchanged; "
+        f"{counts['unclassified']} need more results."
+    )
+    for r in uscs_classifications(project_id):
+        print(f"  {r['file_number']:<10} {r['sample_name']:<8} {r['depth_raw'] or '':<12} {r['symbol'] or '-':<6} {r['note'] or ''}".rstrip())
+    if args.apply:
+        print(f"Updated {apply_uscs_results(project_id, overwrite=args.overwrite)} USCS result(s).")
+    return 0
+
+
+def _run_calibrations(args):
+    if args.save:
+        try:
+            values = dict(item.split("=", 1) for item in args.value)
+            cal_id = save_calibration(args.save, args.equipment, args.date or date.today().isoformat(), values)
+        except ValueError as exc:
+            print(f"Calibration not saved: {exc}")
+            return 1
+        counts = recompute_calibrated_runs(cal_id)
+        print(
+            f"Saved calibration {cal_id}; recomputed {counts['grain_size']} grain-size "
+            f"and {counts['worksheets']} worksheet run(s)."
+        )
+        return 0
+    for c in list_calibrations(args.kind):
+        values = ", ".join(f"{k}={v}" for k, v in c["fields"].items())
+        fit = f"  m={c['slope']:.6g} b={c['intercept']:.6g}" if c["slope"] is not None else ""
+        print(f"  {c['id']:>4} {c['kind']:<10} {c['equipment_id']:<12} {c['effective_date']}  {values}{fit}")
+    return 0
+
+
+def _run_map(args):
+    if args.tile_url is not None:
+        set_app_setting(TILE_URL_SETTING, args.tile_url.strip())
+    try:
+        if args.fetch_assets:
+            print(f"Fetched {len(fetch_assets())} Leaflet file(s).")
+        if args.tiles:
+            min_zoom, _, max_zoom = args.tiles.partition("-")
+            downloaded, cached = prefetch_tiles(int(min_zoom), int(max_zoom or min_zoom))
+            print(f"Downloaded {downloaded} tile(s); {cached} already cached.")
+    except (OSError, ValueError) as exc:
+        # URLError is an OSError; partial downloads stay cached for the next run.
+        print(exc)
+        return 1
+    result = export_map(clusters=not args.no_clusters)
+    changed = ", ".join(result["rewritten"]) or "nothing changed"
+    print(f"{result['points']} project(s) mapped in {result['path']} ({changed}).")
+    return 0
+
+
+def _run_serve(args):
+    token = args.token or os.getenv("GEOLAB_DB_TOKEN")
+    try:
+        server = DatabaseServer(DB_PATH, args.host, args.port, token)
+    except ValueError as exc:
+        print(exc)
+        return 1
+    print(f"Serving {DB_PATH} on geolab://{args.host}:{args.port} (Ctrl+C to stop).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def _run_backup(args):
+    folder = args.folder or get_app_setting("backup_dir", "")
+    if not folder:
+        print("No backup folder given or saved in Settings.")
+        return 1
+    keep = args.keep or int(get_app_setting("backup_keep", str(DEFAULT_KEEP)) or DEFAULT_KEEP)
+    result = run_backup(folder, keep=keep)
+    set_app_setting("last_backup_at", now_iso())
+    print(f"{result['kind']} backup: {result['pages_written']}/{result['page_count']} pages -> {result['path']}")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
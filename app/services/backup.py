@@ -0,0 +1,332 @@
+import gzip
+import hashlib
+import json
+import sqlite3
+import struct
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from app.db import get_connection
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+BACKUP_PREFIX = "geolab_backup_"
+DEFAULT_KEEP = 5
+DEFAULT_FULL_EVERY = 7
+PAGES_PER_STEP = 1024
+READ_CHUNK_PAGES = 256
+
+# Incremental archives are a stream of (page number, page bytes) records
+# preceded by one header record; page numbers are 1-based like SQLite's.
+_PAGE_RECORD = struct.Struct(">I")
+
+
+def run_backup(target_dir, keep=DEFAULT_KEEP, full_every=DEFAULT_FULL_EVERY, progress=None):
+    """
+    Snapshots the live database into target_dir without blocking writers,
+    verifies it and prunes old backups. Safe to call from a worker thread.
+
+    A full backup stores every page; later runs store only the pages whose
+    hash changed since the previous backup, until full_every backups have
+    been chained, when a new full backup starts. keep is the number of
+    full-backup chains retained. progress, if given, is called as
+    progress(phase, done, total) with phase "snapshot", "archive" or "verify".
+
+    Returns the manifest dict written next to the archive.
+    """
+    out_dir = Path(target_dir).expanduser().resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    parent = _latest_manifest(out_dir)
+
+    with tempfile.TemporaryDirectory(prefix="geolab_backup_") as tmp:
+        snapshot = Path(tmp) / "snapshot.db"
+        _snapshot(snapshot, progress)
+        page_size, page_count = _check_snapshot(snapshot)
+        hashes = _page_hashes(snapshot, page_size)
+
+        chain_length = parent["chain_length"] + 1 if parent else 0
+        incremental = (
+            parent is not None
+            and parent["page_size"] == page_size
+            and chain_length < full_every
+        )
+        if incremental:
+            previous = _split_hashes(parent["page_hashes"])
+            changed = [
+                number
+                for number, digest in enumerate(hashes, start=1)
+                if number > len(previous) or previous[number - 1] != digest
+            ]
+        else:
+            changed = list(range(1, page_count + 1))
+            chain_length = 0
+
+        stamp = _unique_stamp(out_dir)
+        kind = "incr" if incremental else "full"
+        compression = "zstd" if zstandard is not None else "gzip"
+        archive = out_dir / f"{BACKUP_PREFIX}{stamp}.{kind}.{'zst' if compression == 'zstd' else 'gz'}"
+        _write_archive(snapshot, archive, compression, page_size, page_count, changed, incremental, progress)
+
+    manifest = {
+        "format": 1,
+        "kind": kind,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "archive": archive.name,
+        "compression": compression,
+        "page_size": page_size,
+        "page_count": page_count,
+        "pages_written": len(changed),
+        "parent": parent["name"] if incremental else None,
+        "chain_length": chain_length,
+        "page_hashes": "".join(hashes),
+    }
+    _verify_archive(archive, manifest, changed, progress)
+
+    manifest_path = out_dir / f"{BACKUP_PREFIX}{stamp}.json"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    manifest["name"] = manifest_path.name
+    manifest["path"] = str(manifest_path)
+    manifest["removed"] = prune_backups(out_dir, keep)
+    return manifest
+
+
+def restore_backup(manifest_path, out_path):
+    """
+    Rebuilds a database file from a backup manifest by replaying its full
+    archive and every incremental archive up to it, then integrity-checks
+    the result. Returns out_path.
+    """
+    manifest_path = Path(manifest_path)
+    out_dir = manifest_path.parent
+    chain = []
+    manifest = _load_manifest(manifest_path)
+    while manifest is not None:
+        chain.append(manifest)
+        parent = manifest["parent"]
+        manifest = _load_manifest(out_dir / parent) if parent else None
+    chain.reverse()
+    if not chain or chain[0]["kind"] != "full":
+        raise RuntimeError(f"Backup chain for {manifest_path.name} has no full backup.")
+
+    out_path = Path(out_path)
+    with open(out_path, "wb") as out:
+        for item in chain:
+            page_size = item["page_size"]
+            for number, page in _read_archive(out_dir / item["archive"], item):
+                out.seek((number - 1) * page_size)
+                out.write(page)
+            out.truncate(item["page_count"] * page_size)
+
+    expected = _split_hashes(chain[-1]["page_hashes"])
+    if _page_hashes(out_path, chain[-1]["page_size"]) != expected:
+        raise RuntimeError("Restored database does not match the backup's page hashes.")
+    _check_snapshot(out_path)
+    return out_path
+
+
+def list_backups(target_dir):
+    """Returns backup manifests in target_dir, oldest first."""
+    out_dir = Path(target_dir).expanduser()
+    if not out_dir.is_dir():
+        return []
+    manifests = []
+    for path in sorted(out_dir.glob(f"{BACKUP_PREFIX}*.json")):
+        try:
+            manifests.append(_load_manifest(path))
+        except (OSError, ValueError, KeyError):
+            continue
+    return manifests
+
+
+def prune_backups(target_dir, keep=DEFAULT_KEEP):
+    """
+    Deletes whole backup chains (a full backup and its incrementals) beyond
+    the newest `keep`. Returns the number of files removed.
+    """
+    manifests = list_backups(target_dir)
+    full = [m for m in manifests if m["kind"] == "full"]
+    if keep < 1 or len(full) <= keep:
+        return 0
+    keep_from = full[-keep]["name"]
+    removed = 0
+    out_dir = Path(target_dir).expanduser()
+    for m in manifests:
+        if m["name"] >= keep_from:
+            break
+        for name in (m["archive"], m["name"]):
+            path = out_dir / name
+            if path.exists():
+                path.unlink()
+                removed += 1
+    return removed
+
+
+def _snapshot(path, progress):
+    src = get_connection()
+    dst = sqlite3.connect(str(path))
+
+    def on_step(_status, remaining, total):
+        if progress:
+            progress("snapshot", total - remaining, total)
+
+    try:
+        # Copying in steps releases the source lock between them, so the UI
+        # and other writers keep working while a large file is copied.
+        src.backup(dst, pages=PAGES_PER_STEP, progress=on_step, sleep=0.005)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _check_snapshot(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise RuntimeError(f"Backup integrity check failed: {result}")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        conn.close()
+    return page_size, page_count
+
+
+def _page_hashes(path, page_size):
+    hashes = []
+    with open(path, "rb") as fh:
+        while True:
+            page = fh.read(page_size)
+            if not page:
+                break
+            hashes.append(_page_hash(page))
+    return hashes
+
+
+def _page_hash(page):
+    return hashlib.blake2b(page, digest_size=8).hexdigest()
+
+
+def _split_hashes(joined):
+    return [joined[i : i + 16] for i in range(0, len(joined), 16)]
+
+
+def _write_archive(snapshot, archive, compression, page_size, page_count, pages, incremental, progress):
+    total = len(pages)
+    with open(snapshot, "rb") as src, _open_archive(archive, compression, "wb") as out:
+        if not incremental:
+            # Full archives are the plain database file, readable with any
+            # gzip/zstd tool.
+            done = 0
+            while True:
+                chunk = src.read(page_size * READ_CHUNK_PAGES)
+                if not chunk:
+                    break
+                out.write(chunk)
+                done = min(total, done + READ_CHUNK_PAGES)
+                if progress:
+                    progress("archive", done, total)
+            return
+        out.write(_PAGE_RECORD.pack(page_count))
+        for done, number in enumerate(pages, start=1):
+            src.seek((number - 1) * page_size)
+            out.write(_PAGE_RECORD.pack(number))
+            out.write(src.read(page_size))
+            if progress and done % READ_CHUNK_PAGES == 0:
+                progress("archive", done, total)
+        if progress:
+            progress("archive", total, total)
+
+
+def _verify_archive(archive, manifest, pages, progress):
+    expected = _split_hashes(manifest["page_hashes"])
+    total = len(pages)
+    seen = 0
+    for number, page in _read_archive(archive, manifest):
+        if number > len(expected) or _page_hash(page) != expected[number - 1]:
+            raise RuntimeError(f"Backup verification failed at page {number} of {archive.name}.")
+        seen += 1
+        if progress and seen % READ_CHUNK_PAGES == 0:
+            progress("verify", seen, total)
+    if seen != total:
+        raise RuntimeError(f"Backup verification failed: {archive.name} holds {seen} of {total} pages.")
+    if progress:
+        progress("verify", total, total)
+
+
+def _read_archive(archive, manifest):
+    page_size = manifest["page_size"]
+    with _open_archive(archive, manifest["compression"], "rb") as fh:
+        if manifest["kind"] == "full":
+            number = 0
+            while True:
+                page = _read_exact(fh, page_size)
+                if not page:
+                    break
+                number += 1
+                yield number, page
+            return
+        _read_exact(fh, _PAGE_RECORD.size)
+        while True:
+            head = _read_exact(fh, _PAGE_RECORD.size)
+            if not head:
+                break
+            (number,) = _PAGE_RECORD.unpack(head)
+            yield number, _read_exact(fh, page_size)
+
+
+def _read_exact(fh, size):
+    # Decompressing readers may return short reads before end of stream.
+    data = fh.read(size)
+    while data and len(data) < size:
+        more = fh.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def _open_archive(path, compression, mode):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This backup is zstd-compressed and requires zstandard. Please install dependencies.")
+        fh = open(path, mode)
+        if mode == "wb":
+            return zstandard.ZstdCompressor(level=6).stream_writer(fh, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(fh, closefd=True)
+    return gzip.open(path, mode, compresslevel=6)
+
+
+def _load_manifest(path):
+    manifest = json.loads(Path(path).read_text(encoding="utf-8"))
+    manifest["name"] = Path(path).name
+    return manifest
+
+
+def _latest_manifest(out_dir):
+    # The newest backup is only a usable parent if its whole chain back to
+    # the full backup is still on disk.
+    by_name = {m["name"]: m for m in list_backups(out_dir)}
+    if not by_name:
+        return None
+    latest = by_name[max(by_name)]
+    manifest = latest
+    while manifest is not None:
+        if not (out_dir / manifest["archive"]).exists():
+            return None
+        if manifest["kind"] == "full":
+            return latest
+        manifest = by_name.get(manifest["parent"])
+    return None
+
+
+def _unique_stamp(out_dir):
+    # Names double as the chain order, so they carry microseconds and are
+    # never reused after older backups are pruned.
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    while (out_dir / f"{BACKUP_PREFIX}{stamp}.json").exists():
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return stamp
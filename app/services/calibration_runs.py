@@ -0,0 +1,108 @@
+"""
+Recomputes saved results after a library calibration changes.
+
+Only runs whose payload references the calibration are read, found through
+the calibration_id columns of grain_size_runs and worksheet_runs. Their
+stored results are rewritten from the new values the same way a worksheet
+save writes them, and gradation metrics are rebuilt for the grain-size
+samples among them.
+"""
+
+from app.db import get_connection
+from app.services.calibrations import invalidate_calibrations
+from app.services.gradation import refresh_gradation_metrics
+from app.services.nearby_results import invalidate_nearby_results
+from app.services.repository import RESULT_COLUMNS
+from app.services.worksheet_generic import (
+    compute_grain_size,
+    compute_values,
+    grain_hydrometer_enabled,
+    loads_payload,
+    map_results,
+)
+
+
+
+def calibrated_run_counts(calibration_id):
+    """Returns {"grain_size": n, "worksheets": n} runs referencing a calibration."""
+    conn = get_connection()
+    try:
+        grain = conn.execute(
+            "SELECT COUNT(*) AS n FROM grain_size_runs WHERE calibration_id = ?", (calibration_id,)
+        ).fetchone()["n"]
+        worksheets = conn.execute(
+            "SELECT COUNT(*) AS n FROM worksheet_runs WHERE calibration_id = ?", (calibration_id,)
+        ).fetchone()["n"]
+    finally:
+        conn.close()
+    return {"grain_size": grain, "worksheets": worksheets}
+
+
+def recompute_calibrated_runs(calibration_id):
+    """
+    Rewrites the results of every run referencing calibration_id from the
+    library values. Returns {"grain_size": n, "worksheets": n} runs redone.
+    """
+    invalidate_calibrations()
+    conn = get_connection()
+    try:
+        grain_rows = conn.execute(
+            """
+            SELECT g.sample_id, g.payload_json, s.project_id
+            FROM grain_size_runs g
+            JOIN samples s ON s.id = g.sample_id
+            WHERE g.calibration_id = ?
+            """,
+            (calibration_id,),
+        ).fetchall()
+        worksheet_rows = conn.execute(
+            """
+            SELECT wr.sample_test_id, wr.payload_json, t.name, st.project_id
+            FROM worksheet_runs wr
+            JOIN sample_tests st ON st.id = wr.sample_test_id
+            JOIN tests t ON t.id = st.test_id
+            WHERE wr.calibration_id = ?
+            """,
+            (calibration_id,),
+        ).fetchall()
+
+        # The hydrometer summary is the only grain-size result a calibration affects.
+        hydro_updates = []
+        for r in grain_rows:
+            payload = loads_payload(r["payload_json"])
+            if not grain_hydrometer_enabled(payload):
+                continue
+            computed = compute_grain_size(payload)
+            summary = computed.get("hydro_total_1440")
+            if summary is None:
+                summary = computed.get("hydro_total_250")
+            hydro_updates.append((summary, r["sample_id"]))
+        conn.executemany(
+            """
+            UPDATE sample_tests
+            SET result_value = ?
+            WHERE sample_id = ? AND test_id = (SELECT id FROM tests WHERE name = 'Hydrometer')
+            """,
+            hydro_updates,
+        )
+
+        result_updates = []
+        for r in worksheet_rows:
+            payload = loads_payload(r["payload_json"])
+            mapped = map_results(r["name"], payload, compute_values(r["name"], payload))
+            result_updates.append(tuple(mapped[c] for c in RESULT_COLUMNS) + (r["sample_test_id"],))
+        conn.executemany(
+            f"""
+            UPDATE sample_tests
+            SET {", ".join(f"{c} = ?" for c in RESULT_COLUMNS)}
+            WHERE id = ?
+            """,
+            result_updates,
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    if grain_rows:
+        refresh_gradation_metrics(sample_ids=[r["sample_id"] for r in grain_rows], rebuild=True)
+    invalidate_nearby_results({r["project_id"] for r in grain_rows} | {r["project_id"] for r in worksheet_rows})
+    return {"grain_size": len(grain_rows), "worksheets": len(worksheet_rows)}
@@ -0,0 +1,257 @@
+"""
+Lab equipment calibrations shared by worksheets: hydrometer temperature
+corrections, sand-cone sand (cone sand weight and sand density) and
+sampler rings.
+
+Each calibration is stored once per kind, equipment ID and effective date,
+with the hydrometer correction line fitted when it is saved. A worksheet
+payload references one by its id in "calibration_id"; the calibrated
+fields are then taken from the library instead of the payload, and are not
+saved in it. Payloads without a reference keep their own values.
+
+Calibrations are cached by id for the session; invalidate_calibrations
+drops the cache when this or another workstation changes the library.
+"""
+
+import json
+from datetime import date
+
+from app.db import get_connection, now_iso
+
+# kind -> (label, payload fields it supplies).
+CALIBRATION_KINDS = {
+    "hydrometer": (
+        "Hydrometer",
+        (
+            "hydro_cal_t1",
+            "hydro_cal_c1",
+            "hydro_cal_t2",
+            "hydro_cal_c2",
+            "hydro_cal_t3",
+            "hydro_cal_c3",
+            "hydro_cal_t4",
+            "hydro_cal_c4",
+        ),
+    ),
+    "sand_cone": ("Sand Cone Sand", ("d_cone", "f_sand_density")),
+    "ring": ("Sampler Rings", ("ring_const", "volume_divisor", "grams_per_lb")),
+}
+# Worksheet spec key -> the calibration kind its payload can reference.
+CALIBRATED_WORKSHEETS = {
+    "grain_size": "hydrometer",
+    "sand_cone": "sand_cone",
+    "field_moisture_density": "ring",
+}
+
+_CACHE = {}
+_generation = 0
+
+
+def linear_fit(points):
+    """Least-squares (slope, intercept) through (x, y) points; (None, None) if undefined."""
+    if len(points) < 2:
+        return None, None
+    n = float(len(points))
+    sx = sum(p[0] for p in points)
+    sy = sum(p[1] for p in points)
+    sxx = sum(p[0] * p[0] for p in points)
+    sxy = sum(p[0] * p[1] for p in points)
+    den = n * sxx - sx * sx
+    if abs(den) <= 1e-12:
+        return None, None
+    m = (n * sxy - sx * sy) / den
+    b = (sy - m * sx) / n
+    return m, b
+
+
+def save_calibration(kind, equipment_id, effective_date, values, notes=None):
+    """
+    Adds the calibration for equipment from effective_date (YYYY-MM-DD), or
+    replaces its values when one exists for that date. values maps the
+    kind's fields to numbers. Returns the calibration id.
+    """
+    if kind not in CALIBRATION_KINDS:
+        raise ValueError(f"Unknown calibration kind: {kind}")
+    equipment_id = (equipment_id or "").strip()
+    if not equipment_id:
+        raise ValueError("Equipment ID is required.")
+    try:
+        effective_date = date.fromisoformat(str(effective_date).strip()).isoformat()
+    except ValueError:
+        raise ValueError("Effective date must be YYYY-MM-DD.") from None
+    fields = CALIBRATION_KINDS[kind][1]
+    clean = {}
+    for key in fields:
+        raw = values.get(key)
+        if raw is None or str(raw).strip() == "":
+            continue
+        try:
+            clean[key] = float(raw)
+        except ValueError:
+            raise ValueError(f"{key} must be a number.") from None
+    slope = intercept = None
+    if kind == "hydrometer":
+        points = [
+            (clean[t], clean[c])
+            for t, c in zip(fields[0::2], fields[1::2])
+            if t in clean and c in clean
+        ]
+        slope, intercept = linear_fit(points)
+        if slope is None:
+            raise ValueError("A hydrometer calibration needs at least two distinct temperature points.")
+    elif len(clean) != len(fields):
+        raise ValueError(f"Enter every value: {', '.join(fields)}.")
+
+    conn = get_connection()
+    try:
+        conn.execute(
+            """
+            INSERT INTO calibrations (
+                kind, equipment_id, effective_date, values_json, slope, intercept, notes, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(kind, equipment_id, effective_date) DO UPDATE SET
+                values_json = excluded.values_json,
+                slope = excluded.slope,
+                intercept = excluded.intercept,
+                notes = excluded.notes,
+                updated_at = excluded.updated_at
+            """,
+            (kind, equipment_id, effective_date, json.dumps(clean), slope, intercept, notes, now_iso()),
+        )
+        row = conn.execute(
+            "SELECT id FROM calibrations WHERE kind = ? AND equipment_id = ? AND effective_date = ?",
+            (kind, equipment_id, effective_date),
+        ).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    invalidate_calibrations()
+    return int(row["id"])
+
+
+def list_calibrations(kind=None):
+    """Returns calibrations (one kind, or all) newest first per equipment, values parsed."""
+    scope_sql, params = ("WHERE kind = ?", (kind,)) if kind else ("", ())
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT id, kind, equipment_id, effective_date, values_json, slope, intercept, notes, updated_at
+            FROM calibrations
+            {scope_sql}
+            ORDER BY kind, equipment_id, effective_date DESC
+            """,
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_calibration(r) for r in rows]
+
+
+def get_calibration(calibration_id):
+    """Returns the calibration dict for an id (int or payload text), or None."""
+    try:
+        calibration_id = int(str(calibration_id).strip())
+    except (TypeError, ValueError):
+        return None
+    if calibration_id not in _CACHE:
+        conn = get_connection()
+        try:
+            row = conn.execute(
+                """
+                SELECT id, kind, equipment_id, effective_date, values_json, slope, intercept, notes, updated_at
+                FROM calibrations
+                WHERE id = ?
+                """,
+                (calibration_id,),
+            ).fetchone()
+        finally:
+            conn.close()
+        _CACHE[calibration_id] = _calibration(row) if row else None
+    return _CACHE[calibration_id]
+
+
+def current_calibration_id(kind, equipment_id=None, on_date=None):
+    """
+    Id of the calibration in effect on on_date (default today): the latest
+    effective date on or before it, for one piece of equipment or any.
+    """
+    where, params = ["kind = ?", "effective_date <= ?"], [kind, str(on_date or date.today())]
+    if equipment_id:
+        where.append("equipment_id = ?")
+        params.append(equipment_id)
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            f"""
+            SELECT id FROM calibrations
+            WHERE {" AND ".join(where)}
+            ORDER BY effective_date DESC, updated_at DESC
+            LIMIT 1
+            """,
+            params,
+        ).fetchone()
+    finally:
+        conn.close()
+    return int(row["id"]) if row else None
+
+
+def apply_calibration(payload):
+    """
+    Returns (values, fit): the payload with a referenced calibration's
+    fields filled in, and the hydrometer (slope, intercept) or None.
+    """
+    cal = get_calibration((payload or {}).get("calibration_id"))
+    if cal is None:
+        return payload, None
+    vals = dict(payload)
+    vals.update(cal["fields"])
+    fit = (cal["slope"], cal["intercept"]) if cal["slope"] is not None else None
+    return vals, fit
+
+
+def calibrated_fields(payload):
+    """The payload fields a referenced calibration supplies, as text; {} when none."""
+    cal = get_calibration((payload or {}).get("calibration_id"))
+    return dict(cal["fields"]) if cal else {}
+
+
+def strip_calibrated(payload):
+    """Drops the fields a referenced calibration supplies, for saving."""
+    supplied = calibrated_fields(payload)
+    if not supplied:
+        return payload
+    return {k: v for k, v in payload.items() if k not in supplied}
+
+
+def calibration_generation():
+    """Changes whenever cached calibrations are dropped; part of derived cache keys."""
+    return _generation
+
+
+def invalidate_calibrations():
+    global _generation
+    _CACHE.clear()
+    _generation += 1
+
+
+def _calibration(row):
+    values = json.loads(row["values_json"] or "{}")
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "equipment_id": row["equipment_id"],
+        "effective_date": row["effective_date"],
+        "values": values,
+        "fields": {k: _text(v) for k, v in values.items()},
+        "slope": row["slope"],
+        "intercept": row["intercept"],
+        "notes": row["notes"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def _text(value):
+    # Worksheet fields hold text; whole numbers print without ".0".
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
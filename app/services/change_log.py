@@ -0,0 +1,284 @@
+import json
+from datetime import date, datetime, timedelta
+
+from app.db import CHANGE_LOG_TABLES, get_connection
+
+# Compact payload sections diffed inside rather than as whole values.
+_PAYLOAD_SECTIONS = ("f", "s", "e")
+
+
+def history(entity, entity_id):
+    """Returns the change_log entries for one row, newest first."""
+    conn = get_connection()
+    rows = conn.execute(
+        """
+        SELECT id, changed_at, op, delta
+        FROM change_log
+        WHERE entity = ? AND entity_id = ?
+        ORDER BY changed_at DESC, id DESC
+        """,
+        (entity, entity_id),
+    ).fetchall()
+    conn.close()
+    return [
+        {"id": r["id"], "changed_at": r["changed_at"], "op": r["op"], "delta": _decode(r["delta"])}
+        for r in rows
+    ]
+
+
+def row_as_of(entity, entity_id, when):
+    """
+    Returns the audited columns of one row as they stood at `when` (a
+    datetime, a date meaning the end of that day, or an ISO string), or None
+    if the row did not exist then. Only entries newer than `when` are read,
+    through the (entity, entity_id, changed_at) index.
+    """
+    key, columns, payload_columns = CHANGE_LOG_TABLES[entity]
+    tracked = columns + payload_columns
+    conn = get_connection()
+    current = conn.execute(
+        f"SELECT {', '.join(tracked)} FROM {entity} WHERE {key} = ?",
+        (entity_id,),
+    ).fetchone()
+    entries = conn.execute(
+        """
+        SELECT op, delta
+        FROM change_log
+        WHERE entity = ? AND entity_id = ? AND changed_at > ?
+        ORDER BY changed_at DESC, id DESC
+        """,
+        (entity, entity_id, _as_timestamp(when)),
+    ).fetchall()
+    conn.close()
+
+    state = dict(current) if current else None
+    for entry in entries:
+        state = _undo(state, entry["op"], _decode(entry["delta"]), payload_columns)
+    return state
+
+
+def result_as_of(sample_test_id, when):
+    return row_as_of("sample_tests", sample_test_id, when)
+
+
+def prune_change_log(older_than_days=None, keep_per_row=None):
+    """
+    Deletes history older than `older_than_days` and/or beyond the newest
+    `keep_per_row` entries of each row. Dropping the oldest entries only
+    moves the time-travel horizon; newer states stay exact. Returns the
+    number of entries deleted.
+    """
+    deleted = 0
+    conn = get_connection()
+    if older_than_days is not None:
+        cur = conn.execute("DELETE FROM change_log WHERE changed_at < ?", (_cutoff(older_than_days),))
+        deleted += cur.rowcount
+    if keep_per_row is not None:
+        cur = conn.execute(
+            """
+            DELETE FROM change_log
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY entity, entity_id ORDER BY changed_at DESC, id DESC
+                    ) AS rn
+                    FROM change_log
+                )
+                WHERE rn > ?
+            )
+            """,
+            (keep_per_row,),
+        )
+        deleted += cur.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def compact_change_log(older_than_days=30):
+    """
+    Merges each row's entries older than the cutoff into one entry per day,
+    stamped at the day's first change. History stays exact at day
+    boundaries. Returns (entries_before, entries_after) for the compacted
+    range.
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        """
+        SELECT id, entity, entity_id, changed_at, op, delta
+        FROM change_log
+        WHERE changed_at < ?
+        ORDER BY entity, entity_id, changed_at, id
+        """,
+        (_cutoff(older_than_days),),
+    ).fetchall()
+
+    groups = {}
+    for r in rows:
+        groups.setdefault((r["entity"], r["entity_id"], r["changed_at"][:10]), []).append(r)
+
+    removed_ids = []
+    merged = []
+    for (entity, _entity_id, _day), entries in groups.items():
+        if len(entries) < 2:
+            continue
+        payload_columns = CHANGE_LOG_TABLES.get(entity, (None, (), ()))[2]
+        # Compose newest to oldest, the order the entries are undone in.
+        op, delta = entries[-1]["op"], _decode(entries[-1]["delta"])
+        for entry in reversed(entries[:-1]):
+            op, delta = _merge(op, delta, entry["op"], _decode(entry["delta"]), payload_columns)
+        first = entries[0]
+        merged.append((first["entity"], first["entity_id"], first["changed_at"], op, _encode(delta)))
+        removed_ids.extend(e["id"] for e in entries)
+
+    conn.executemany("DELETE FROM change_log WHERE id = ?", [(i,) for i in removed_ids])
+    conn.executemany(
+        "INSERT INTO change_log (entity, entity_id, changed_at, op, delta) VALUES (?, ?, ?, ?, ?)",
+        merged,
+    )
+    conn.commit()
+    conn.close()
+    return len(rows), len(rows) - len(removed_ids) + len(merged)
+
+
+def change_log_size():
+    conn = get_connection()
+    row = conn.execute("SELECT COUNT(1) AS n, MIN(changed_at) AS oldest FROM change_log").fetchone()
+    conn.close()
+    return row["n"], row["oldest"]
+
+
+def _undo(state, op, delta, payload_columns):
+    if op == "I":
+        return None
+    if op == "D":
+        return dict(delta)
+    if state is None:
+        return None
+    state = dict(state)
+    for col, old in delta.items():
+        if col in payload_columns and isinstance(old, dict):
+            state[col] = json.dumps(_undo_payload(_load_object(state.get(col)), old))
+        else:
+            state[col] = old
+    return state
+
+
+def _undo_payload(payload, diff):
+    # Top-level keys first, then the sections of a compact payload that were
+    # diffed inside (see _compact_payload_delta_sql in app.db).
+    payload = _undo_object(payload, diff)
+    for key in _PAYLOAD_SECTIONS:
+        if key in diff:
+            value = _undo_section(key, payload.get(key), diff[key])
+            if value:
+                payload[key] = value
+            else:
+                payload.pop(key, None)
+    return payload
+
+
+def _undo_object(obj, diff):
+    obj = dict(obj or {})
+    for k in diff.get("unset", []):
+        obj.pop(k, None)
+    obj.update(diff.get("set", {}))
+    return obj
+
+
+def _undo_section(key, value, diff):
+    if key != "e":
+        return _undo_object(value, diff)
+    drop = set(diff.get("drop", []))
+    kept = [k for k in value or [] if k not in drop]
+    return kept + [k for k in diff.get("add", []) if k not in kept]
+
+
+def _merge(newer_op, newer, older_op, older, payload_columns):
+    # Returns one entry equivalent to undoing `newer` and then `older`.
+    if older_op in ("I", "D"):
+        return older_op, older
+    if newer_op == "I":
+        return newer_op, newer
+    if newer_op == "D":
+        return "D", _undo(newer, "U", older, payload_columns)
+    delta = dict(newer)
+    for col, old in older.items():
+        prev = delta.get(col)
+        if col in payload_columns and isinstance(old, dict) and isinstance(prev, dict):
+            delta[col] = _merge_payload(prev, old)
+        elif col in payload_columns and isinstance(old, dict) and isinstance(prev, str):
+            delta[col] = json.dumps(_undo_payload(_load_object(prev), old))
+        else:
+            delta[col] = old
+    return "U", delta
+
+
+def _merge_object(newer, older):
+    old_set, old_unset = older.get("set", {}), set(older.get("unset", []))
+    set_ = {k: v for k, v in newer.get("set", {}).items() if k not in old_unset}
+    set_.update(old_set)
+    unset = {k for k in newer.get("unset", []) if k not in old_set} | old_unset
+    return {"set": set_, "unset": sorted(unset)}
+
+
+def _merge_payload(newer, older):
+    merged = _merge_object(newer, older)
+    for key in _PAYLOAD_SECTIONS:
+        new_diff, old_diff = newer.get(key), older.get(key)
+        if key in older.get("set", {}) or key in older.get("unset", []):
+            # The older entry restores the whole section.
+            continue
+        if old_diff is None:
+            if new_diff is not None:
+                merged[key] = new_diff
+        elif key in newer.get("set", {}) or key in newer.get("unset", []):
+            # The newer entry restored the whole section: apply the older
+            # diff to that value instead.
+            value = _undo_section(key, newer.get("set", {}).get(key), old_diff)
+            merged["unset"] = [k for k in merged["unset"] if k != key]
+            if value:
+                merged["set"][key] = value
+            else:
+                merged["set"].pop(key, None)
+                merged["unset"].append(key)
+        elif new_diff is None:
+            merged[key] = old_diff
+        elif key == "e":
+            drop = set(new_diff.get("drop", [])) | set(old_diff.get("drop", []))
+            add = (set(new_diff.get("add", [])) - set(old_diff.get("drop", []))) | set(old_diff.get("add", []))
+            merged[key] = {"add": sorted(add), "drop": sorted(drop)}
+        else:
+            merged[key] = _merge_object(new_diff, old_diff)
+    return merged
+
+
+def _load_object(raw):
+    try:
+        obj = json.loads(raw) if raw else {}
+    except (TypeError, ValueError):
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
+
+def _decode(raw):
+    return json.loads(raw) if raw else None
+
+
+def _encode(delta):
+    return json.dumps(delta) if delta is not None else None
+
+
+def _as_timestamp(when):
+    if isinstance(when, datetime):
+        return when.isoformat(timespec="seconds")
+    if isinstance(when, date):
+        return f"{when.isoformat()}T23:59:59"
+    text = str(when).strip().replace(" ", "T")
+    if len(text) == 10:
+        return f"{text}T23:59:59"
+    return text
+
+
+def _cutoff(days):
+    return (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
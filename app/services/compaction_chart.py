@@ -0,0 +1,103 @@
+"""
+Geometry of the compaction (moisture / dry density) chart shared by the D1557
+PDF export and the on-screen worksheet chart.
+
+Everything is returned in unit chart space: u runs 0..1 left to right over the
+moisture axis and v 0..1 bottom to top over the dry density axis, so each
+consumer only scales to its own frame (and flips v for Tk). Zero-air-voids
+curves and ticks depend only on the axis ranges and are cached; the fitted
+curve is sampled once per chart.
+"""
+
+import math
+from functools import lru_cache
+
+UNIT_WEIGHT_WATER_PCF = 62.43
+DRY_DENSITY_RANGE = (95.0, 155.0)
+ZAV_SAMPLES = 30
+FIT_SAMPLES = 80
+TICK_COUNT = 6
+
+
+def axis_ranges(points):
+    """(min moisture, max moisture, min density, max density) for the chart."""
+    if points and max(p[0] for p in points) > 20:
+        return (10.0, 30.0) + DRY_DENSITY_RANGE
+    return (0.0, 20.0) + DRY_DENSITY_RANGE
+
+
+@lru_cache(maxsize=64)
+def nice_ticks(minv, maxv, count):
+    """Round tick values (1, 2 or 5 x 10^n apart) within [minv, maxv], as a tuple."""
+    if maxv <= minv:
+        return (minv,)
+    raw = (maxv - minv) / max(1, count - 1)
+    mag = 10 ** math.floor(math.log10(abs(raw)))
+    norm = raw / mag
+    if norm < 1.5:
+        step = 1 * mag
+    elif norm < 3:
+        step = 2 * mag
+    elif norm < 7:
+        step = 5 * mag
+    else:
+        step = 10 * mag
+    first = math.ceil((minv - 1e-9) / step)
+    last = math.floor((maxv + 1e-9) / step)
+    return tuple(i * step for i in range(first, min(last, first + 99) + 1))
+
+
+@lru_cache(maxsize=256)
+def zav_curve(g, ranges):
+    """
+    Zero-air-voids dry density for specific gravity g, sampled across the
+    moisture axis and kept where it falls inside the density axis, as (u, v).
+    """
+    minx, maxx, miny, maxy = ranges
+    step = (maxx - minx) / ZAV_SAMPLES
+    out = []
+    for i in range(ZAV_SAMPLES + 1):
+        x = minx + i * step
+        den = 1.0 + x / 100.0 * g
+        # Negative G values (typed on the way to another number) have no curve here.
+        if den <= 0:
+            continue
+        y = UNIT_WEIGHT_WATER_PCF * g / den
+        if miny <= y <= maxy:
+            out.append(((x - minx) / (maxx - minx), (y - miny) / (maxy - miny)))
+    return tuple(out)
+
+
+def fit_curve(coefficients, ranges):
+    """Samples the fitted quadratic (a, b, c) across the moisture axis, as (u, v) inside the chart."""
+    a, b, c = coefficients
+    minx, maxx, miny, maxy = ranges
+    step = (maxx - minx) / FIT_SAMPLES
+    out = []
+    for i in range(FIT_SAMPLES + 1):
+        x = minx + i * step
+        y = (a * x + b) * x + c
+        if miny <= y <= maxy:
+            out.append(((x - minx) / (maxx - minx), (y - miny) / (maxy - miny)))
+    return tuple(out)
+
+
+class CompactionChart:
+    """
+    Chart geometry for one set of (moisture, dry density) points: ranges,
+    ticks as (value, u or v), ZAV curves as (g, points), the fitted curve and
+    the points themselves, all in unit chart space.
+    """
+
+    def __init__(self, points, g_values, fit=None):
+        self.ranges = axis_ranges(points)
+        minx, maxx, miny, maxy = self.ranges
+        self.x_ticks = tuple((x, (x - minx) / (maxx - minx)) for x in nice_ticks(minx, maxx, TICK_COUNT))
+        self.y_ticks = tuple((y, (y - miny) / (maxy - miny)) for y in nice_ticks(miny, maxy, TICK_COUNT))
+        self.zav = tuple((g, zav_curve(g, self.ranges)) for g in g_values)
+        self.fit = fit_curve(fit, self.ranges) if fit is not None else ()
+        self.points = tuple(self.unit(x, y) for x, y in sorted(points))
+
+    def unit(self, moisture, density):
+        minx, maxx, miny, maxy = self.ranges
+        return (moisture - minx) / (maxx - minx), (density - miny) / (maxy - miny)
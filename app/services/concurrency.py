@@ -0,0 +1,70 @@
+from app.db import get_connection
+from app.services.storage import SESSION_ID
+
+FEED_KEEP = 20000
+
+
+class ConflictError(RuntimeError):
+    """A row changed on another workstation after it was loaded here."""
+
+
+def read_version(conn, table, key_col, key):
+    """Returns the row's row_version, or None if the row does not exist."""
+    row = conn.execute(f"SELECT row_version FROM {table} WHERE {key_col} = ?", (key,)).fetchone()
+    return None if row is None else row["row_version"]
+
+
+def expect_version(conn, table, key_col, key, expected):
+    """
+    Raises ConflictError unless the row is still at `expected` (None meaning
+    it did not exist yet). Call it after BEGIN IMMEDIATE so the check and the
+    writes that follow are one atomic step.
+    """
+    current = read_version(conn, table, key_col, key)
+    if current != expected:
+        if current is None:
+            raise ConflictError("This record was deleted by another user.")
+        raise ConflictError("This record was changed by another user since you opened it.")
+
+
+def latest_seq():
+    conn = get_connection()
+    row = conn.execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM change_feed").fetchone()
+    conn.close()
+    return row["seq"]
+
+
+def changes_since(seq):
+    """
+    Returns (changes, new_seq, complete). changes maps entity -> {entity_id:
+    (op, project_id)} with the latest op per row. complete is False when
+    entries after `seq` were already pruned, in which case the caller should
+    fall back to a full reload. Rows this process wrote are skipped, though
+    new_seq still moves past them.
+    """
+    conn = get_connection()
+    oldest = conn.execute("SELECT MIN(seq) AS seq FROM change_feed").fetchone()["seq"]
+    rows = conn.execute(
+        "SELECT seq, entity, entity_id, project_id, op, writer FROM change_feed WHERE seq > ? ORDER BY seq",
+        (seq,),
+    ).fetchall()
+    conn.close()
+    complete = oldest is None or oldest <= seq + 1
+    changes = {}
+    for r in rows:
+        seq = r["seq"]
+        if r["writer"] == SESSION_ID:
+            continue
+        changes.setdefault(r["entity"], {})[r["entity_id"]] = (r["op"], r["project_id"])
+    return changes, seq, complete
+
+
+def prune_change_feed(keep=FEED_KEEP):
+    conn = get_connection()
+    cur = conn.execute(
+        "DELETE FROM change_feed WHERE seq <= (SELECT MAX(seq) FROM change_feed) - ?",
+        (keep,),
+    )
+    conn.commit()
+    conn.close()
+    return cur.rowcount
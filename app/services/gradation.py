@@ -0,0 +1,254 @@
+"""
+Gradation metrics derived from saved grain-size worksheets: D10, D30, D60,
+Cu, Cc and percent passing the #4 and #200 sieves.
+
+Sizes are log-interpolated on the same curve the worksheet graph draws
+(dry sieve, plus hydrometer points when enabled). Results are stored in
+gradation_metrics with the grain_size_runs id and row_version they were
+computed from, so refresh_gradation_metrics only recomputes runs saved
+since and removes metrics whose run is gone.
+"""
+
+import bisect
+import json
+import math
+from functools import lru_cache
+
+from app.db import get_connection, now_iso
+from app.services.calibrations import calibration_generation
+from app.services.worksheet_generic import (
+    compute_grain_size,
+    grain_curve_points,
+    grain_hydrometer_enabled,
+    has_dry_sieve_entries,
+    loads_payload,
+)
+
+GRADATION_FIELDS = ("d10", "d30", "d60", "cu", "cc", "passing_no4", "passing_no200")
+CURVE_CACHE_SIZE = 2048
+
+
+def sample_curve(payload, computed=None):
+    """Returns the gradation curve [(size_mm, percent finer)], coarsest first."""
+    include_dry = has_dry_sieve_entries(payload)
+    include_hydro = include_dry and grain_hydrometer_enabled(payload)
+    if computed is None:
+        computed = compute_grain_size(payload)
+    return grain_curve_points(payload, include_dry, include_hydro, computed)
+
+
+class GradationCurve:
+    """
+    A curve prepared for repeated lookups (graph hover): log10 sizes in
+    ascending order with their percent finer, searched by bisection.
+    """
+
+    __slots__ = ("label", "points", "log_sizes", "percents")
+
+    def __init__(self, points, label=""):
+        ordered = sorted((p for p in points if p[0] > 0 and p[1] is not None), key=lambda p: p[0])
+        self.label = label
+        self.points = ordered[::-1]
+        self.log_sizes = [math.log10(x) for x, _y in ordered]
+        self.percents = [y for _x, y in ordered]
+
+    def percent_at_log(self, log_size):
+        """Percent finer at 10**log_size mm; the end values outside the curve."""
+        xs = self.log_sizes
+        if not xs:
+            return None
+        i = bisect.bisect_left(xs, log_size)
+        if i == 0:
+            return self.percents[0]
+        if i == len(xs):
+            return self.percents[-1]
+        x1, x2 = xs[i - 1], xs[i]
+        y1, y2 = self.percents[i - 1], self.percents[i]
+        if x2 - x1 <= 1e-12:
+            return y2
+        return y1 + (log_size - x1) / (x2 - x1) * (y2 - y1)
+
+    def percent_at(self, size_mm):
+        return self.percent_at_log(math.log10(size_mm))
+
+
+def project_curves(project_id):
+    """
+    Returns every saved grain-size curve in a project as dicts with
+    sample_id, sample_name, depth_raw, depth_from, depth_to and curve (a
+    GradationCurve), ordered by sample name and depth.
+    """
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT s.id, s.sample_name, s.depth_raw, s.depth_from, s.depth_to, g.payload_json
+            FROM samples s
+            JOIN grain_size_runs g ON g.sample_id = s.id
+            WHERE s.project_id = ?
+            ORDER BY s.sample_name, s.depth_from, s.id
+            """,
+            (project_id,),
+        ).fetchall()
+    finally:
+        conn.close()
+    curves = []
+    for r in rows:
+        points = _curve_points(r["payload_json"], calibration_generation())
+        if len(points) < 2:
+            continue
+        label = f"{r['sample_name']} {r['depth_raw'] or ''}".strip()
+        curves.append(
+            {
+                "sample_id": r["id"],
+                "sample_name": r["sample_name"],
+                "depth_raw": r["depth_raw"],
+                "depth_from": r["depth_from"],
+                "depth_to": r["depth_to"],
+                "curve": GradationCurve(points, label),
+            }
+        )
+    return curves
+
+
+@lru_cache(maxsize=CURVE_CACHE_SIZE)
+def _curve_points(payload_json, _calibrations):
+    # Keyed by the stored text, so an edited run is simply a new entry; a
+    # changed calibration library starts a new generation of entries.
+    return tuple(sample_curve(loads_payload(payload_json)))
+
+
+def size_at_percent(points, percent):
+    """
+    Log-interpolates the particle size (mm) at which `percent` passes, from
+    points ordered coarsest first. None when the curve does not reach it.
+    """
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        if (y1 - percent) * (y2 - percent) > 0 or y1 == y2:
+            continue
+        t = (percent - y1) / (y2 - y1)
+        return 10 ** (math.log10(x1) + t * (math.log10(x2) - math.log10(x1)))
+    return None
+
+
+def gradation_values(payload):
+    """Returns a dict of GRADATION_FIELDS for one grain-size payload."""
+    computed = compute_grain_size(payload)
+    points = sample_curve(payload, computed)
+    d10, d30, d60 = (size_at_percent(points, pct) for pct in (10.0, 30.0, 60.0))
+    cu = d60 / d10 if d10 and d60 else None
+    cc = d30 * d30 / (d10 * d60) if d10 and d30 and d60 else None
+    return {
+        "d10": d10,
+        "d30": d30,
+        "d60": d60,
+        "cu": cu,
+        "cc": cc,
+        "passing_no4": computed.get("sieve_pct_pass_no4"),
+        "passing_no200": computed.get("sieve_pct_pass_no200"),
+    }
+
+
+def refresh_gradation_metrics(project_id=None, sample_ids=None, rebuild=False):
+    """
+    Recomputes metrics for grain-size runs saved since their metrics were
+    stored (all runs with rebuild=True), limited to a project or samples
+    when given. Returns the number of samples recomputed.
+    """
+    where, params = [], []
+    if project_id is not None:
+        where.append("s.project_id = ?")
+        params.append(project_id)
+    if sample_ids is not None:
+        where.append("g.sample_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(sample_ids)))
+    if not rebuild:
+        where.append(
+            "(m.sample_id IS NULL OR m.run_id IS NOT g.id OR m.run_version IS NOT g.row_version"
+            " OR m.project_id IS NOT s.project_id)"
+        )
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT g.id, g.sample_id, g.row_version, g.payload_json, s.project_id
+            FROM grain_size_runs g
+            JOIN samples s ON s.id = g.sample_id
+            LEFT JOIN gradation_metrics m ON m.sample_id = g.sample_id
+            {"WHERE " + " AND ".join(where) if where else ""}
+            """,
+            params,
+        ).fetchall()
+        stamp = now_iso()
+        updates = []
+        for r in rows:
+            values = gradation_values(loads_payload(r["payload_json"]))
+            updates.append(
+                (r["sample_id"], r["project_id"], r["id"], r["row_version"])
+                + tuple(values[f] for f in GRADATION_FIELDS)
+                + (stamp,)
+            )
+        conn.executemany(
+            f"""
+            INSERT INTO gradation_metrics (
+                sample_id, project_id, run_id, run_version, {", ".join(GRADATION_FIELDS)}, computed_at
+            )
+            VALUES ({", ".join("?" * (len(GRADATION_FIELDS) + 5))})
+            ON CONFLICT(sample_id) DO UPDATE SET
+                project_id = excluded.project_id,
+                run_id = excluded.run_id,
+                run_version = excluded.run_version,
+                {", ".join(f"{f} = excluded.{f}" for f in GRADATION_FIELDS)},
+                computed_at = excluded.computed_at
+            """,
+            updates,
+        )
+        conn.execute(
+            """
+            DELETE FROM gradation_metrics
+            WHERE NOT EXISTS (SELECT 1 FROM grain_size_runs g WHERE g.sample_id = gradation_metrics.sample_id)
+            """
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(updates)
+
+
+def gradation_metrics(project_id=None, filters=None):
+    """
+    Brings metrics up to date and returns them with sample name and depth,
+    ordered by project and sample. filters maps a GRADATION_FIELDS name to
+    (min, max); either bound may be None.
+    """
+    refresh_gradation_metrics(project_id)
+    where, params = [], []
+    if project_id is not None:
+        where.append("m.project_id = ?")
+        params.append(project_id)
+    for name, (low, high) in (filters or {}).items():
+        if name not in GRADATION_FIELDS:
+            raise ValueError(f"Unknown gradation field: {name}")
+        if low is not None:
+            where.append(f"m.{name} >= ?")
+            params.append(low)
+        if high is not None:
+            where.append(f"m.{name} <= ?")
+            params.append(high)
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT m.sample_id, m.project_id, p.file_number, s.sample_name, s.depth_raw,
+                   {", ".join(f"m.{f}" for f in GRADATION_FIELDS)}
+            FROM gradation_metrics m
+            JOIN samples s ON s.id = m.sample_id
+            JOIN projects p ON p.id = m.project_id
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY p.file_number, s.sample_name, s.id
+            """,
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(r) for r in rows]
@@ -0,0 +1,172 @@
+"""
+Checks the query plans of the project-scoped access paths every tab uses.
+
+`check_plans` runs EXPLAIN QUERY PLAN for each entry in PLAN_CHECKS and
+reports full scans of the large tables, automatic (temporary) indexes and
+temp B-tree sorts for ORDER BY, which mean a supporting index is missing. `build_synthetic_db` creates a
+database of realistic size so plans can be checked as the planner will
+choose them in production rather than on an almost empty file.
+"""
+
+import random
+import sqlite3
+
+# (name, sql, params, expected plan fragments). Aliases: s = samples,
+# st = sample_tests, t = tests.
+PLAN_CHECKS = (
+    (
+        "project working set (all project tabs)",
+        """
+        SELECT s.id, s.sample_name, s.depth_raw, st.id, st.test_id, st.cost, st.status
+        FROM samples s
+        LEFT JOIN sample_tests st ON st.sample_id = s.id
+        WHERE s.project_id = ?
+        """,
+        (1,),
+        (
+            "SEARCH s USING INDEX idx_samples_project_name",
+            "SEARCH st USING INDEX ux_sample_tests_sample_test (sample_id=?)",
+        ),
+    ),
+    (
+        "project samples (Samples tab)",
+        "SELECT id, sample_name, depth_raw, status FROM samples WHERE project_id = ? ORDER BY sample_name, id",
+        (1,),
+        ("SEARCH samples USING INDEX idx_samples_project_name",),
+    ),
+    (
+        "project test list (Results export)",
+        """
+        SELECT DISTINCT t.id, t.name, t.code
+        FROM sample_tests st
+        JOIN tests t ON t.id = st.test_id
+        WHERE st.project_id = ?
+        ORDER BY t.code, t.name
+        """,
+        (1,),
+        ("SEARCH st USING COVERING INDEX idx_sample_tests_project",),
+    ),
+    (
+        "project rate sync (Tests/Billing tabs)",
+        "UPDATE sample_tests SET cost = cost WHERE project_id = ?",
+        (1,),
+        ("SEARCH sample_tests USING COVERING INDEX idx_sample_tests_project",),
+    ),
+    (
+        "assignment duplicate probe (test assignment)",
+        "SELECT 1 FROM sample_tests st WHERE st.sample_id = ? AND st.test_id = ?",
+        (1, 1),
+        ("SEARCH st USING COVERING INDEX ux_sample_tests_sample_test (sample_id=? AND test_id=?)",),
+    ),
+    (
+        "nearby project results (Map tab lab data)",
+        """
+        SELECT st.project_id, t.code, st.result_value, st.result_value2
+        FROM sample_tests st
+        JOIN tests t ON t.id = st.test_id
+        WHERE st.project_id IN (SELECT value FROM json_each(?))
+          AND st.test_id IN (SELECT id FROM tests WHERE code IN (SELECT value FROM json_each(?)))
+          AND (st.result_value IS NOT NULL OR st.result_value2 IS NOT NULL)
+        """,
+        ("[1, 2, 3]", '["EI", "MD"]'),
+        ("SEARCH st USING COVERING INDEX idx_sample_tests_project_results",),
+    ),
+    (
+        "runs using a calibration (calibration recompute)",
+        """
+        SELECT wr.sample_test_id, wr.payload_json, t.name
+        FROM worksheet_runs wr
+        JOIN sample_tests st ON st.id = wr.sample_test_id
+        JOIN tests t ON t.id = st.test_id
+        WHERE wr.calibration_id = ?
+        """,
+        (1,),
+        ("SEARCH wr USING INDEX idx_worksheet_runs_calibration",),
+    ),
+    (
+        "project status counts",
+        "SELECT st.status, COUNT(1) FROM sample_tests st WHERE st.project_id = ? GROUP BY st.status",
+        (1,),
+        ("SEARCH st USING COVERING INDEX idx_sample_tests_project",),
+    ),
+)
+
+_LARGE_TABLE_ALIASES = {"s", "st", "samples", "sample_tests"}
+
+
+def explain(conn, sql, params=()):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def check_plans(conn):
+    """
+    Returns [(name, plan lines, problems)] for PLAN_CHECKS; problems lists
+    the plan lines that scan a large table, build an automatic index or sort
+    for ORDER BY, and any expected index use missing from the plan.
+    """
+    report = []
+    for name, sql, params, expected in PLAN_CHECKS:
+        plan = explain(conn, sql, params)
+        problems = [line for line in plan if _is_problem(line)]
+        problems += [f"expected: {e}" for e in expected if not any(line.startswith(e) for line in plan)]
+        report.append((name, plan, problems))
+    return report
+
+
+def _is_problem(line):
+    if "AUTOMATIC" in line or line.startswith("USE TEMP B-TREE FOR ORDER BY"):
+        return True
+    words = line.split()
+    if len(words) >= 2 and words[0] == "SCAN" and words[1] in _LARGE_TABLE_ALIASES:
+        return "COVERING INDEX" not in line
+    return False
+
+
+def build_synthetic_db(path, migrations, projects=500, samples_per_project=40, tests_per_sample=6, seed=1):
+    """
+    Creates a database at `path` with the full schema (the given MIGRATIONS)
+    and projects x samples_per_project samples, each with tests_per_sample
+    assigned tests, then runs ANALYZE. Returns the path.
+    """
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    try:
+        cur = conn.cursor()
+        for number, step in enumerate(migrations, start=1):
+            step(cur)
+            cur.execute(f"PRAGMA user_version = {number}")
+        test_ids = [r[0] for r in cur.execute("SELECT id FROM tests").fetchall()]
+        rate_id = cur.execute("SELECT rate_id FROM billing_rates LIMIT 1").fetchone()[0]
+        cur.executemany(
+            """
+            INSERT INTO projects (file_number, job_name, client_type, client_name, billing_rate_id, created_at)
+            VALUES (?, ?, 'PRIVATE', ?, ?, '2024-01-01T00:00:00')
+            """,
+            [(f"SYN-{p:05d}", f"Synthetic job {p}", f"Client {p % 37}", rate_id) for p in range(projects)],
+        )
+        project_ids = [r[0] for r in cur.execute("SELECT id FROM projects WHERE file_number LIKE 'SYN-%'")]
+        cur.executemany(
+            "INSERT INTO samples (project_id, sample_name, sample_type, depth_raw, status) VALUES (?, ?, 'SB', ?, 'Inventory')",
+            [
+                (pid, f"B-{n // 4 + 1}", f"{(n % 4) * 5}-{(n % 4) * 5 + 5}'")
+                for pid in project_ids
+                for n in range(samples_per_project)
+            ],
+        )
+        sample_ids = [r[0] for r in cur.execute("SELECT id FROM samples")]
+        cur.executemany(
+            "INSERT INTO sample_tests (sample_id, test_id, cost, status) VALUES (?, ?, ?, ?)",
+            [
+                (sid, tid, 50.0, rnd.choice(("scheduled", "in progress", "completed")))
+                for sid in sample_ids
+                for tid in rnd.sample(test_ids, min(tests_per_sample, len(test_ids)))
+            ],
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return path
@@ -0,0 +1,420 @@
+"""
+Writes the interactive project map as a small static site that opens
+from disk without network access:
+
+    <map dir>/index.html          page and map script; rewritten only when its template changes
+    <map dir>/projects.geojson.js project points as GeoJSON, wrapped as a script
+    <map dir>/clusters.js         optional per-zoom grid clusters computed here
+    <map dir>/manifest.json       fingerprints of the data the files were built from
+    <map dir>/vendor/             Leaflet and Leaflet.markercluster, when available
+    <map dir>/tiles/{z}/{x}/{y}.png  local tile cache, used before the network
+
+The data files are rewritten only when the mapped projects change. Pages
+opened from file:// cannot fetch() local JSON, so the GeoJSON is loaded
+as a script that assigns it to window.geolabProjects.
+"""
+
+import hashlib
+import html
+import json
+import math
+import os
+import shutil
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlparse
+
+from app.db import DB_PATH, get_app_setting, get_connection
+
+MAP_DIR = DB_PATH.parent / "map"
+# Leaflet files shipped with the app (copied into each map's vendor folder).
+BUNDLED_VENDOR_DIR = Path(__file__).resolve().parents[2] / "assets" / "leaflet"
+
+LEAFLET_VERSION = "1.9.4"
+MARKERCLUSTER_VERSION = "1.5.3"
+VENDOR_FILES = {
+    "leaflet.js": f"https://unpkg.com/leaflet@{LEAFLET_VERSION}/dist/leaflet.js",
+    "leaflet.css": f"https://unpkg.com/leaflet@{LEAFLET_VERSION}/dist/leaflet.css",
+    "leaflet.markercluster.js": (
+        f"https://unpkg.com/leaflet.markercluster@{MARKERCLUSTER_VERSION}/dist/leaflet.markercluster.js"
+    ),
+    "MarkerCluster.css": f"https://unpkg.com/leaflet.markercluster@{MARKERCLUSTER_VERSION}/dist/MarkerCluster.css",
+    "MarkerCluster.Default.css": (
+        f"https://unpkg.com/leaflet.markercluster@{MARKERCLUSTER_VERSION}/dist/MarkerCluster.Default.css"
+    ),
+}
+# Leaflet's default marker and layer images, referenced from leaflet.css.
+VENDOR_IMAGES = {
+    f"images/{name}": f"https://unpkg.com/leaflet@{LEAFLET_VERSION}/dist/images/{name}"
+    for name in ("layers.png", "layers-2x.png", "marker-icon.png", "marker-icon-2x.png", "marker-shadow.png")
+}
+
+# Tiles missing from the cache load from the server set in the map_tile_url
+# setting or GEOLAB_TILE_URL, else from OpenStreetMap. The OpenStreetMap
+# tile servers forbid bulk downloading, so prefetch_tiles needs one of the
+# former (a self-hosted or permitted server).
+DEFAULT_TILE_URL = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+TILE_URL_SETTING = "map_tile_url"
+TILE_URL_ENV = "GEOLAB_TILE_URL"
+NO_PREFETCH_HOSTS = ("tile.openstreetmap.org",)
+USER_AGENT = "GeoLab/2 (project map tile cache)"
+MAX_PREFETCH_TILES = 5000
+
+# Server-side clusters are computed for zooms below DETAIL_ZOOM; from
+# DETAIL_ZOOM up every project is drawn on its own.
+CLUSTER_MIN_ZOOM = 3
+DETAIL_ZOOM = 12
+CLUSTER_CELL_PX = 64
+
+_POINT_QUERY = """
+    SELECT id, file_number, job_name, client_type, location_text, latitude, longitude
+    FROM projects
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ORDER BY created_at DESC, id DESC
+"""
+
+
+def export_map(out_dir=None, clusters=True):
+    """
+    Brings the map in out_dir (MAP_DIR by default) up to date and returns
+    {"path", "points", "rewritten"}; rewritten lists the files written.
+    """
+    out_dir = Path(out_dir or MAP_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    conn = get_connection()
+    try:
+        rows = conn.execute(_POINT_QUERY).fetchall()
+    finally:
+        conn.close()
+    points = [
+        (r["id"], r["file_number"], r["job_name"], r["client_type"] or "Custom", r["location_text"] or "",
+         float(r["latitude"]), float(r["longitude"]))
+        for r in rows
+    ]
+
+    manifest_path = out_dir / "manifest.json"
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    page = _page_html(_install_vendor(out_dir / "vendor"), configured_tile_url() or DEFAULT_TILE_URL)
+    wanted = {
+        "data": _fingerprint(json.dumps(points)),
+        "clusters": clusters,
+        "page": _fingerprint(page),
+    }
+
+    rewritten = []
+    index_path = out_dir / "index.html"
+    if manifest.get("page") != wanted["page"] or not index_path.exists():
+        index_path.write_text(page, encoding="utf-8")
+        rewritten.append(index_path.name)
+    data_path = out_dir / "projects.geojson.js"
+    data_changed = manifest.get("data") != wanted["data"] or not data_path.exists()
+    if data_changed:
+        data_path.write_text(f"window.geolabProjects = {json.dumps(_geojson(points))};\n", encoding="utf-8")
+        rewritten.append(data_path.name)
+    clusters_path = out_dir / "clusters.js"
+    if data_changed or manifest.get("clusters") != clusters or not clusters_path.exists():
+        payload = json.dumps(grid_clusters(points)) if clusters else "null"
+        clusters_path.write_text(f"window.geolabClusters = {payload};\n", encoding="utf-8")
+        rewritten.append(clusters_path.name)
+    if rewritten:
+        manifest_path.write_text(json.dumps(wanted, indent=2), encoding="utf-8")
+    return {"path": index_path, "points": len(points), "rewritten": rewritten}
+
+
+def grid_clusters(points, min_zoom=CLUSTER_MIN_ZOOM, max_zoom=DETAIL_ZOOM - 1, cell_px=CLUSTER_CELL_PX):
+    """
+    Groups points into square screen cells of cell_px at each zoom. Returns
+    {zoom: [[lat, lon, count], ...]} with each cluster at its points' mean.
+    """
+    projected = [(p[5], p[6], *_mercator(p[5], p[6])) for p in points]
+    result = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        scale = 256 * 2**zoom / cell_px
+        cells = {}
+        for lat, lon, x, y in projected:
+            key = (int(x * scale), int(y * scale))
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [lat, lon, 1]
+            else:
+                cell[0] += lat
+                cell[1] += lon
+                cell[2] += 1
+        result[zoom] = [[round(s_lat / n, 6), round(s_lon / n, 6), n] for s_lat, s_lon, n in cells.values()]
+    return result
+
+
+def fetch_assets(out_dir=None):
+    """Downloads the pinned Leaflet and markercluster files into the map's vendor folder."""
+    vendor = Path(out_dir or MAP_DIR) / "vendor"
+    fetched = []
+    for name, url in {**VENDOR_FILES, **VENDOR_IMAGES}.items():
+        target = vendor / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(_download(url))
+        fetched.append(name)
+    return fetched
+
+
+def configured_tile_url():
+    """The tile URL template from GEOLAB_TILE_URL or the map_tile_url setting, or None."""
+    return (os.getenv(TILE_URL_ENV) or get_app_setting(TILE_URL_SETTING, "") or "").strip() or None
+
+
+def prefetch_tiles(min_zoom, max_zoom, bbox=None, out_dir=None, max_tiles=MAX_PREFETCH_TILES):
+    """
+    Fills the tile cache for bbox (min_lat, min_lon, max_lat, max_lon; the
+    mapped projects' extent by default) at min_zoom..max_zoom from the
+    configured tile server, skipping tiles already cached. Raises ValueError
+    when no permitted server is configured or instead of fetching more than
+    max_tiles. Returns (downloaded, cached).
+    """
+    url = configured_tile_url()
+    host = (urlparse(url).hostname or "").lower() if url else ""
+    if not url or any(host == h or host.endswith("." + h) for h in NO_PREFETCH_HOSTS):
+        raise ValueError(
+            "Tile prefetch needs a self-hosted or permitted tile server: set it with "
+            f"'map --tile-url' or {TILE_URL_ENV}. The OpenStreetMap tile servers do not allow bulk downloads."
+        )
+    tiles_dir = Path(out_dir or MAP_DIR) / "tiles"
+    if bbox is None:
+        conn = get_connection()
+        try:
+            row = conn.execute(
+                """
+                SELECT MIN(latitude), MIN(longitude), MAX(latitude), MAX(longitude)
+                FROM projects
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                """
+            ).fetchone()
+        finally:
+            conn.close()
+        if row[0] is None:
+            return 0, 0
+        bbox = tuple(row)
+    min_lat, min_lon, max_lat, max_lon = bbox
+    tiles = []
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = _tile_xy(max_lat, min_lon, z)
+        x1, y1 = _tile_xy(min_lat, max_lon, z)
+        tiles.extend((z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    if len(tiles) > max_tiles:
+        raise ValueError(f"{len(tiles)} tiles requested; narrow the zoom range (limit {max_tiles}).")
+    downloaded = cached = 0
+    for z, x, y in tiles:
+        target = tiles_dir / str(z) / str(x) / f"{y}.png"
+        if target.exists():
+            cached += 1
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(_download(url.replace("{z}", str(z)).replace("{x}", str(x)).replace("{y}", str(y))))
+        downloaded += 1
+    return downloaded, cached
+
+
+def _install_vendor(vendor):
+    # Copies bundled Leaflet files the map folder does not have yet; returns
+    # whether the page can use local Leaflet (and local markercluster).
+    if BUNDLED_VENDOR_DIR.is_dir():
+        for src in BUNDLED_VENDOR_DIR.rglob("*"):
+            target = vendor / src.relative_to(BUNDLED_VENDOR_DIR)
+            if src.is_file() and not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, target)
+    has_leaflet = (vendor / "leaflet.js").exists() and (vendor / "leaflet.css").exists()
+    has_cluster = has_leaflet and (vendor / "leaflet.markercluster.js").exists()
+    return has_leaflet, has_cluster
+
+
+def _geojson(points):
+    # Properties are only shown in the popup, which is HTML.
+    esc = html.escape
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "file_number": esc(fn),
+                    "job_name": esc(job),
+                    "client_type": esc(client),
+                    "location_text": esc(loc),
+                },
+            }
+            for _id, fn, job, client, loc, lat, lon in points
+        ],
+    }
+
+
+def _fingerprint(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _mercator(lat, lon):
+    # Web Mercator position in 0..1 world units.
+    lat = max(-85.05112878, min(85.05112878, lat))
+    x = (lon + 180.0) / 360.0
+    s = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return x, y
+
+
+def _tile_xy(lat, lon, zoom):
+    x, y = _mercator(lat, lon)
+    n = 2**zoom
+    return min(n - 1, max(0, int(x * n))), min(n - 1, max(0, int(y * n)))
+
+
+def _download(url):
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def _page_html(vendored, tile_url):
+    has_leaflet, has_cluster = vendored
+    if has_leaflet:
+        head = '<link rel="stylesheet" href="vendor/leaflet.css"/>'
+        scripts = '<script src="vendor/leaflet.js"></script>'
+    else:
+        head = f'<link rel="stylesheet" href="{VENDOR_FILES["leaflet.css"]}"/>'
+        scripts = f'<script src="{VENDOR_FILES["leaflet.js"]}"></script>'
+    if has_cluster:
+        head += '\n  <link rel="stylesheet" href="vendor/MarkerCluster.css"/>'
+        head += '\n  <link rel="stylesheet" href="vendor/MarkerCluster.Default.css"/>'
+        scripts += '\n  <script src="vendor/leaflet.markercluster.js"></script>'
+    return _PAGE_TEMPLATE.replace("{{HEAD}}", head).replace("{{SCRIPTS}}", scripts).replace(
+        "{{DETAIL_ZOOM}}", str(DETAIL_ZOOM)
+    ).replace("{{TILE_URL}}", json.dumps(tile_url).replace("</", "<\\/"))
+
+
+_PAGE_TEMPLATE = """<!doctype html>
+<html>
+<head>
+  <meta charset="utf-8"/>
+  <title>GeoLab Project Map</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  {{HEAD}}
+  <style>
+    html, body, #map { height: 100%; margin: 0; padding: 0; }
+    .legend {
+      position: absolute; z-index: 9999; right: 10px; top: 10px;
+      background: rgba(255,255,255,0.95); padding: 10px 12px;
+      border: 1px solid #ccc; border-radius: 8px; font-family: Segoe UI, sans-serif; font-size: 13px;
+    }
+    .cluster-label { background: none; border: none; color: #0b1b14; font: 600 12px Segoe UI, sans-serif; text-align: center; }
+  </style>
+</head>
+<body>
+  <div id="map"></div>
+  <div class="legend">
+    <div><strong>GeoLab Jobs</strong> (<span id="count">0</span>)</div>
+    <div>Default extent: California + Arizona</div>
+    <div style="margin-top:6px;"><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#3d82f6;margin-right:6px;"></span>TCI</div>
+    <div><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#23a26d;margin-right:6px;"></span>GCI</div>
+    <div><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#f0a42c;margin-right:6px;"></span>SBCI</div>
+    <div><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#8b96a8;margin-right:6px;"></span>Custom/Other</div>
+  </div>
+  {{SCRIPTS}}
+  <script src="projects.geojson.js"></script>
+  <script src="clusters.js"></script>
+  <script>
+    const DETAIL_ZOOM = {{DETAIL_ZOOM}};
+    const REMOTE_TILES = {{TILE_URL}};
+    const data = window.geolabProjects || { type: 'FeatureCollection', features: [] };
+    const clusters = window.geolabClusters || null;
+    document.getElementById('count').textContent = data.features.length;
+    const map = L.map('map', { preferCanvas: true }).setView([34.2, -115.5], 6);
+    const clientColors = {
+      TCI: { stroke: '#2c63bf', fill: '#3d82f6' },
+      GCI: { stroke: '#1a7f55', fill: '#23a26d' },
+      SBCI: { stroke: '#c47f12', fill: '#f0a42c' },
+      CUSTOM: { stroke: '#6f7888', fill: '#8b96a8' }
+    };
+
+    // Tiles come from the local cache folder; missing ones fall back to the network.
+    const CachedTiles = L.TileLayer.extend({
+      createTile: function (coords, done) {
+        const tile = document.createElement('img');
+        tile.alt = '';
+        tile.onload = function () { done(null, tile); };
+        tile.onerror = function (err) {
+          if (tile.dataset.remote) { done(err, tile); return; }
+          tile.dataset.remote = '1';
+          tile.src = L.Util.template(REMOTE_TILES, { z: coords.z, x: coords.x, y: coords.y });
+        };
+        tile.src = this.getTileUrl(coords);
+        return tile;
+      }
+    });
+    new CachedTiles('tiles/{z}/{x}/{y}.png', {
+      maxZoom: 19,
+      attribution: '&copy; OpenStreetMap contributors'
+    }).addTo(map);
+
+    function pointMarker(feature, latlng) {
+      const p = feature.properties;
+      const clr = clientColors[(p.client_type || 'Custom').toUpperCase()] || clientColors.CUSTOM;
+      return L.circleMarker(latlng, { radius: 6, color: clr.stroke, fillColor: clr.fill, fillOpacity: 0.85 });
+    }
+    function popup(feature, layer) {
+      const p = feature.properties;
+      const c = feature.geometry.coordinates;
+      layer.bindPopup(
+        `<strong>${p.file_number}</strong><br/>${p.job_name}<br/>Client: ${p.client_type}<br/>` +
+        `${p.location_text || 'No location text'}<br/>${c[1].toFixed(5)}, ${c[0].toFixed(5)}`
+      );
+    }
+    const points = L.geoJSON(data, { pointToLayer: pointMarker, onEachFeature: popup });
+
+    if (L.markerClusterGroup) {
+      const group = L.markerClusterGroup({ chunkedLoading: true, disableClusteringAtZoom: DETAIL_ZOOM });
+      group.addLayer(points);
+      map.addLayer(group);
+    } else if (clusters) {
+      // Precomputed grid clusters below DETAIL_ZOOM, single points above.
+      const clusterLayer = L.layerGroup();
+      const firstClusterZoom = Math.min(...Object.keys(clusters).map(Number));
+      function drawClusters() {
+        const zoom = map.getZoom();
+        clusterLayer.clearLayers();
+        if (zoom >= DETAIL_ZOOM) {
+          map.removeLayer(clusterLayer);
+          map.addLayer(points);
+          return;
+        }
+        map.removeLayer(points);
+        const cells = clusters[Math.max(zoom, firstClusterZoom)] || [];
+        for (const [lat, lon, n] of cells) {
+          if (n === 1) {
+            L.circleMarker([lat, lon], { radius: 6, color: '#2c63bf', fillColor: '#3d82f6', fillOpacity: 0.85 }).addTo(clusterLayer);
+            continue;
+          }
+          const r = 10 + Math.min(20, Math.log2(n) * 3);
+          L.circleMarker([lat, lon], { radius: r, color: '#2c63bf', fillColor: '#8fb8f0', fillOpacity: 0.8 })
+            .on('click', () => map.setView([lat, lon], zoom + 2))
+            .addTo(clusterLayer);
+          L.marker([lat, lon], {
+            interactive: false,
+            icon: L.divIcon({ className: 'cluster-label', html: String(n), iconSize: [r * 2, r * 2] })
+          }).addTo(clusterLayer);
+        }
+        map.addLayer(clusterLayer);
+      }
+      map.on('zoomend', drawClusters);
+      drawClusters();
+    } else {
+      points.addTo(map);
+    }
+
+    if (data.features.length > 0) {
+      map.fitBounds(points.getBounds(), { padding: [40, 40], maxZoom: 12 });
+    }
+  </script>
+</body>
+</html>
+"""
@@ -0,0 +1,148 @@
+"""
+Lab results from past projects near a site: count, mean and percentiles
+per test metric (expansion index, max density, fines) within a radius.
+
+Projects come from the location index (app.services.spatial) and their
+results from idx_sample_tests_project_results. Both are cached per grid
+cell of CELL_DEG degrees: an entry holds every project within the radius
+plus the cell's half-diagonal of the cell center, with their results, so
+any center in the cell is answered exactly from memory by re-checking the
+distance. Saved results make entries stale: code that writes results or
+project coordinates calls invalidate_nearby_results, and the app calls it
+for other workstations' writes when the change feed reports them.
+"""
+
+import json
+import math
+from collections import OrderedDict
+
+from app.db import get_connection
+from app.services.spatial import DEFAULT_RADIUS_MILES, EARTH_RADIUS_MILES, haversine_miles, projects_within
+
+CELL_DEG = 0.01
+CACHE_CELLS = 64
+# (test code, sample_tests column, label, unit), in display order.
+RESULT_METRICS = (
+    ("EI", "result_value", "Expansion Index", ""),
+    ("MD", "result_value", "Max Dry Density", "pcf"),
+    ("MD", "result_value2", "Optimum Moisture", "%"),
+    ("SPA", "result_value2", "Passing No. 200 (sieve)", "%"),
+    ("2WS", "result_value", "Passing No. 200 (wash)", "%"),
+)
+
+# Farther than any point of a cell lies from its center.
+_CELL_PAD_MILES = math.radians(CELL_DEG) * EARTH_RADIUS_MILES
+_CACHE = OrderedDict()
+
+
+def nearby_result_stats(lat, lon, miles=DEFAULT_RADIUS_MILES, exclude_project_id=None):
+    """
+    Returns one dict per RESULT_METRICS entry with results within `miles`:
+    code, metric, unit, count, projects, mean, min, p10, median, p90, max.
+    """
+    lat_cell, lon_cell = math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG)
+    entry = _cell_entry(lat_cell, lon_cell, miles)
+    values = {}
+    for project_id, (p_lat, p_lon, results) in entry.items():
+        if project_id == exclude_project_id or not results:
+            continue
+        if haversine_miles(lat, lon, p_lat, p_lon) > miles:
+            continue
+        for index, value in results:
+            bucket = values.setdefault(index, ([], set()))
+            bucket[0].append(value)
+            bucket[1].add(project_id)
+
+    stats = []
+    for index, (code, _column, label, unit) in enumerate(RESULT_METRICS):
+        if index not in values:
+            continue
+        found, projects = values[index]
+        found.sort()
+        stats.append(
+            {
+                "code": code,
+                "metric": label,
+                "unit": unit,
+                "count": len(found),
+                "projects": len(projects),
+                "mean": sum(found) / len(found),
+                "min": found[0],
+                "p10": _percentile(found, 10),
+                "median": _percentile(found, 50),
+                "p90": _percentile(found, 90),
+                "max": found[-1],
+            }
+        )
+    return stats
+
+
+def invalidate_nearby_results(project_ids=None):
+    """
+    Drops cached cells holding any of project_ids, or every cell when
+    project_ids is None (needed when project coordinates change).
+    """
+    if project_ids is None:
+        _CACHE.clear()
+        return
+    project_ids = set(project_ids)
+    for key in [k for k, entry in _CACHE.items() if not project_ids.isdisjoint(entry)]:
+        del _CACHE[key]
+
+
+def _cell_entry(lat_cell, lon_cell, miles):
+    key = (lat_cell, lon_cell, miles)
+    entry = _CACHE.get(key)
+    if entry is not None:
+        _CACHE.move_to_end(key)
+        return entry
+
+    center_lat = (lat_cell + 0.5) * CELL_DEG
+    center_lon = (lon_cell + 0.5) * CELL_DEG
+    projects = projects_within(center_lat, center_lon, miles + _CELL_PAD_MILES)
+    entry = {p["id"]: (p["latitude"], p["longitude"], []) for p in projects}
+    if entry:
+        for project_id, index, value in _load_results(list(entry)):
+            entry[project_id][2].append((index, value))
+
+    _CACHE[key] = entry
+    if len(_CACHE) > CACHE_CELLS:
+        _CACHE.popitem(last=False)
+    return entry
+
+
+def _load_results(project_ids):
+    columns = {}
+    for index, (code, column, _label, _unit) in enumerate(RESULT_METRICS):
+        columns.setdefault(code, []).append((index, column))
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT st.project_id, t.code, st.result_value, st.result_value2
+            FROM sample_tests st
+            JOIN tests t ON t.id = st.test_id
+            WHERE st.project_id IN (SELECT value FROM json_each(?))
+              AND st.test_id IN (SELECT id FROM tests WHERE code IN (SELECT value FROM json_each(?)))
+              AND (st.result_value IS NOT NULL OR st.result_value2 IS NOT NULL)
+            """,
+            (json.dumps(project_ids), json.dumps(list(columns))),
+        ).fetchall()
+    finally:
+        conn.close()
+    for r in rows:
+        for index, column in columns[r["code"]]:
+            try:
+                value = float(r[column])
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(value):
+                yield r["project_id"], index, value
+
+
+def _percentile(ordered, pct):
+    # Linear interpolation between closest ranks.
+    pos = (len(ordered) - 1) * pct / 100
+    low = math.floor(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
@@ -0,0 +1,187 @@
+"""
+Compact, versioned encoding for worksheet payloads (grain_size_runs and
+worksheet_runs payload_json).
+
+Worksheet forms save every field as a string, most of them empty. The
+compact form keeps the payload a JSON object, so change_log deltas and
+history reconstruction keep working, but stores:
+
+    {"$v": 1,
+     "f": {non-empty fields, exact numbers as JSON numbers},
+     "s": {series: [one value per position, "" for blank]},
+     "b": bitmask of LAYOUTS[v] scalar fields saved blank,
+     "e": [other fields saved blank],
+     "r": JSON text of non-string values}
+
+Numbers are only packed when they print back to the same text, so decoding
+returns exactly the payload that was encoded; the decoder reads them back
+as their literal text, which keeps it to a few dict updates. Payloads
+without "$v" are the legacy plain JSON and are returned as stored.
+"""
+
+import json
+import math
+from functools import lru_cache
+
+PAYLOAD_VERSION = 1
+DECODE_CACHE_SIZE = 256
+
+_SIEVES_V1 = ("3_4in", "3_8in", "no4", "no10", "no16", "no40", "no50", "no100", "no200")
+_HYDRO_TIMES_V1 = ("1", "2", "5", "10", "15", "30", "60", "250", "1440")
+
+# Reads packed numbers back as their literal text.
+_DECODER = json.JSONDecoder(parse_int=str, parse_float=str)
+
+# Field layouts by version. Positions are part of the format: a layout is
+# never edited once shipped; changes go into a new version.
+LAYOUTS = {
+    1: {
+        "scalars": (
+            "wash_a_wet_tare",
+            "wash_b_dry_tare",
+            "wash_c_tare",
+            "wash_e_moist_soil",
+            "wash_h_dry40_tare",
+            "wash_i_tare40",
+            "wash_k_dry200_tare",
+            "wash_l_tare200",
+            "sieve_a_prewash_dry_weight",
+            "sieve_uscs_class",
+            "hydro_enabled",
+            "hydro_points",
+            "hydro_gs",
+            "hydro_moist_sample_mass",
+            "hydro_hydrostatic_moisture",
+            "hydro_w",
+            "hydro_pct_finer_no10",
+            "hydro_cal_t1",
+            "hydro_cal_c1",
+            "hydro_cal_t2",
+            "hydro_cal_c2",
+            "hydro_cal_t3",
+            "hydro_cal_c3",
+            "hydro_cal_t4",
+            "hydro_cal_c4",
+        ),
+        "series": {
+            "sieve_pre": tuple(f"sieve_pre_{k}" for k in _SIEVES_V1),
+            "sieve_post": tuple(f"sieve_post_{k}" for k in _SIEVES_V1),
+            "hydro_temp": tuple(f"hydro_temp_{t}" for t in _HYDRO_TIMES_V1),
+            "hydro_ra": tuple(f"hydro_ra_{t}" for t in _HYDRO_TIMES_V1),
+        },
+    },
+}
+
+
+def encode_payload(payload):
+    """Returns the compact JSON text for a payload dict."""
+    layout = LAYOUTS[PAYLOAD_VERSION]
+    rest = dict(payload or {})
+    out = {"$v": PAYLOAD_VERSION}
+
+    series = {}
+    for name, keys in layout["series"].items():
+        # Only whole series of strings are packed; anything else is stored
+        # field by field below.
+        if all(isinstance(rest.get(k), str) for k in keys):
+            values = [_pack(rest.pop(k)) for k in keys]
+            while values and values[-1] == "":
+                values.pop()
+            series[name] = values
+
+    blank_mask = 0
+    for bit, key in enumerate(layout["scalars"]):
+        if rest.get(key) == "":
+            del rest[key]
+            blank_mask |= 1 << bit
+
+    fields, blanks, raw = {}, [], {}
+    for key, value in rest.items():
+        if not isinstance(value, str):
+            raw[key] = value
+        elif value == "":
+            blanks.append(key)
+        else:
+            fields[key] = _pack(value)
+
+    for key, value in (("f", fields), ("s", series), ("b", blank_mask), ("e", blanks)):
+        if value:
+            out[key] = value
+    if raw:
+        out["r"] = json.dumps(raw)
+    return json.dumps(out, separators=(",", ":"))
+
+
+def decode_payload(raw):
+    """
+    Returns the payload dict for payload_json text, compact or legacy.
+    Unreadable text and unknown (newer) versions decode to {}.
+    """
+    if not raw:
+        return {}
+    # Re-selecting a row decodes the same text again; the cache hands out
+    # copies so callers can edit what they get.
+    return dict(_decode_text(raw))
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def _decode_text(raw):
+    try:
+        if not is_compact(raw):
+            obj = json.loads(raw)
+            return obj if isinstance(obj, dict) else {}
+        obj = _DECODER.decode(raw)
+    except (TypeError, ValueError):
+        return {}
+    version = int(obj["$v"])
+    layout = LAYOUTS.get(version)
+    if layout is None:
+        return {}
+
+    payload = {}
+    series = obj.get("s")
+    if series:
+        for name, keys in layout["series"].items():
+            values = series.get(name)
+            if values is None:
+                continue
+            if len(values) < len(keys):
+                payload.update(dict.fromkeys(keys, ""))
+            payload.update(zip(keys, values))
+    if "b" in obj:
+        payload.update(_blank_fields(version, int(obj["b"])))
+    if "e" in obj:
+        payload.update(dict.fromkeys(obj["e"], ""))
+    payload.update(obj.get("f", ()))
+    if "r" in obj:
+        payload.update(json.loads(obj["r"]))
+    return payload
+
+
+@lru_cache(maxsize=256)
+def _blank_fields(version, mask):
+    # Forms are saved with the same few sets of blank fields over and over.
+    scalars = LAYOUTS[version]["scalars"]
+    return {key: "" for bit, key in enumerate(scalars) if mask >> bit & 1}
+
+
+def is_compact(raw):
+    return bool(raw) and raw.startswith('{"$v":')
+
+
+def _pack(text):
+    if text == "":
+        return text
+    try:
+        number = int(text)
+        if str(number) == text:
+            return number
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    if math.isfinite(number) and repr(number) == text:
+        return number
+    return text
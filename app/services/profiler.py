@@ -0,0 +1,255 @@
+"""
+Query profiler for every connection handed out by app.db.get_connection.
+
+Each statement is recorded with its time (execute plus fetches), row count
+and the tab method or function that issued it, in a fixed-size ring buffer.
+Statements slower than slow_ms also get their EXPLAIN QUERY PLAN captured
+once per distinct SQL text. Settings -> Diagnostics shows the buffer
+grouped by statement and can dump it to JSON.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+DEFAULT_CAPACITY = 5000
+DEFAULT_SLOW_MS = 50.0
+PLAN_CACHE_LIMIT = 500
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+# Frames in these modules are plumbing, never the caller worth reporting.
+_PLUMBING = {__name__, "app.services.storage", "app.services.repository"}
+_SPACES = re.compile(r"\s+")
+
+
+class QueryProfiler:
+    def __init__(self, capacity=DEFAULT_CAPACITY, slow_ms=DEFAULT_SLOW_MS, enabled=True):
+        self.slow_ms = slow_ms
+        self.enabled = enabled
+        self._entries = deque(maxlen=capacity)
+        self._plans = {}
+        self._texts = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, conn):
+        return ProfiledConnection(conn, self) if self.enabled else conn
+
+    def entries(self):
+        with self._lock:
+            entries = [dict(e) for e in self._entries]
+        for e in entries:
+            e["at"] = datetime.fromtimestamp(e["at"]).isoformat(timespec="milliseconds")
+        return entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+    def summary(self):
+        """Entries grouped by SQL text, slowest total time first."""
+        groups = {}
+        for e in self.entries():
+            g = groups.get(e["sql"])
+            if g is None:
+                g = groups[e["sql"]] = {
+                    "sql": e["sql"],
+                    "calls": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "rows": 0,
+                    "callers": {},
+                    "plan": None,
+                }
+            g["calls"] += 1
+            g["total_ms"] += e["ms"]
+            g["max_ms"] = max(g["max_ms"], e["ms"])
+            g["rows"] += e["rows"]
+            g["callers"][e["caller"]] = g["callers"].get(e["caller"], 0) + 1
+            g["plan"] = g["plan"] or e["plan"]
+        result = sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+        for g in result:
+            g["total_ms"] = round(g["total_ms"], 3)
+            g["avg_ms"] = round(g["total_ms"] / g["calls"], 3)
+            g["callers"] = sorted(g["callers"], key=g["callers"].get, reverse=True)
+        return result
+
+    def dump(self, path):
+        data = {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "slow_ms": self.slow_ms,
+            "summary": self.summary(),
+            "entries": self.entries(),
+        }
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=2)
+        return path
+
+    def _start(self, sql, many=None):
+        entry = {
+            "at": time.time(),
+            "sql": self._normalize(sql),
+            "ms": 0.0,
+            "rows": 0,
+            "caller": _caller(),
+            "plan": None,
+        }
+        if many is not None:
+            entry["batch"] = many
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def _finish(self, entry, elapsed, conn, sql, params):
+        entry["ms"] = round(entry["ms"] + elapsed * 1000.0, 3)
+        if entry["ms"] >= self.slow_ms and entry["plan"] is None:
+            entry["plan"] = self._plan(conn, sql, params)
+
+    def _normalize(self, sql):
+        text = self._texts.get(sql)
+        if text is None:
+            if len(self._texts) >= PLAN_CACHE_LIMIT:
+                self._texts.clear()
+            text = self._texts[sql] = _SPACES.sub(" ", sql).strip()
+        return text
+
+    def _plan(self, conn, sql, params):
+        key = self._normalize(sql)
+        plan = self._plans.get(key)
+        if plan is not None or not key.upper().startswith(_EXPLAINABLE):
+            return plan
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except (sqlite3.Error, ValueError):
+            return None
+        plan = [row[3] for row in rows]
+        with self._lock:
+            if len(self._plans) >= PLAN_CACHE_LIMIT:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
+
+
+class ProfiledCursor:
+    def __init__(self, cursor, conn, profiler):
+        self._cursor = cursor
+        self._conn = conn
+        self._profiler = profiler
+        self._entry = None
+        self._sql = None
+        self._params = ()
+
+    def execute(self, sql, params=()):
+        self._begin(sql, params)
+        started = time.perf_counter()
+        self._cursor.execute(sql, params)
+        self._after_execute(started)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        self._begin(sql, seq_of_params[0] if seq_of_params else (), many=len(seq_of_params))
+        started = time.perf_counter()
+        self._cursor.executemany(sql, seq_of_params)
+        self._after_execute(started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._after_fetch(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._after_fetch(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._after_fetch(started, len(rows))
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _begin(self, sql, params, many=None):
+        self._sql = sql
+        self._params = params
+        self._entry = self._profiler._start(sql, many)
+
+    def _after_execute(self, started):
+        elapsed = time.perf_counter() - started
+        if self._cursor.description is None and self._cursor.rowcount > 0:
+            self._entry["rows"] = self._cursor.rowcount
+        self._profiler._finish(self._entry, elapsed, self._conn, self._sql, self._params)
+
+    def _after_fetch(self, started, count):
+        elapsed = time.perf_counter() - started
+        if self._entry is None:
+            return
+        self._entry["rows"] += count
+        self._profiler._finish(self._entry, elapsed, self._conn, self._sql, self._params)
+
+
+class ProfiledConnection:
+    def __init__(self, conn, profiler):
+        self._conn = conn
+        self._profiler = profiler
+
+    def cursor(self):
+        return ProfiledCursor(self._conn.cursor(), self._conn, self._profiler)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+
+def _caller():
+    # Prefer the UI method that issued the query; fall back to the nearest
+    # app function for work started outside the UI (CLI, backup thread).
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and module not in _PLUMBING:
+            code = frame.f_code
+            name = f"{module.rsplit('.', 1)[-1]}.{getattr(code, 'co_qualname', code.co_name)}"
+            if module.startswith("app.ui."):
+                return name
+            fallback = fallback or name
+        frame = frame.f_back
+    return fallback or "?"
+
+
+PROFILER = QueryProfiler(
+    slow_ms=float(os.getenv("GEOLAB_SLOW_QUERY_MS", DEFAULT_SLOW_MS)),
+    enabled=os.getenv("GEOLAB_PROFILE", "1") != "0",
+)
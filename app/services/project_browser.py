@@ -0,0 +1,94 @@
+import json
+
+from app.db import get_connection
+
+PAGE_SIZE = 100
+
+# Sort key -> SQL expression. Every page is ordered by (expression, id) so the
+# last row of a page is a stable keyset cursor for the next one. created_at and
+# file_number are served by indexes; the rest sort in SQL without one.
+PROJECT_SORTS = {
+    "created": "p.created_at",
+    "file": "p.file_number",
+    "job": "p.job_name",
+    "client": "p.client_type",
+    "rate": "p.billing_rate_id",
+    "location": "COALESCE(p.location_text, '')",
+    "status": "p.status",
+    "remaining": "COALESCE(pp.remaining_tests, 0)",
+}
+
+
+def fetch_projects_page(sort="created", descending=True, after=None, limit=PAGE_SIZE):
+    """
+    Returns (rows, cursor) for one page of projects ordered by `sort`.
+    Pass the returned cursor as `after` to fetch the next page; it is None
+    once the last page has been read.
+    """
+    expr = PROJECT_SORTS.get(sort)
+    if expr is None:
+        raise ValueError(f"Unknown project sort: {sort}")
+    direction = "DESC" if descending else "ASC"
+    params = []
+    where = ""
+    if after is not None:
+        where = f"WHERE ({expr}, p.id) {'<' if descending else '>'} (?, ?)"
+        params.extend(after)
+    params.append(limit + 1)
+
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT p.id, p.file_number, p.job_name, p.client_type, p.billing_rate_id, p.location_text, p.status,
+               p.latitude, p.longitude, pp.remaining_tests AS remaining, {expr} AS sort_value
+        FROM projects p
+        LEFT JOIN project_progress pp ON pp.project_id = p.id
+        {where}
+        ORDER BY {expr} {direction}, p.id {direction}
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+    conn.close()
+
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = (rows[-1]["sort_value"], rows[-1]["id"])
+    return rows, cursor
+
+
+def fetch_projects_by_id(project_ids, sort="created"):
+    """
+    Returns list rows for the given projects, keyed by id, with the sort_value
+    `sort` orders them by; missing ids are deleted projects.
+    """
+    expr = PROJECT_SORTS.get(sort)
+    if expr is None:
+        raise ValueError(f"Unknown project sort: {sort}")
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT p.id, p.file_number, p.job_name, p.client_type, p.billing_rate_id, p.location_text, p.status,
+               p.latitude, p.longitude, pp.remaining_tests AS remaining, {expr} AS sort_value
+        FROM projects p
+        LEFT JOIN project_progress pp ON pp.project_id = p.id
+        WHERE p.id IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(list(project_ids)),),
+    ).fetchall()
+    conn.close()
+    return {r["id"]: r for r in rows}
+
+
+def count_projects():
+    conn = get_connection()
+    row = conn.execute(
+        """
+        SELECT COUNT(1) AS total,
+               SUM(CASE WHEN latitude IS NOT NULL AND longitude IS NOT NULL THEN 1 ELSE 0 END) AS mapped
+        FROM projects
+        """
+    ).fetchone()
+    conn.close()
+    return row["total"], row["mapped"] or 0
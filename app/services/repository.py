@@ -0,0 +1,448 @@
+"""
+Data access for projects, samples, sample tests, worksheet runs and
+billing rates. Each repository opens a connection per call through
+`connect` (app.db.get_connection by default), so it works the same against
+the local SQLite file and a served database. Batched methods take id lists
+and answer them with one query instead of one query per id.
+
+Saves that must not overwrite another workstation's edit take `checks`,
+(table, key column, key, expected row_version) tuples verified under the
+write lock; a mismatch raises ConflictError and writes nothing.
+"""
+
+import json
+from contextlib import contextmanager
+
+from app.db import get_connection, now_iso
+from app.services.concurrency import expect_version, read_version
+from app.services.test_assignment import insert_assignments
+
+PROJECT_COLUMNS = (
+    "file_number",
+    "job_name",
+    "client_type",
+    "client_name",
+    "billing_rate_id",
+    "billing_year",
+    "billing_kind",
+    "status",
+    "location_text",
+    "latitude",
+    "longitude",
+)
+
+SAMPLE_COLUMNS = (
+    "sample_name",
+    "sample_type",
+    "depth_raw",
+    "depth_from",
+    "depth_to",
+    "depth_unit",
+    "received_date",
+    "storage_location",
+    "disposal_date",
+    "status",
+)
+RESULT_COLUMNS = (
+    "result_value",
+    "result_unit",
+    "result_value2",
+    "result_unit2",
+    "result_value3",
+    "result_unit3",
+    "result_value4",
+    "result_unit4",
+    "result_notes",
+)
+_RESULT_SELECT = ", ".join(f"st.{c}" for c in RESULT_COLUMNS[:-1])
+
+
+class _Repository:
+    def __init__(self, connect=None):
+        self._connect = connect or get_connection
+
+    def _fetchall(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _write(self, sql, params=()):
+        conn = self._connect()
+        try:
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _locked(self, checks=()):
+        # BEGIN IMMEDIATE, version checks, then the caller's writes, committed together.
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table, key_col, key, expected in checks:
+                    expect_version(conn, table, key_col, key, expected)
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _set_clause(columns):
+    return ", ".join(f"{c} = ?" for c in columns)
+
+
+class ProjectRepository(_Repository):
+    def get(self, project_id):
+        """The project's id and PROJECT_COLUMNS, or None."""
+        rows = self._fetchall(
+            f"SELECT id, {', '.join(PROJECT_COLUMNS)} FROM projects WHERE id = ?",
+            (project_id,),
+        )
+        return rows[0] if rows else None
+
+    def insert(self, values):
+        """values maps PROJECT_COLUMNS names to values; returns the new id."""
+        return self._write(
+            f"INSERT INTO projects ({', '.join(PROJECT_COLUMNS)}, created_at) "
+            f"VALUES ({', '.join('?' for _ in PROJECT_COLUMNS)}, ?)",
+            (*(values.get(c) for c in PROJECT_COLUMNS), now_iso()),
+        ).lastrowid
+
+    def update(self, project_id, values):
+        columns = [c for c in PROJECT_COLUMNS if c in values]
+        if not columns:
+            return
+        self._write(
+            f"UPDATE projects SET {_set_clause(columns)} WHERE id = ?",
+            (*(values[c] for c in columns), project_id),
+        )
+
+    def delete_many(self, project_ids):
+        return self._write(
+            "DELETE FROM projects WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(project_ids)),),
+        ).rowcount
+
+    def result_matrix(self, project_id):
+        """Samples, distinct assigned tests and every assignment's results, for the results table."""
+        conn = self._connect()
+        try:
+            samples = conn.execute(
+                """
+                SELECT id, sample_name, sample_type, depth_raw
+                FROM samples
+                WHERE project_id = ?
+                ORDER BY sample_name, id
+                """,
+                (project_id,),
+            ).fetchall()
+            tests = conn.execute(
+                """
+                SELECT DISTINCT t.id, t.name, t.code
+                FROM sample_tests st
+                JOIN tests t ON t.id = st.test_id
+                WHERE st.project_id = ?
+                ORDER BY t.code, t.name
+                """,
+                (project_id,),
+            ).fetchall()
+            results = conn.execute(
+                f"""
+                SELECT st.sample_id, st.test_id, t.name AS test_name, {_RESULT_SELECT}
+                FROM sample_tests st
+                JOIN tests t ON t.id = st.test_id
+                WHERE st.project_id = ?
+                """,
+                (project_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return samples, tests, results
+
+    def results_for_test(self, project_id, test_name):
+        return self._fetchall(
+            """
+            SELECT s.sample_name, s.depth_raw, st.result_value, st.result_unit,
+                   st.result_value2, st.result_unit2, st.result_value3, st.result_unit3,
+                   st.result_unit4
+            FROM sample_tests st
+            JOIN samples s ON s.id = st.sample_id
+            JOIN tests t ON t.id = st.test_id
+            WHERE st.project_id = ? AND t.name = ?
+            ORDER BY s.sample_name, s.depth_raw
+            """,
+            (project_id, test_name),
+        )
+
+
+class SampleRepository(_Repository):
+    def insert(self, project_id, values):
+        """values maps SAMPLE_COLUMNS names to values; returns the new id."""
+        return self._write(
+            f"INSERT INTO samples (project_id, {', '.join(SAMPLE_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in SAMPLE_COLUMNS)})",
+            (project_id, *(values.get(c) for c in SAMPLE_COLUMNS)),
+        ).lastrowid
+
+    def update(self, sample_id, values):
+        columns = [c for c in SAMPLE_COLUMNS if c in values]
+        if not columns:
+            return
+        self._write(
+            f"UPDATE samples SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+            (*(values[c] for c in columns), sample_id),
+        )
+
+    def delete_many(self, sample_ids):
+        return self._write(
+            "DELETE FROM samples WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(sample_ids)),),
+        ).rowcount
+
+
+class SampleTestRepository(_Repository):
+    def assign(self, sample_ids, test_ids, status="scheduled", cost=None):
+        """Adds the tests to each sample, skipping existing ones; returns the count added."""
+        conn = self._connect()
+        try:
+            added = insert_assignments(conn, sample_ids, test_ids, status=status, cost=cost)
+            conn.commit()
+            return added
+        finally:
+            conn.close()
+
+    def delete_many(self, sample_test_ids):
+        return self._write(
+            "DELETE FROM sample_tests WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(sample_test_ids)),),
+        ).rowcount
+
+    def save_results(self, sample_test_id, values, expected_version):
+        """Writes RESULT_COLUMNS and status from values if the row is still at expected_version."""
+        columns = [c for c in RESULT_COLUMNS + ("status",) if c in values]
+        with self._locked([("sample_tests", "id", sample_test_id, expected_version)]) as conn:
+            conn.execute(
+                f"UPDATE sample_tests SET {_set_clause(columns)} WHERE id = ?",
+                (*(values[c] for c in columns), sample_test_id),
+            )
+
+    def reprice(self, project_id):
+        """Sets the project's assignment costs to its billing rate's prices; returns rows changed."""
+        return self._write(
+            """
+            UPDATE sample_tests
+            SET cost = (
+                SELECT tr.price
+                FROM test_rates tr
+                JOIN projects p ON p.billing_rate_id = tr.rate_id
+                WHERE p.id = ?
+                  AND tr.test_id = sample_tests.test_id
+            )
+            WHERE project_id = ?
+              AND EXISTS (
+                SELECT 1
+                FROM test_rates tr
+                JOIN projects p ON p.billing_rate_id = tr.rate_id
+                WHERE p.id = ?
+                  AND tr.test_id = sample_tests.test_id
+                  AND tr.price IS NOT sample_tests.cost
+              )
+            """,
+            (project_id, project_id, project_id),
+        ).rowcount
+
+
+class WorksheetRunRepository(_Repository):
+    """Saved worksheets: D1557 runs, generic worksheet runs, grain-size runs and project calculations."""
+
+    def d1557_run(self, sample_test_id):
+        rows = self._fetchall("SELECT points_json FROM astm1557_runs WHERE sample_test_id = ?", (sample_test_id,))
+        return rows[0] if rows else None
+
+    def worksheet_run(self, sample_test_id):
+        rows = self._fetchall(
+            "SELECT payload_json, row_version FROM worksheet_runs WHERE sample_test_id = ?",
+            (sample_test_id,),
+        )
+        return rows[0] if rows else None
+
+    def grain_run(self, sample_id):
+        rows = self._fetchall("SELECT payload_json, row_version FROM grain_size_runs WHERE sample_id = ?", (sample_id,))
+        return rows[0] if rows else None
+
+    def calculation_run(self, project_id):
+        rows = self._fetchall(
+            "SELECT calc_key, payload_json, computed_json, row_version FROM calculations_runs WHERE project_id = ?",
+            (project_id,),
+        )
+        return rows[0] if rows else None
+
+    def versions(self, keys):
+        """Current row_version (None if gone) of each (table, key column, key), on one connection."""
+        conn = self._connect()
+        try:
+            return [read_version(conn, table, key_col, key) for table, key_col, key in keys]
+        finally:
+            conn.close()
+
+    def save_d1557(self, sample_test_id, points_json, max_dry_density, opt_moisture, checks=()):
+        with self._locked(checks) as conn:
+            conn.execute(
+                """
+                INSERT INTO astm1557_runs (sample_test_id, points_json, max_dry_density, opt_moisture, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sample_test_id) DO UPDATE SET
+                    points_json = excluded.points_json,
+                    max_dry_density = excluded.max_dry_density,
+                    opt_moisture = excluded.opt_moisture,
+                    updated_at = excluded.updated_at
+                """,
+                (sample_test_id, points_json, max_dry_density, opt_moisture, now_iso()),
+            )
+            conn.execute(
+                """
+                UPDATE sample_tests
+                SET result_value = ?, result_unit = 'pcf',
+                    result_value2 = ?, result_unit2 = '%',
+                    status = 'completed'
+                WHERE id = ?
+                """,
+                (max_dry_density, opt_moisture, sample_test_id),
+            )
+
+    def save_worksheet(self, sample_test_id, worksheet_key, payload_json, results, checks=()):
+        """Upserts the run and writes results (RESULT_COLUMNS) to its assignment, marking it completed."""
+        with self._locked(checks) as conn:
+            conn.execute(
+                """
+                INSERT INTO worksheet_runs (sample_test_id, worksheet_key, payload_json, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(sample_test_id) DO UPDATE SET
+                    worksheet_key = excluded.worksheet_key,
+                    payload_json = excluded.payload_json,
+                    updated_at = excluded.updated_at
+                """,
+                (sample_test_id, worksheet_key, payload_json, now_iso()),
+            )
+            conn.execute(
+                f"UPDATE sample_tests SET {_set_clause(RESULT_COLUMNS)}, status = 'completed' WHERE id = ?",
+                (*(results[c] for c in RESULT_COLUMNS), sample_test_id),
+            )
+
+    def save_grain(self, sample_id, payload_json, hydrometer, results, checks=()):
+        """
+        Upserts the sample's grain-size run, adds or drops its Hydrometer
+        assignment to match `hydrometer`, and writes results, {test name:
+        {column: value}}, to the sample's assignments of those tests.
+        """
+        with self._locked(checks) as conn:
+            conn.execute(
+                """
+                INSERT INTO grain_size_runs (sample_id, payload_json, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(sample_id) DO UPDATE SET
+                    payload_json = excluded.payload_json,
+                    updated_at = excluded.updated_at
+                """,
+                (sample_id, payload_json, now_iso()),
+            )
+            if hydrometer:
+                conn.execute(
+                    """
+                    INSERT INTO sample_tests (sample_id, test_id, cost, status, project_id)
+                    SELECT s.id, t.id, COALESCE(tr.price, t.default_cost, 0), 'scheduled', s.project_id
+                    FROM samples s
+                    JOIN projects p ON p.id = s.project_id
+                    JOIN tests t ON t.name = 'Hydrometer'
+                    LEFT JOIN test_rates tr ON tr.rate_id = p.billing_rate_id AND tr.test_id = t.id
+                    WHERE s.id = ?
+                      AND NOT EXISTS (SELECT 1 FROM sample_tests st WHERE st.sample_id = s.id AND st.test_id = t.id)
+                    """,
+                    (sample_id,),
+                )
+            else:
+                conn.execute(
+                    "DELETE FROM sample_tests WHERE sample_id = ? AND test_id IN (SELECT id FROM tests WHERE name = 'Hydrometer')",
+                    (sample_id,),
+                )
+            for test_name, values in results.items():
+                conn.execute(
+                    f"""
+                    UPDATE sample_tests SET {_set_clause(values)}
+                    WHERE sample_id = ? AND test_id IN (SELECT id FROM tests WHERE name = ?)
+                    """,
+                    (*values.values(), sample_id, test_name),
+                )
+
+    def save_calculation(self, project_id, calc_key, payload_json, computed_json, expected_version):
+        """Upserts the project's calculation if it is still at expected_version; returns the new version."""
+        with self._locked([("calculations_runs", "project_id", project_id, expected_version)]) as conn:
+            conn.execute(
+                """
+                INSERT INTO calculations_runs (project_id, calc_key, payload_json, computed_json, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(project_id) DO UPDATE SET
+                    calc_key = excluded.calc_key,
+                    payload_json = excluded.payload_json,
+                    computed_json = excluded.computed_json,
+                    updated_at = excluded.updated_at
+                """,
+                (project_id, calc_key, payload_json, computed_json, now_iso()),
+            )
+            return read_version(conn, "calculations_runs", "project_id", project_id)
+
+
+class RateRepository(_Repository):
+    def list_rates(self):
+        return self._fetchall("SELECT id, rate_id, client_type, year, kind, notes FROM billing_rates ORDER BY rate_id")
+
+    def list_tests(self):
+        return self._fetchall("SELECT id, code, name, default_cost FROM tests ORDER BY code")
+
+    def add_rate(self, rate_id, client_type, year=None, kind=None, notes=None):
+        self._write(
+            "INSERT INTO billing_rates (rate_id, client_type, year, kind, notes) VALUES (?, ?, ?, ?, ?)",
+            (rate_id, client_type, year, kind, notes),
+        )
+
+    def delete_rate(self, rate_id):
+        self._write("DELETE FROM billing_rates WHERE rate_id = ?", (rate_id,))
+
+    def prices(self, rate_id):
+        return self._fetchall(
+            """
+            SELECT tr.id, tr.test_id, t.code, t.name, tr.price
+            FROM test_rates tr
+            JOIN tests t ON t.id = tr.test_id
+            WHERE tr.rate_id = ?
+            ORDER BY t.code
+            """,
+            (rate_id,),
+        )
+
+    def set_prices(self, rate_id, prices):
+        """Upserts {test_id: price} for the rate in one statement batch."""
+        conn = self._connect()
+        try:
+            conn.executemany(
+                """
+                INSERT INTO test_rates (rate_id, test_id, price)
+                VALUES (?, ?, ?)
+                ON CONFLICT(rate_id, test_id) DO UPDATE SET price = excluded.price
+                """,
+                [(rate_id, test_id, price) for test_id, price in prices.items()],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete_price(self, price_id):
+        self._write("DELETE FROM test_rates WHERE id = ?", (price_id,))
@@ -0,0 +1,209 @@
+import csv
+import re
+from datetime import date, datetime
+from pathlib import Path
+
+from app.db import get_connection
+from app.services.test_assignment import insert_assignments
+from app.services.validators import is_valid_sample_name, parse_depth
+
+try:
+    from openpyxl import load_workbook
+except Exception:
+    load_workbook = None
+
+INSERT_CHUNK = 1000
+
+# Normalised header text -> samples column. Headers are lower-cased with
+# bracketed text dropped and punctuation collapsed to spaces before lookup;
+# see _header_column for unit and number suffixes.
+HEADER_ALIASES = {
+    "sample": "sample_name",
+    "sample name": "sample_name",
+    "sample id": "sample_name",
+    "depth": "depth_raw",
+    "depth raw": "depth_raw",
+    "depth interval": "depth_raw",
+    "type": "sample_type",
+    "sample type": "sample_type",
+    "received": "received_date",
+    "received date": "received_date",
+    "date received": "received_date",
+    "storage": "storage_location",
+    "storage location": "storage_location",
+    "disposal": "disposal_date",
+    "disposal date": "disposal_date",
+    "status": "status",
+}
+# Trailing words that qualify a header without changing its meaning,
+# as in "Depth, ft" or "Sample No.".
+HEADER_SUFFIXES = {"ft", "feet", "m", "meters", "in", "no", "num", "number"}
+
+
+def read_sample_rows(path, ignored=None):
+    """
+    Streams (row_number, values) from a CSV or XLSX boring log, where values
+    maps samples columns to stripped strings. Unknown and repeated columns
+    are skipped, and their headers added to `ignored` when a list is given.
+    row_number is the 1-based spreadsheet row, so errors point at the file.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix in (".xlsx", ".xlsm"):
+        raw_rows = _iter_xlsx(path)
+    elif suffix in (".csv", ".txt"):
+        raw_rows = _iter_csv(path)
+    else:
+        raise ValueError(f"Unsupported file type: {suffix or 'none'} (use .csv or .xlsx).")
+
+    header = None
+    for row_number, raw in enumerate(raw_rows, start=1):
+        if header is None:
+            header = []
+            for h in raw:
+                col = _header_column(h)
+                if col in header:
+                    col = None
+                if col is None and ignored is not None and _cell_text(h):
+                    ignored.append(_cell_text(h))
+                header.append(col)
+            if "sample_name" not in header:
+                raise ValueError("Header row must include a Sample column.")
+            continue
+        values = {}
+        for col, cell in zip(header, raw):
+            if col:
+                values[col] = _cell_text(cell)
+        if not any(values.values()):
+            continue
+        yield row_number, values
+
+
+def import_samples(project_id, path, test_ids=None, status="scheduled"):
+    """
+    Validates every row of a boring log and inserts the valid samples for
+    project_id in one transaction. When test_ids is given, each imported
+    sample is also assigned those tests at the project's rate prices.
+
+    Returns {"imported": int, "assigned": int, "errors": [(row_number, message)]};
+    unrecognised or repeated header columns are reported against row 1.
+    """
+    errors = []
+    ignored = []
+    batch = []
+    imported = 0
+    assigned = 0
+
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) AS m FROM samples").fetchone()["m"]
+        for row_number, values in read_sample_rows(path, ignored):
+            record, error = _validate_row(project_id, values)
+            if error:
+                errors.append((row_number, error))
+                continue
+            batch.append(record)
+            if len(batch) >= INSERT_CHUNK:
+                imported += _insert_samples(conn, batch)
+                batch = []
+        if batch:
+            imported += _insert_samples(conn, batch)
+        if imported and test_ids:
+            # The import holds the write lock, so every sample above last_id
+            # in this project was inserted by it.
+            new_ids = [
+                r["id"]
+                for r in conn.execute(
+                    "SELECT id FROM samples WHERE project_id = ? AND id > ?",
+                    (project_id, last_id),
+                )
+            ]
+            assigned = insert_assignments(conn, new_ids, test_ids, status)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if ignored:
+        errors.insert(0, (1, f"Ignored unrecognised or repeated column(s): {', '.join(ignored)}."))
+    return {"imported": imported, "assigned": assigned, "errors": errors}
+
+
+def _validate_row(project_id, values):
+    sample_name = values.get("sample_name", "")
+    if not is_valid_sample_name(sample_name):
+        return None, f"Invalid sample name '{sample_name}' (use B-#, T-#, HA-#, or C-#)."
+    depth_raw = values.get("depth_raw", "")
+    depth_from, depth_to, depth_unit = parse_depth(depth_raw)
+    if depth_raw and depth_from is None:
+        return None, f"Could not parse depth '{depth_raw}'."
+    record = (
+        project_id,
+        sample_name,
+        (values.get("sample_type") or "SB").upper(),
+        depth_raw or None,
+        depth_from,
+        depth_to,
+        depth_unit,
+        values.get("received_date") or None,
+        values.get("storage_location") or None,
+        values.get("disposal_date") or None,
+        values.get("status") or "Inventory",
+    )
+    return record, None
+
+
+def _insert_samples(conn, batch):
+    conn.executemany(
+        """
+        INSERT INTO samples (project_id, sample_name, sample_type, depth_raw, depth_from, depth_to, depth_unit, received_date, storage_location, disposal_date, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        batch,
+    )
+    return len(batch)
+
+
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        yield from csv.reader(fh)
+
+
+def _iter_xlsx(path):
+    if load_workbook is None:
+        raise RuntimeError("XLSX import requires openpyxl. Please install dependencies.")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _header_column(value):
+    words = _norm_header(value).split()
+    while words:
+        col = HEADER_ALIASES.get(" ".join(words))
+        if col or words[-1] not in HEADER_SUFFIXES:
+            return col
+        words.pop()
+    return None
+
+
+def _norm_header(value):
+    text = re.sub(r"\(.*?\)|\[.*?\]", " ", str(value or "").lower())
+    text = "".join(ch if ch.isalnum() else " " for ch in text)
+    return " ".join(text.split())
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
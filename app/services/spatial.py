@@ -0,0 +1,153 @@
+"""
+Location queries over projects: bounding box, radius and nearest jobs.
+
+Candidates come from the project_locations R*Tree (see
+app.db._migrate_project_locations), which answers a box query without
+reading projects that lie outside it. R*Tree boxes are stored as 32-bit
+floats rounded outward, so every query re-checks the exact coordinates,
+and radius queries then keep only points within the great-circle distance.
+Distances are in miles.
+"""
+
+import math
+import re
+
+from app.db import get_connection
+
+EARTH_RADIUS_MILES = 3958.8
+DEFAULT_RADIUS_MILES = 2.0
+DEFAULT_NEAREST = 10
+# nearest_projects widens its search box until it holds k projects or
+# reaches this radius.
+NEAREST_MAX_MILES = 1000.0
+
+_PROJECT_COLUMNS = "p.id, p.file_number, p.job_name, p.client_type, p.location_text, p.latitude, p.longitude"
+_LAT_LON = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*[, ]\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(lat, lon, miles):
+    """Returns (min_lat, min_lon, max_lat, max_lon) enclosing the circle of `miles` around a point."""
+    dlat = math.degrees(miles / EARTH_RADIUS_MILES)
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+    return max(-90.0, lat - dlat), max(-180.0, lon - dlon), min(90.0, lat + dlat), min(180.0, lon + dlon)
+
+
+def projects_in_bbox(min_lat, min_lon, max_lat, max_lon):
+    conn = get_connection()
+    try:
+        return [dict(r) for r in _bbox_rows(conn, min_lat, min_lon, max_lat, max_lon)]
+    finally:
+        conn.close()
+
+
+def projects_within(lat, lon, miles=DEFAULT_RADIUS_MILES, exclude_id=None):
+    """
+    Returns project dicts within `miles` of the point, nearest first, each
+    with a distance_miles key. exclude_id leaves out the center project.
+    """
+    conn = get_connection()
+    try:
+        return _within(conn, lat, lon, miles, exclude_id)
+    finally:
+        conn.close()
+
+
+def nearest_projects(lat, lon, k=DEFAULT_NEAREST, exclude_id=None, max_miles=NEAREST_MAX_MILES):
+    """
+    Returns the k projects nearest the point (fewer if fewer lie within
+    max_miles), nearest first, with distance_miles.
+    """
+    conn = get_connection()
+    try:
+        miles = min(1.0, max_miles)
+        while True:
+            found = _within(conn, lat, lon, miles, exclude_id)
+            # Everything within `miles` is known, so once k are inside the
+            # circle they are the k nearest overall.
+            if len(found) >= k or miles >= max_miles:
+                return found[:k]
+            miles = min(max_miles, miles * 4)
+    finally:
+        conn.close()
+
+
+def resolve_center(text):
+    """
+    Parses "lat, lon" or a project file number into (lat, lon, project_id);
+    project_id is None for typed coordinates. Raises ValueError.
+    """
+    text = (text or "").strip()
+    match = _LAT_LON.match(text)
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("Latitude must be -90..90 and longitude -180..180.")
+        return lat, lon, None
+    if not text:
+        raise ValueError("Enter a file number or a latitude, longitude pair.")
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT id, latitude, longitude FROM projects WHERE file_number = ?",
+            (text,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise ValueError(f"No project with file number {text}.")
+    if row["latitude"] is None or row["longitude"] is None:
+        raise ValueError(f"Project {text} has no coordinates.")
+    return row["latitude"], row["longitude"], row["id"]
+
+
+def _within(conn, lat, lon, miles, exclude_id):
+    found = []
+    for r in _bbox_rows(conn, *bbox_around(lat, lon, miles)):
+        if r["id"] == exclude_id:
+            continue
+        distance = haversine_miles(lat, lon, r["latitude"], r["longitude"])
+        if distance <= miles:
+            item = dict(r)
+            item["distance_miles"] = distance
+            found.append(item)
+    found.sort(key=lambda item: item["distance_miles"])
+    return found
+
+
+def _bbox_rows(conn, min_lat, min_lon, max_lat, max_lon):
+    exact = (min_lat, max_lat, min_lon, max_lon)
+    if _has_location_index(conn):
+        return conn.execute(
+            f"""
+            SELECT {_PROJECT_COLUMNS}
+            FROM project_locations pl
+            JOIN projects p ON p.id = pl.id
+            WHERE pl.max_lat >= ? AND pl.min_lat <= ? AND pl.max_lon >= ? AND pl.min_lon <= ?
+              AND p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?
+            """,
+            exact + exact,
+        ).fetchall()
+    return conn.execute(
+        f"""
+        SELECT {_PROJECT_COLUMNS}
+        FROM projects p
+        WHERE p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?
+        """,
+        exact,
+    ).fetchall()
+
+
+def _has_location_index(conn):
+    return (
+        conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'project_locations'").fetchone()
+        is not None
+    )
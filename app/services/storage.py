@@ -0,0 +1,357 @@
+"""
+Database drivers behind app.db.get_connection.
+
+The default driver opens the local SQLite file directly. The remote driver
+talks to `python -m app.main serve`, which owns the SQLite file on one
+machine and runs each client's statements on its own connection there, so
+lab stations share one database without relying on network-share file
+locking. Both hand back DB-API style connections whose rows support
+row["column"], row[index] and dict(row), like sqlite3.Row.
+"""
+
+import base64
+import hmac
+import ipaddress
+import json
+import os
+import re
+import socket
+import socketserver
+import sqlite3
+import uuid
+from collections.abc import Mapping, Sequence
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_PORT = 8765
+BUSY_TIMEOUT_MS = 5000
+PROTOCOL_VERSION = 1
+# Identifies this process's writes in change_feed; see tag_feed_writer.
+SESSION_ID = uuid.uuid4().hex
+_WRITER_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def tag_feed_writer(conn, writer):
+    """
+    Stamps the change_feed rows written through conn with writer, so a
+    workstation polling the feed can skip its own changes. The schema must
+    already have change_feed.writer.
+    """
+    conn.execute(
+        f"""
+        CREATE TEMP TRIGGER IF NOT EXISTS feed_writer
+        AFTER INSERT ON main.change_feed
+        BEGIN
+            UPDATE change_feed SET writer = '{writer}' WHERE seq = NEW.seq;
+        END;
+        """
+    )
+
+
+class SQLiteDriver:
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON;")
+        return conn
+
+    def describe(self):
+        return str(self.path)
+
+
+class RemoteDriver:
+    name = "remote"
+
+    def __init__(self, host, port=DEFAULT_PORT, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+
+    def connect(self):
+        return RemoteConnection(self.host, self.port, self.token)
+
+    def describe(self):
+        return f"geolab://{self.host}:{self.port}"
+
+
+def driver_from_url(url):
+    """
+    sqlite:///path/to/geolab.db  -> SQLiteDriver
+    geolab://host[:port][?token=...] -> RemoteDriver (token may also come
+    from GEOLAB_DB_TOKEN)
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        path = parsed.path
+        if parsed.netloc:
+            path = parsed.netloc + path
+        return SQLiteDriver(path)
+    if parsed.scheme == "geolab":
+        token = parse_qs(parsed.query).get("token", [None])[0] or os.getenv("GEOLAB_DB_TOKEN")
+        return RemoteDriver(parsed.hostname or "127.0.0.1", parsed.port or DEFAULT_PORT, token)
+    raise ValueError(f"Unsupported database URL: {url}")
+
+
+class Row(tuple):
+    """A result row addressable by position or column name, like sqlite3.Row."""
+
+    def __new__(cls, columns, values):
+        row = super().__new__(cls, values)
+        row._columns = columns
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._columns[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._columns)
+
+
+class RemoteCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+        self._pos = 0
+        self.rowcount = -1
+        self.lastrowid = None
+        self.description = None
+
+    def execute(self, sql, params=()):
+        self._load(self._conn._call({"op": "execute", "sql": sql, "params": _encode_params(params)}))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._load(
+            self._conn._call({"op": "executemany", "sql": sql, "seq": [_encode_params(p) for p in seq_of_params]})
+        )
+        return self
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        row = self._rows[self._pos]
+        self._pos += 1
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._rows[self._pos : self._pos + size]
+        self._pos += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._rows[self._pos :]
+        self._pos = len(self._rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._rows = []
+
+    def _load(self, reply):
+        columns = reply.get("columns") or []
+        index = {name: i for i, name in enumerate(columns)}
+        self._rows = [Row(index, _decode(values)) for values in reply.get("rows", [])]
+        self._pos = 0
+        self.rowcount = reply.get("rowcount", -1)
+        self.lastrowid = reply.get("lastrowid")
+        self.description = tuple((name, None, None, None, None, None, None) for name in columns) or None
+
+
+class RemoteConnection:
+    def __init__(self, host, port, token):
+        self._sock = socket.create_connection((host, port), timeout=30)
+        self._file = self._sock.makefile("rwb")
+        self._call({"op": "hello", "token": token, "version": PROTOCOL_VERSION, "writer": SESSION_ID})
+
+    def cursor(self):
+        return RemoteCursor(self)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        self._call({"op": "commit"})
+
+    def rollback(self):
+        self._call({"op": "rollback"})
+
+    def backup(self, *_args, **_kwargs):
+        raise RuntimeError("Backups of a server database run on the server: use 'python -m app.main backup' there.")
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            self._call({"op": "close"})
+        except (OSError, sqlite3.Error):
+            pass
+        self._file.close()
+        self._sock.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, _exc, _tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def _call(self, message):
+        if self._file is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        self._file.write(json.dumps(message).encode("utf-8") + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise sqlite3.OperationalError("Database server closed the connection.")
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            # Re-raise as the sqlite3 exception the server saw so callers'
+            # except clauses behave the same on both backends.
+            error_cls = getattr(sqlite3, reply.get("error_type", ""), None)
+            if not (isinstance(error_cls, type) and issubclass(error_cls, sqlite3.Error)):
+                error_cls = sqlite3.OperationalError
+            raise error_cls(reply.get("error", "Database server error."))
+        return reply
+
+
+class _ClientHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        conn = None
+        try:
+            hello = self._read()
+            if not hello or hello.get("op") != "hello" or not self.server.accepts(hello.get("token")):
+                self._write({"ok": False, "error_type": "DatabaseError", "error": "Database server refused the connection."})
+                return
+            conn = sqlite3.connect(str(self.server.path), timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA foreign_keys = ON;")
+            writer = hello.get("writer")
+            if isinstance(writer, str) and _WRITER_RE.fullmatch(writer):
+                tag_feed_writer(conn, writer)
+            conn.set_authorizer(_authorize)
+            self._write({"ok": True})
+            while True:
+                message = self._read()
+                if message is None or message.get("op") == "close":
+                    if message is not None:
+                        self._write({"ok": True})
+                    return
+                self._write(self._dispatch(conn, message))
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _dispatch(self, conn, message):
+        op = message.get("op")
+        try:
+            if op == "execute":
+                cur = conn.execute(message["sql"], _decode_params(message.get("params")))
+            elif op == "executemany":
+                cur = conn.executemany(message["sql"], [_decode_params(p) for p in message.get("seq") or []])
+            elif op == "commit":
+                conn.commit()
+                return {"ok": True}
+            elif op == "rollback":
+                conn.rollback()
+                return {"ok": True}
+            else:
+                return {"ok": False, "error_type": "ProgrammingError", "error": f"Unknown operation: {op}"}
+            columns = [d[0] for d in cur.description] if cur.description else []
+            rows = [_encode(list(r)) for r in cur.fetchall()] if columns else []
+            return {
+                "ok": True,
+                "columns": columns,
+                "rows": rows,
+                "rowcount": cur.rowcount,
+                "lastrowid": cur.lastrowid,
+            }
+        except sqlite3.Error as exc:
+            return {"ok": False, "error_type": type(exc).__name__, "error": str(exc)}
+
+    def _read(self):
+        line = self.rfile.readline()
+        return json.loads(line) if line else None
+
+    def _write(self, reply):
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class DatabaseServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, path, host="127.0.0.1", port=DEFAULT_PORT, token=None):
+        if not token and not _is_loopback(host):
+            raise ValueError("A token is required to serve the database on a non-loopback address.")
+        super().__init__((host, port), _ClientHandler)
+        self.path = path
+        self.token = token
+
+    def accepts(self, token):
+        # Without a token the server only listens on loopback (see __init__).
+        if not self.token:
+            return True
+        return isinstance(token, str) and hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8"))
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _authorize(action, arg1, arg2, _db, _trigger):
+    # Clients run arbitrary SQL: keep them inside the served file (ATTACH
+    # also covers VACUUM INTO) and away from loadable extensions.
+    if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH):
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_FUNCTION and (arg2 or "").lower() == "load_extension":
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def _encode_params(params):
+    # Named parameters travel as {"$n": {name: value}}, positional ones as a list.
+    if isinstance(params, Mapping):
+        names = list(params)
+        return {"$n": dict(zip(names, _encode([params[n] for n in names])))}
+    if isinstance(params, (str, bytes)) or not isinstance(params, Sequence):
+        raise TypeError("parameters are of unsupported type")
+    return _encode(list(params))
+
+
+def _decode_params(params):
+    if isinstance(params, dict) and "$n" in params:
+        named = params["$n"]
+        return dict(zip(named, _decode(list(named.values()))))
+    return _decode(params or [])
+
+
+def _encode(values):
+    return [{"$b": base64.b64encode(v).decode("ascii")} if isinstance(v, (bytes, bytearray, memoryview)) else v for v in values]
+
+
+def _decode(values):
+    return [base64.b64decode(v["$b"]) if isinstance(v, dict) and "$b" in v else v for v in values]
@@ -0,0 +1,130 @@
+import json
+
+from app.db import get_connection, now_iso
+
+
+def list_templates():
+    conn = get_connection()
+    rows = conn.execute(
+        """
+        SELECT tt.id, tt.name, COUNT(ti.test_id) AS test_count
+        FROM test_templates tt
+        LEFT JOIN test_template_items ti ON ti.template_id = tt.id
+        GROUP BY tt.id
+        ORDER BY tt.name COLLATE NOCASE
+        """
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def template_test_ids(template_id):
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT test_id FROM test_template_items WHERE template_id = ?",
+        (template_id,),
+    ).fetchall()
+    conn.close()
+    return [r["test_id"] for r in rows]
+
+
+def save_template(name, test_ids):
+    """
+    Creates the named template, or replaces the tests of an existing one
+    with the same name. Returns the template id.
+    """
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("Template name is required.")
+    if not test_ids:
+        raise ValueError("A template needs at least one test.")
+
+    conn = get_connection()
+    try:
+        conn.execute(
+            "INSERT INTO test_templates (name, created_at) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
+            (name, now_iso()),
+        )
+        template_id = conn.execute("SELECT id FROM test_templates WHERE name = ?", (name,)).fetchone()["id"]
+        conn.execute("DELETE FROM test_template_items WHERE template_id = ?", (template_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO test_template_items (template_id, test_id) VALUES (?, ?)",
+            [(template_id, test_id) for test_id in test_ids],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return template_id
+
+
+def delete_template(template_id):
+    conn = get_connection()
+    conn.execute("DELETE FROM test_templates WHERE id = ?", (template_id,))
+    conn.commit()
+    conn.close()
+
+
+def assign_tests(sample_ids, test_ids, status="scheduled", cost=None):
+    """
+    Assigns every test in test_ids to every sample in sample_ids in one
+    transaction. Tests a sample already has are skipped. Returns the number
+    of sample_tests rows written.
+    """
+    conn = get_connection()
+    try:
+        written = insert_assignments(conn, sample_ids, test_ids, status, cost)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return written
+
+
+def assign_template(template_id, sample_ids, status="scheduled", cost=None):
+    conn = get_connection()
+    try:
+        test_ids = [
+            r["test_id"]
+            for r in conn.execute(
+                "SELECT test_id FROM test_template_items WHERE template_id = ?",
+                (template_id,),
+            )
+        ]
+        written = insert_assignments(conn, sample_ids, test_ids, status, cost)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return written
+
+
+def insert_assignments(conn, sample_ids, test_ids, status="scheduled", cost=None):
+    """
+    Writes the sample x test cross product with a single INSERT ... SELECT on
+    an open connection; the caller owns the transaction. Each cost is the
+    override when given, else the project's rate price, else the test default.
+    Pairs a sample already has are skipped by the unique (sample_id, test_id)
+    index.
+    """
+    if not sample_ids or not test_ids:
+        return 0
+    # The id lists go in as JSON arrays so any number of samples fits in two
+    # bound parameters.
+    cur = conn.execute(
+        """
+        INSERT INTO sample_tests (sample_id, test_id, cost, status, project_id)
+        SELECT s.id, t.id, COALESCE(?, tr.price, t.default_cost), ?, s.project_id
+        FROM samples s
+        JOIN projects p ON p.id = s.project_id
+        JOIN tests t ON t.id IN (SELECT value FROM json_each(?))
+        LEFT JOIN test_rates tr ON tr.rate_id = p.billing_rate_id AND tr.test_id = t.id
+        WHERE s.id IN (SELECT value FROM json_each(?))
+        ON CONFLICT(sample_id, test_id) DO NOTHING
+        """,
+        (cost, status, json.dumps(list(test_ids)), json.dumps(list(sample_ids))),
+    )
+    return cur.rowcount
@@ -0,0 +1,280 @@
+"""
+USCS group symbols (ASTM D 2487) assigned in batch from lab results.
+
+Gradation comes from gradation_metrics (percent passing #4 and #200, Cu,
+Cc), with a -200 wash result standing in for fines when there is no
+grain-size run. Liquid and plastic limits come from the Atterberg
+worksheet, or from the entered LL/PI results when there is none.
+
+classify_uscs is a pure function of rounded inputs and is memoized. Each
+stored classification keeps a hash of its inputs and USCS_RULES_VERSION,
+so classify_samples only re-runs the rules for samples whose inputs
+changed. Bumping USCS_RULES_VERSION re-classifies everything.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+
+from app.db import get_connection, now_iso
+from app.services.gradation import refresh_gradation_metrics
+from app.services.nearby_results import invalidate_nearby_results
+from app.services.worksheet_generic import loads_payload
+
+USCS_RULES_VERSION = 1
+ATTERBERG_TESTS = ("Atterberg Limits", "LL/PL")
+WASH_TEST = "-200 Washed Sieve"
+SIEVE_TEST = "Sieve Part. Analysis"
+NONPLASTIC = "NP"
+
+
+def classify_uscs(fines, passing_no4=None, cu=None, cc=None, liquid_limit=None, plastic_limit=None):
+    """
+    Returns (symbol, note). symbol is None when the inputs are not enough;
+    note then says what is missing. plastic_limit may be NONPLASTIC.
+    """
+    return _classify(*_rounded(fines, passing_no4, cu, cc, liquid_limit, plastic_limit))
+
+
+def classify_samples(project_id=None, rebuild=False):
+    """
+    Classifies every sample with gradation or Atterberg results (one
+    project, or all), re-running the rules only where inputs changed.
+    Returns {"classified", "unchanged", "unclassified"} counts.
+    """
+    refresh_gradation_metrics(project_id)
+    inputs = _sample_inputs(project_id)
+    scope_sql, scope_params = ("WHERE project_id = ?", (project_id,)) if project_id is not None else ("", ())
+
+    conn = get_connection()
+    try:
+        stored = {
+            r["sample_id"]: r["input_hash"]
+            for r in conn.execute(
+                f"SELECT sample_id, input_hash FROM uscs_classifications {scope_sql}", scope_params
+            ).fetchall()
+        }
+        stamp = now_iso()
+        updates = []
+        unchanged = unclassified = 0
+        for sample_id, (sample_project_id, values) in inputs.items():
+            digest = hashlib.sha1(json.dumps([USCS_RULES_VERSION, sample_project_id, values]).encode()).hexdigest()
+            if not rebuild and stored.get(sample_id) == digest:
+                unchanged += 1
+                continue
+            symbol, note = _classify(*values)
+            unclassified += symbol is None
+            updates.append((sample_id, sample_project_id, symbol, note, digest, stamp))
+        conn.executemany(
+            """
+            INSERT INTO uscs_classifications (sample_id, project_id, symbol, note, input_hash, classified_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(sample_id) DO UPDATE SET
+                project_id = excluded.project_id,
+                symbol = excluded.symbol,
+                note = excluded.note,
+                input_hash = excluded.input_hash,
+                classified_at = excluded.classified_at
+            """,
+            updates,
+        )
+        gone = [sample_id for sample_id in stored if sample_id not in inputs]
+        conn.execute(
+            "DELETE FROM uscs_classifications WHERE sample_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(gone),),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return {"classified": len(updates) - unclassified, "unchanged": unchanged, "unclassified": unclassified}
+
+
+def apply_uscs_results(project_id=None, overwrite=False):
+    """
+    Copies classified symbols into the Sieve Part. Analysis result
+    (result_unit, shown as "USCS Classif."). Results typed by hand are kept
+    unless overwrite is set. Returns the number of results updated.
+    """
+    scope = "AND st.project_id = ?" if project_id is not None else ""
+    conn = get_connection()
+    try:
+        cur = conn.execute(
+            f"""
+            UPDATE sample_tests AS st
+            SET result_unit = u.symbol
+            FROM uscs_classifications u
+            WHERE u.sample_id = st.sample_id
+              AND u.symbol IS NOT NULL
+              AND st.test_id = (SELECT id FROM tests WHERE name = ?)
+              AND st.result_unit IS NOT u.symbol
+              AND (? OR COALESCE(TRIM(st.result_unit), '') = '')
+              {scope}
+            """,
+            (SIEVE_TEST, int(overwrite)) + ((project_id,) if project_id is not None else ()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    if cur.rowcount:
+        invalidate_nearby_results(None if project_id is None else [project_id])
+    return cur.rowcount
+
+
+def uscs_classifications(project_id=None):
+    scope_sql, params = ("WHERE u.project_id = ?", (project_id,)) if project_id is not None else ("", ())
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT u.sample_id, u.project_id, p.file_number, s.sample_name, s.depth_raw, u.symbol, u.note
+            FROM uscs_classifications u
+            JOIN samples s ON s.id = u.sample_id
+            JOIN projects p ON p.id = u.project_id
+            {scope_sql}
+            ORDER BY p.file_number, s.sample_name, s.id
+            """,
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(r) for r in rows]
+
+
+def _sample_inputs(project_id):
+    # {sample_id: (project_id, rounded classify_uscs inputs)} for samples
+    # with any usable result, from two queries over the whole scope.
+    samples_scope = "WHERE s.project_id = ?" if project_id is not None else ""
+    tests_scope = "AND st.project_id = ?" if project_id is not None else ""
+    params = (project_id,) if project_id is not None else ()
+    names = ATTERBERG_TESTS + (WASH_TEST,)
+    conn = get_connection()
+    try:
+        samples = conn.execute(
+            f"""
+            SELECT s.id, s.project_id, m.passing_no4, m.passing_no200, m.cu, m.cc
+            FROM samples s
+            LEFT JOIN gradation_metrics m ON m.sample_id = s.id
+            {samples_scope}
+            """,
+            params,
+        ).fetchall()
+        tests = conn.execute(
+            f"""
+            SELECT st.sample_id, t.name, st.result_value, st.result_value2, wr.payload_json
+            FROM sample_tests st
+            JOIN tests t ON t.id = st.test_id
+            LEFT JOIN worksheet_runs wr ON wr.sample_test_id = st.id
+            WHERE t.name IN (SELECT value FROM json_each(?)) {tests_scope}
+            ORDER BY st.id
+            """,
+            (json.dumps(names),) + params,
+        ).fetchall()
+    finally:
+        conn.close()
+
+    wash_fines, limits = {}, {}
+    for r in tests:
+        if r["name"] == WASH_TEST:
+            if r["result_value"] is not None:
+                wash_fines.setdefault(r["sample_id"], r["result_value"])
+            continue
+        found = _atterberg_limits(r)
+        if found is not None:
+            limits.setdefault(r["sample_id"], found)
+
+    inputs = {}
+    for r in samples:
+        fines = r["passing_no200"]
+        if fines is None:
+            fines = wash_fines.get(r["id"])
+        ll, pl = limits.get(r["id"], (None, None))
+        if fines is None and ll is None:
+            continue
+        inputs[r["id"]] = (r["project_id"], _rounded(fines, r["passing_no4"], r["cu"], r["cc"], ll, pl))
+    return inputs
+
+
+def _atterberg_limits(row):
+    # (liquid limit, plastic limit) from the worksheet, else from LL/PI results.
+    if row["payload_json"]:
+        payload = loads_payload(row["payload_json"])
+        ll = _number(payload.get("liquid_limit"))
+        raw_pl = str(payload.get("plastic_limit") or "").strip()
+        pl = NONPLASTIC if raw_pl.upper() == NONPLASTIC else _number(raw_pl)
+        if ll is not None:
+            return ll, pl
+    ll, pi = _number(row["result_value"]), _number(row["result_value2"])
+    if ll is None:
+        return None
+    return ll, (ll - pi if pi is not None else None)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rounded(fines, passing_no4, cu, cc, liquid_limit, plastic_limit):
+    # Rounded to the precision results are reported at, so the memo and the
+    # stored hashes see equal inputs for equal reports.
+    def r(value, digits):
+        return None if value is None else round(float(value), digits)
+
+    pl = plastic_limit if plastic_limit == NONPLASTIC else r(plastic_limit, 1)
+    return r(fines, 1), r(passing_no4, 1), r(cu, 2), r(cc, 2), r(liquid_limit, 1), pl
+
+
+@lru_cache(maxsize=4096)
+def _classify(fines, passing_no4, cu, cc, liquid_limit, plastic_limit):
+    if fines is None:
+        return None, "needs percent passing #200"
+    fines_kind, fines_note = _fines_kind(liquid_limit, plastic_limit)
+    if fines >= 50:
+        if fines_kind is None:
+            return None, fines_note
+        return fines_kind, None
+
+    if passing_no4 is None:
+        return None, "needs percent passing #4"
+    gravel = 100.0 - passing_no4
+    sand = passing_no4 - fines
+    prefix = "G" if gravel > sand else "S"
+
+    graded = None
+    if fines <= 12:
+        if cu is None or cc is None:
+            return None, "needs D10/D30/D60 for Cu and Cc"
+        well = cu >= (4 if prefix == "G" else 6) and 1 <= cc <= 3
+        graded = prefix + ("W" if well else "P")
+        if fines < 5:
+            return graded, None
+
+    if fines_kind is None:
+        return None, fines_note
+    if graded is not None:
+        # 5-12% fines: dual symbol from gradation and the kind of fines.
+        return f"{graded}-{prefix}{'M' if fines_kind in ('ML', 'MH') else 'C'}", None
+    if fines_kind == "CL-ML":
+        return f"{prefix}C-{prefix}M", None
+    return prefix + ("M" if fines_kind in ("ML", "MH") else "C"), None
+
+
+def _fines_kind(liquid_limit, plastic_limit):
+    # Plasticity chart: the A-line is PI = 0.73 (LL - 20).
+    if liquid_limit is None:
+        return None, "needs Atterberg limits"
+    if plastic_limit == NONPLASTIC:
+        return ("ML" if liquid_limit < 50 else "MH"), None
+    if plastic_limit is None:
+        return None, "needs plastic limit"
+    pi = liquid_limit - plastic_limit
+    above_a_line = pi >= 0.73 * (liquid_limit - 20)
+    if liquid_limit >= 50:
+        return ("CH" if above_a_line else "MH"), None
+    if pi > 7 and above_a_line:
+        return "CL", None
+    if pi >= 4 and above_a_line:
+        return "CL-ML", None
+    return "ML", None
@@ -1,9 +1,40 @@
 import re
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
 FILE_NUMBER_RE = re.compile(r"^\d{2}-\d{3}$")
 SAMPLE_NAME_RE = re.compile(r"^(B|T|HA|C)-\d{1,3}$", re.IGNORECASE)
 
+# One number, an optional unit after it, then an optional "-"/"to" and a second
+# number with its own optional unit. Spaces are stripped before matching.
+_NUMBER = r"(\d+(?:\.\d*)?|\.\d+)"
+_UNIT = r"(''|\"|″|'|′|ft|feet|foot|in|inch|inches|cm|m|meters?|metres?)?"
+DEPTH_RE = re.compile(rf"^{_NUMBER}{_UNIT}(?:(?:-|–|—|to){_NUMBER}{_UNIT})?$", re.IGNORECASE)
+
+DEPTH_UNITS = {
+    "'": "ft",
+    "′": "ft",
+    "ft": "ft",
+    "feet": "ft",
+    "foot": "ft",
+    "''": "in",
+    '"': "in",
+    "″": "in",
+    "in": "in",
+    "inch": "in",
+    "inches": "in",
+    "m": "m",
+    "meter": "m",
+    "meters": "m",
+    "metre": "m",
+    "metres": "m",
+    "cm": "cm",
+}
+
+DEPTH_CACHE_SIZE = 4096
+
+Depth = Tuple[Optional[float], Optional[float], Optional[str]]
+
 
 def is_valid_file_number(value: str) -> bool:
     return bool(FILE_NUMBER_RE.match(value.strip()))
@@ -13,29 +44,44 @@ def is_valid_sample_name(value: str) -> bool:
     return bool(SAMPLE_NAME_RE.match(value.strip()))
 
 
-def parse_depth(depth_raw: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+def parse_depth(depth_raw: str) -> Depth:
     """
-    Accepts strings like 1.0'-2.0' or 40.0''-50.0''.
-    Returns (from, to, unit) where unit is 'ft' or 'in'.
+    Accepts ranges like 1.0'-2.0', 40''-50'', 1 to 2 ft or 0.5-1.5 m, and
+    single depths like 5' (returned as from == to).
+    Returns (from, to, unit) where unit is 'ft', 'in', 'm', 'cm' or None.
     """
     if not depth_raw:
         return None, None, None
+    return _parse_depth_cached("".join(depth_raw.split()).lower())
 
-    raw = depth_raw.strip().replace(" ", "")
-    # Detect inches (double apostrophe) or feet (single)
-    unit = None
-    if "''" in raw:
-        unit = "in"
-        raw = raw.replace("''", "")
-    elif "'" in raw:
-        unit = "ft"
-        raw = raw.replace("'", "")
-
-    if "-" not in raw:
-        return None, None, unit
 
-    left, right = raw.split("-", 1)
-    try:
-        return float(left), float(right), unit
-    except ValueError:
-        return None, None, unit
\ No newline at end of file
+def parse_depths(values: Iterable[str]) -> Tuple[List[Optional[float]], List[Optional[float]], List[Optional[str]]]:
+    """
+    Batch form of parse_depth. Returns parallel (froms, tos, units) lists in
+    input order; repeated strings are served from the parse cache.
+    """
+    froms, tos, units = [], [], []
+    for value in values:
+        depth_from, depth_to, unit = parse_depth(value)
+        froms.append(depth_from)
+        tos.append(depth_to)
+        units.append(unit)
+    return froms, tos, units
+
+
+@lru_cache(maxsize=DEPTH_CACHE_SIZE)
+def _parse_depth_cached(raw: str) -> Depth:
+    match = DEPTH_RE.match(raw)
+    if not match:
+        unit = "in" if "''" in raw else "ft" if "'" in raw else None
+        return None, None, unit
+    left, left_unit, right, right_unit = match.groups()
+    # A unit on either side applies to the whole range (1-2ft, 1ft-2), but
+    # mixed units (1'-6'') are ambiguous and left unparsed.
+    units = {DEPTH_UNITS[u] for u in (left_unit, right_unit) if u}
+    if len(units) > 1:
+        return None, None, None
+    unit = units.pop() if units else None
+    depth_from = float(left)
+    depth_to = float(right) if right is not None else depth_from
+    return depth_from, depth_to, unit
@@ -0,0 +1,397 @@
+"""
+In-memory model of the selected project: the project row, its samples and
+their assigned tests, loaded with one bulk query when a project is selected.
+
+Tabs read navigation data (lists, selections, labels) from WORKING_SET
+instead of issuing SQL. Writes go through its methods, which persist to the
+database first and then refresh the affected records from it, so trigger-
+maintained columns such as row_version and project_id stay exact. Writes
+made elsewhere (inline SQL, other workstations) are picked up with reload().
+Tabs subscribe() to hear about every load, reload and write-through.
+"""
+
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.db import get_connection
+from app.services.nearby_results import invalidate_nearby_results
+from app.services.repository import (
+    PROJECT_COLUMNS,
+    SAMPLE_COLUMNS,
+    ProjectRepository,
+    SampleRepository,
+    SampleTestRepository,
+)
+
+PROJECT_FIELDS = ("id",) + PROJECT_COLUMNS
+SAMPLE_FIELDS = ("id", "project_id") + SAMPLE_COLUMNS
+SAMPLE_TEST_FIELDS = (
+    "id",
+    "sample_id",
+    "test_id",
+    "cost",
+    "status",
+    "completed_date",
+    "result_value",
+    "result_unit",
+    "result_value2",
+    "result_unit2",
+    "result_value3",
+    "result_unit3",
+    "result_value4",
+    "result_unit4",
+    "result_notes",
+    "row_version",
+)
+
+
+@dataclass(slots=True)
+class Project:
+    id: int
+    file_number: str
+    job_name: str
+    client_type: str
+    client_name: str
+    billing_rate_id: str
+    billing_year: Optional[int] = None
+    billing_kind: Optional[str] = None
+    status: Optional[str] = None
+    location_text: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+@dataclass(slots=True)
+class TestType:
+    id: int
+    code: str
+    name: str
+    default_cost: float
+
+
+@dataclass(slots=True)
+class Sample:
+    id: int
+    project_id: int
+    sample_name: str
+    sample_type: Optional[str] = None
+    depth_raw: Optional[str] = None
+    depth_from: Optional[float] = None
+    depth_to: Optional[float] = None
+    depth_unit: Optional[str] = None
+    received_date: Optional[str] = None
+    storage_location: Optional[str] = None
+    disposal_date: Optional[str] = None
+    status: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SampleTest:
+    id: int
+    sample_id: int
+    test_id: int
+    cost: float
+    status: Optional[str] = None
+    completed_date: Optional[str] = None
+    result_value: Optional[float] = None
+    result_unit: Optional[str] = None
+    result_value2: Optional[float] = None
+    result_unit2: Optional[str] = None
+    result_value3: Optional[float] = None
+    result_unit3: Optional[str] = None
+    result_value4: Optional[float] = None
+    result_unit4: Optional[str] = None
+    result_notes: Optional[str] = None
+    row_version: int = 0
+    sample: Optional[Sample] = field(default=None, repr=False, compare=False)
+    test: Optional[TestType] = field(default=None, repr=False, compare=False)
+
+    @property
+    def sample_name(self):
+        return self.sample.sample_name if self.sample else ""
+
+    @property
+    def depth_raw(self):
+        return self.sample.depth_raw if self.sample else None
+
+    @property
+    def code(self):
+        return self.test.code if self.test else ""
+
+    @property
+    def name(self):
+        return self.test.name if self.test else ""
+
+
+ENTITIES = ("projects", "samples", "sample_tests")
+
+
+def changed_sample_tests(changes):
+    """The sample-test ids of a notification that touched nothing else, or None."""
+    if set(changes) == {"sample_tests"}:
+        return changes["sample_tests"]
+    return None
+
+
+_SAMPLE_SELECT = ", ".join(f"s.{c} AS s_{c}" for c in SAMPLE_FIELDS)
+_SAMPLE_TEST_SELECT = ", ".join(f"st.{c} AS st_{c}" for c in SAMPLE_TEST_FIELDS)
+
+
+class ProjectWorkingSet:
+    def __init__(self, connect=None):
+        self._connect = connect or get_connection
+        self._projects_repo = ProjectRepository(self._connect)
+        self._samples_repo = SampleRepository(self._connect)
+        self._sample_tests_repo = SampleTestRepository(self._connect)
+        self.tests = {}
+        self._subscribers = []
+        self._pending = {}
+        self._batch_depth = 0
+        self._clear()
+
+    # Notifications
+
+    def subscribe(self, callback):
+        """
+        Calls callback(changes) after records change. changes maps "projects",
+        "samples" and "sample_tests" to the changed ids, or to None when every
+        record of that kind was reloaded.
+        """
+        self._subscribers.append(callback)
+
+    @contextmanager
+    def batch(self):
+        """Holds notifications until the block ends, then sends them as one."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._flush()
+
+    def _notify(self, entity, ids=None):
+        pending = self._pending
+        if ids is None or (entity in pending and pending[entity] is None):
+            pending[entity] = None
+        else:
+            pending.setdefault(entity, set()).update(ids)
+        if not self._batch_depth:
+            self._flush()
+
+    def _notify_all(self):
+        with self.batch():
+            for entity in ENTITIES:
+                self._notify(entity)
+
+    def _flush(self):
+        changes, self._pending = self._pending, {}
+        if changes:
+            for callback in list(self._subscribers):
+                callback(changes)
+
+    # Loading and lookups
+
+    def load(self, project_id):
+        """Replaces the working set with project_id's records (None clears it)."""
+        self._clear()
+        if project_id:
+            self._load_project(project_id)
+        self._notify_all()
+
+    def _load_project(self, project_id):
+        row = self._projects_repo.get(project_id)
+        if row is None:
+            return
+        self.project = Project(**{c: row[c] for c in PROJECT_FIELDS})
+        conn = self._connect()
+        try:
+            self._load_tests(conn)
+            rows = conn.execute(
+                f"""
+                SELECT {_SAMPLE_SELECT}, {_SAMPLE_TEST_SELECT}
+                FROM samples s
+                LEFT JOIN sample_tests st ON st.sample_id = s.id
+                WHERE s.project_id = ?
+                """,
+                (project_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        for r in rows:
+            sample = self.samples.get(r["s_id"])
+            if sample is None:
+                sample = self._put_sample(r, "s_")
+            if r["st_id"] is not None:
+                self._put_sample_test(r, "st_", sample)
+
+    @property
+    def project_id(self):
+        return self.project.id if self.project else None
+
+    def sample_list(self, order="name"):
+        """Samples ordered by name (then id), or newest first with order="newest"."""
+        if order == "newest":
+            return sorted(self.samples.values(), key=lambda s: s.id, reverse=True)
+        return sorted(self.samples.values(), key=lambda s: (s.sample_name or "", s.id))
+
+    def sample_test_list(self, ids=None):
+        """Sample tests ordered by sample name and test code; ids limits the result."""
+        records = self.sample_tests.values() if ids is None else (
+            self.sample_tests[i] for i in ids if i in self.sample_tests
+        )
+        return sorted(records, key=lambda st: (st.sample_name or "", st.code or "", st.id))
+
+    def tests_for_sample(self, sample_id):
+        return list(self._by_sample.get(sample_id, {}).values())
+
+    def find(self, sample_id, test_id):
+        return self._by_sample.get(sample_id, {}).get(test_id)
+
+    def test_list(self):
+        return sorted(self.tests.values(), key=lambda t: t.code)
+
+    def reload(self, entity, ids=None):
+        """
+        Re-reads the given "projects", "samples" or "sample_tests" records
+        (everything when ids is None) after the database changed outside the
+        working set.
+        """
+        if self.project is None:
+            return
+        if ids is None:
+            self.load(self.project.id)
+        elif entity == "projects":
+            self._refresh_project()
+        elif entity == "samples":
+            self._refresh_samples(ids)
+        else:
+            self._refresh_sample_tests(ids)
+
+    # Write-through
+
+    def add_sample(self, values):
+        sample_id = self._samples_repo.insert(self.project.id, values)
+        self._refresh_samples([sample_id])
+        return sample_id
+
+    def update_sample(self, sample_id, values):
+        self._samples_repo.update(sample_id, values)
+        self._refresh_samples([sample_id])
+
+    def delete_samples(self, sample_ids):
+        self._samples_repo.delete_many(sample_ids)
+        invalidate_nearby_results([self.project.id])
+        self._refresh_samples(sample_ids)
+
+    def assign_tests(self, sample_ids, test_ids, status="scheduled", cost=None):
+        added = self._sample_tests_repo.assign(sample_ids, test_ids, status=status, cost=cost)
+        if added:
+            self._refresh_samples(sample_ids)
+        return added
+
+    def delete_sample_tests(self, sample_test_ids):
+        self._sample_tests_repo.delete_many(sample_test_ids)
+        invalidate_nearby_results([self.project.id])
+        self._refresh_sample_tests(sample_test_ids)
+
+    # Internals
+
+    def _clear(self):
+        self.project = None
+        self.samples = {}
+        self.sample_tests = {}
+        self._by_sample = {}
+
+    def _load_tests(self, conn):
+        # The test catalog is shared by every project and rarely changes.
+        if self.tests:
+            return
+        for r in conn.execute("SELECT id, code, name, default_cost FROM tests").fetchall():
+            self.tests[r["id"]] = TestType(r["id"], r["code"], r["name"], r["default_cost"])
+
+    def _put_sample(self, row, prefix):
+        values = {c: row[prefix + c] for c in SAMPLE_FIELDS}
+        sample = self.samples.get(values["id"])
+        if sample is None:
+            sample = self.samples[values["id"]] = Sample(**values)
+        else:
+            for c, v in values.items():
+                setattr(sample, c, v)
+        return sample
+
+    def _put_sample_test(self, row, prefix, sample):
+        values = {c: row[prefix + c] for c in SAMPLE_TEST_FIELDS}
+        self._drop_sample_test(values["id"])
+        record = SampleTest(**values, sample=sample, test=self.tests.get(values["test_id"]))
+        self.sample_tests[record.id] = record
+        self._by_sample.setdefault(record.sample_id, {})[record.test_id] = record
+        return record
+
+    def _drop_sample_test(self, sample_test_id):
+        record = self.sample_tests.pop(sample_test_id, None)
+        if record is not None:
+            by_test = self._by_sample.get(record.sample_id, {})
+            if by_test.get(record.test_id) is record:
+                del by_test[record.test_id]
+
+    def _refresh_project(self):
+        row = self._projects_repo.get(self.project.id)
+        if row is None:
+            self._clear()
+            self._notify_all()
+            return
+        self.project = Project(**{c: row[c] for c in PROJECT_FIELDS})
+        self._notify("projects", [self.project.id])
+
+    def _refresh_samples(self, sample_ids):
+        # A sample's own row and all of its tests, in one query.
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT {_SAMPLE_SELECT}, {_SAMPLE_TEST_SELECT}
+                FROM samples s
+                LEFT JOIN sample_tests st ON st.sample_id = s.id
+                WHERE s.id IN (SELECT value FROM json_each(?)) AND s.project_id = ?
+                """,
+                (json.dumps(list(sample_ids)), self.project.id),
+            ).fetchall()
+        finally:
+            conn.close()
+        for sample_id in sample_ids:
+            for record in self.tests_for_sample(sample_id):
+                self._drop_sample_test(record.id)
+            self._by_sample.pop(sample_id, None)
+            self.samples.pop(sample_id, None)
+        for r in rows:
+            sample = self.samples.get(r["s_id"]) or self._put_sample(r, "s_")
+            if r["st_id"] is not None:
+                self._put_sample_test(r, "st_", sample)
+        self._notify("samples", sample_ids)
+
+    def _refresh_sample_tests(self, sample_test_ids):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT {_SAMPLE_TEST_SELECT}
+                FROM sample_tests st
+                WHERE st.id IN (SELECT value FROM json_each(?)) AND st.project_id = ?
+                """,
+                (json.dumps(list(sample_test_ids)), self.project.id),
+            ).fetchall()
+        finally:
+            conn.close()
+        for sample_test_id in sample_test_ids:
+            self._drop_sample_test(sample_test_id)
+        for r in rows:
+            sample = self.samples.get(r["st_sample_id"])
+            if sample is not None:
+                self._put_sample_test(r, "st_", sample)
+        self._notify("sample_tests", sample_test_ids)
+
+
+WORKING_SET = ProjectWorkingSet()
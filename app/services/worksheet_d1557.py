@@ -1,5 +1,7 @@
 from pathlib import Path
 
+from app.services.compaction_chart import CompactionChart
+
 try:
     from reportlab.lib.pagesizes import letter, landscape
     from reportlab.pdfgen import canvas
@@ -57,7 +59,11 @@ def extract_points(rows):
     return points
 
 
-def calculate_d1557(points):
+def calculate_d1557(points, fit=None):
+    """
+    Max dry density and optimum moisture from (moisture, dry density)
+    points. fit may be a QuadraticFit already holding exactly these points.
+    """
     if len(points) < 3:
         max_pt = max(points, key=lambda p: p[1]) if points else (None, None)
         return {
@@ -67,23 +73,7 @@ def calculate_d1557(points):
         }
 
     xs = [float(p[0]) for p in points]
-    ys = [float(p[1]) for p in points]
-    s1 = sum(xs)
-    s2 = sum(x * x for x in xs)
-    s3 = sum(x * x * x for x in xs)
-    s4 = sum(x * x * x * x for x in xs)
-    sy = sum(ys)
-    sxy = sum(x * y for x, y in zip(xs, ys))
-    sx2y = sum((x * x) * y for x, y in zip(xs, ys))
-    n = len(xs)
-
-    solved = _gauss3(
-        [
-            [s4, s3, s2, sx2y],
-            [s3, s2, s1, sxy],
-            [s2, s1, n, sy],
-        ]
-    )
+    solved = (fit if fit is not None else QuadraticFit(points)).solve()
     if not solved:
         max_pt = max(points, key=lambda p: p[1])
         return {
@@ -118,6 +108,51 @@ def calculate_d1557(points):
     }
 
 
+class QuadraticFit:
+    """
+    Least-squares y = a*x^2 + b*x + c through (moisture, dry density)
+    points, kept as the running sums of the normal equations so adding a
+    point is O(1) and solving is a single 3x3 elimination. There is no
+    remove: subtracting a large x back out of the x^4 sum is not exact, so
+    callers clear() and re-add the remaining points instead.
+    """
+
+    __slots__ = ("n", "s1", "s2", "s3", "s4", "sy", "sxy", "sx2y")
+
+    def __init__(self, points=()):
+        self.clear()
+        for x, y in points:
+            self.add(x, y)
+
+    def clear(self):
+        self.n = 0
+        self.s1 = self.s2 = self.s3 = self.s4 = self.sy = self.sxy = self.sx2y = 0.0
+
+    def add(self, x, y):
+        x, y = float(x), float(y)
+        x2 = x * x
+        self.n += 1
+        self.s1 += x
+        self.s2 += x2
+        self.s3 += x2 * x
+        self.s4 += x2 * x * x
+        self.sy += y
+        self.sxy += x * y
+        self.sx2y += x2 * y
+
+    def solve(self):
+        """(a, b, c), or None with fewer than 3 points or a singular system."""
+        if self.n < 3:
+            return None
+        return _gauss3(
+            [
+                [self.s4, self.s3, self.s2, self.sx2y],
+                [self.s3, self.s2, self.s1, self.sxy],
+                [self.s2, self.s1, self.n, self.sy],
+            ]
+        )
+
+
 def export_d1557_pdf(path, project, sample_label, rows, calc, g_values, astm_designation="ASTM D1557"):
     if canvas is None:
         raise RuntimeError("PDF export requires reportlab. Please install dependencies.")
@@ -218,83 +253,49 @@ def export_d1557_pdf(path, project, sample_label, rows, calc, g_values, astm_des
     c.rect(chart_left, chart_bottom, chart_w, chart_h)
 
     if points:
-        xs = [p[0] for p in points]
-        ys = [p[1] for p in points]
-        # User-requested axis ranges.
-        max_data_x = max(xs)
-        if max_data_x > 20:
-            minx, maxx = 10.0, 30.0
-        else:
-            minx, maxx = 0.0, 20.0
-        miny, maxy = 95.0, 155.0
-
-        def pxy(xv, yv):
-            px = chart_left + ((xv - minx) / (maxx - minx)) * chart_w
-            py = chart_bottom + ((yv - miny) / (maxy - miny)) * chart_h
-            return px, py
+        chart = CompactionChart(points, g_values, _fit_quadratic(points))
+
+        def pxy(u, v):
+            return chart_left + u * chart_w, chart_bottom + v * chart_h
 
         # Axes ticks/grid for readability and proportional scaling.
         c.setStrokeColorRGB(0.82, 0.86, 0.9)
-        for xv in _nice_ticks(minx, maxx, 6):
-            px, _ = pxy(xv, miny)
-            c.line(px, chart_bottom, px, chart_bottom + chart_h)
-            c.setFillColorRGB(0.2, 0.2, 0.2)
-            c.setFont("Helvetica", 7)
-            c.drawCentredString(px, chart_bottom - 10, f"{xv:g}")
-        for yv in _nice_ticks(miny, maxy, 6):
-            _, py = pxy(minx, yv)
-            c.line(chart_left, py, chart_left + chart_w, py)
-            c.setFillColorRGB(0.2, 0.2, 0.2)
-            c.setFont("Helvetica", 7)
-            c.drawString(chart_left - 24, py - 2, f"{yv:g}")
+        c.setFillColorRGB(0.2, 0.2, 0.2)
+        c.setFont("Helvetica", 7)
+        grid = [pxy(u, 0) + pxy(u, 1) for _x, u in chart.x_ticks]
+        grid += [pxy(0, v) + pxy(1, v) for _y, v in chart.y_ticks]
+        c.lines(grid)
+        for xv, u in chart.x_ticks:
+            c.drawCentredString(chart_left + u * chart_w, chart_bottom - 10, f"{xv:g}")
+        for yv, v in chart.y_ticks:
+            c.drawString(chart_left - 24, chart_bottom + v * chart_h - 2, f"{yv:g}")
         c.setFillColorRGB(0, 0, 0)
 
         # Zero-air-void reference lines
-        for idx, g in enumerate(g_values):
-            pts = []
-            step = (maxx - minx) / 30.0
-            xw = minx
-            while xw <= maxx:
-                den = 1.0 + (xw / 100.0) * g
-                if den > 0:
-                    yv = (62.43 * g) / den
-                    if miny <= yv <= maxy:
-                        pts.append(pxy(xw, yv))
-                xw += step
-            if len(pts) > 1:
-                c.setDash(2, 2)
-                c.setStrokeColorRGB(0.2, 0.45, 0.7 - idx * 0.1 if idx < 3 else 0.4)
-                for k in range(1, len(pts)):
-                    c.line(pts[k - 1][0], pts[k - 1][1], pts[k][0], pts[k][1])
-                lx, ly = pts[-1]
-                c.setFont("Helvetica", 7)
-                c.drawString(lx - 25, ly + 2, f"G={g:g}")
-                c.setDash()
+        for idx, (g, curve) in enumerate(chart.zav):
+            if len(curve) < 2:
+                continue
+            pts = [pxy(u, v) for u, v in curve]
+            c.setDash(2, 2)
+            c.setStrokeColorRGB(0.2, 0.45, 0.7 - idx * 0.1 if idx < 3 else 0.4)
+            c.lines([p + q for p, q in zip(pts, pts[1:])])
+            lx, ly = pts[-1]
+            c.setFont("Helvetica", 7)
+            c.drawString(lx - 25, ly + 2, f"G={g:g}")
+            c.setDash()
 
         # Points
         c.setStrokeColorRGB(0.0, 0.2, 0.4)
         c.setFillColorRGB(0.0, 0.2, 0.4)
-        sorted_points = sorted(points, key=lambda p: p[0])
-        for xv, yv in sorted_points:
-            px, py = pxy(xv, yv)
+        for u, v in chart.points:
+            px, py = pxy(u, v)
             c.circle(px, py, 2, stroke=1, fill=1)
 
         # Smooth interpreted proctor curve (quadratic fit) instead of point-to-point lines.
-        fit = _fit_quadratic(points)
-        if fit is not None:
-            a, b, cc = fit
+        if len(chart.fit) > 1:
             c.setStrokeColorRGB(0.05, 0.35, 0.6)
-            last = None
-            step = (maxx - minx) / 80.0
-            xw = minx
-            while xw <= maxx:
-                yfit = a * xw * xw + b * xw + cc
-                if miny <= yfit <= maxy:
-                    px, py = pxy(xw, yfit)
-                    if last is not None:
-                        c.line(last[0], last[1], px, py)
-                    last = (px, py)
-                xw += step
+            pts = [pxy(u, v) for u, v in chart.fit]
+            c.lines([p + q for p, q in zip(pts, pts[1:])])
 
     # Axis titles in red and with more spacing from frame.
     c.setFillColorRGB(0.75, 0.1, 0.1)
@@ -356,48 +357,4 @@ def _gauss3(A):
 
 
 def _fit_quadratic(points):
-    if len(points) < 3:
-        return None
-    xs = [float(p[0]) for p in points]
-    ys = [float(p[1]) for p in points]
-    s1 = sum(xs)
-    s2 = sum(x * x for x in xs)
-    s3 = sum(x * x * x for x in xs)
-    s4 = sum(x * x * x * x for x in xs)
-    sy = sum(ys)
-    sxy = sum(x * y for x, y in zip(xs, ys))
-    sx2y = sum((x * x) * y for x, y in zip(xs, ys))
-    return _gauss3(
-        [
-            [s4, s3, s2, sx2y],
-            [s3, s2, s1, sxy],
-            [s2, s1, len(xs), sy],
-        ]
-    )
-
-
-def _nice_ticks(minv, maxv, count):
-    if maxv <= minv:
-        return [minv]
-    span = maxv - minv
-    raw = span / max(1, (count - 1))
-    mag = 10 ** int(__import__("math").floor(__import__("math").log10(abs(raw)))) if raw != 0 else 1
-    norm = raw / mag
-    if norm < 1.5:
-        step = 1 * mag
-    elif norm < 3:
-        step = 2 * mag
-    elif norm < 7:
-        step = 5 * mag
-    else:
-        step = 10 * mag
-    start = __import__("math").floor(minv / step) * step
-    end = __import__("math").ceil(maxv / step) * step
-    vals = []
-    v = start
-    n = 0
-    while v <= end + 1e-9 and n < 100:
-        vals.append(v)
-        v += step
-        n += 1
-    return [x for x in vals if minv - 1e-9 <= x <= maxv + 1e-9]
+    return QuadraticFit(points).solve()
@@ -1,6 +1,8 @@
-import json
 from pathlib import Path
 
+from app.services.calibrations import apply_calibration, linear_fit
+from app.services.payload_codec import decode_payload, encode_payload
+
 try:
     from reportlab.lib.pagesizes import letter
     from reportlab.pdfgen import canvas
@@ -49,6 +51,7 @@ WORKSHEET_SPECS = {
         "fields": [
             ("a_begin", "A Begin: Sand/Bottle/Cone", "lb"),
             ("b_end", "B End: Sand/Bottle/Cone", "lb"),
+            ("calibration_id", "Sand Calibration ID", ""),
             ("d_cone", "D Sand in Cone (calibrated)", "lb"),
             ("f_sand_density", "F Density of Test Sand", "pcf"),
             ("h_moist_tare", "H Moist Soil + Tare", "lb"),
@@ -209,6 +212,7 @@ WORKSHEET_SPECS = {
             ("wet_sample_tare", "G Wet Sample + Tare", "g", "", False, False),
             ("dry_sample_tare", "H Dry Sample + Tare", "g", "", False, False),
             ("tare_weight", "I Tare", "g", "", False, False),
+            ("calibration_id", "Ring Calibration ID", "", "", False, False),
             ("ring_const", "Ring Constant", "", "5.8081", True, True),
             ("volume_divisor", "Volume Divisor", "", "2200", True, True),
             ("grams_per_lb", "Grams per Pound", "", "453.6", True, True),
@@ -237,7 +241,7 @@ def get_spec(test_name):
 
 
 def compute_values(test_name, payload):
-    vals = dict(payload or {})
+    vals, _fit = apply_calibration(dict(payload or {}))
     out = {}
     if test_name == "Sand Cone":
         a = _num(vals.get("a_begin"))
@@ -638,7 +642,7 @@ def export_generic_pdf(path, project, sample_label, test_name, payload, computed
     c.setFont("Helvetica-Bold", 9)
     c.drawString(36, y, "Input Data")
     y -= 12
-    _draw_rows(c, y, spec["fields"], payload, left=36, width=w - 72)
+    _draw_rows(c, y, spec["fields"], apply_calibration(dict(payload or {}))[0], left=36, width=w - 72)
     y -= 16 * max(1, len(spec["fields"])) + 8
     if spec["computed"]:
         c.setFont("Helvetica-Bold", 9)
@@ -667,7 +671,7 @@ def export_field_density_pdf(path, project, sample_label, payload, computed):
     y -= 12
     c.drawString(36, y, f"Sample: {sample_label}")
 
-    vals = dict(payload or {})
+    vals, _fit = apply_calibration(dict(payload or {}))
     inputs = [
         ("A Number of Rings", vals.get("ring_count"), "count"),
         ("B Moist Soil + Rings", vals.get("ring_moist_plus_rings"), "g"),
@@ -739,17 +743,11 @@ def _draw_rows(c, y_top, rows, values, left, width):
 
 
 def dumps_payload(payload):
-    return json.dumps(payload or {})
+    return encode_payload(payload)
 
 
 def loads_payload(raw):
-    if not raw:
-        return {}
-    try:
-        obj = json.loads(raw)
-    except Exception:
-        return {}
-    return obj if isinstance(obj, dict) else {}
+    return decode_payload(raw)
 
 
 def _num(val):
@@ -796,22 +794,6 @@ def _pct(a, b):
     return v * 100.0
 
 
-def _linear_fit(points):
-    if len(points) < 2:
-        return None, None
-    n = float(len(points))
-    sx = sum(p[0] for p in points)
-    sy = sum(p[1] for p in points)
-    sxx = sum(p[0] * p[0] for p in points)
-    sxy = sum(p[0] * p[1] for p in points)
-    den = n * sxx - sx * sx
-    if abs(den) <= 1e-12:
-        return None, None
-    m = (n * sxy - sx * sy) / den
-    b = (sy - m * sx) / n
-    return m, b
-
-
 def _viscosity_at_temp(temp_c):
     if temp_c is None:
         return None
@@ -948,6 +930,7 @@ def grain_size_default_payload():
 def compute_grain_size(payload):
     vals = dict(grain_size_default_payload())
     vals.update(payload or {})
+    vals, cal_fit = apply_calibration(vals)
     a = _num(vals.get("wash_a_wet_tare"))
     b = _num(vals.get("wash_b_dry_tare"))
     c = _num(vals.get("wash_c_tare"))
@@ -1029,13 +1012,17 @@ def compute_grain_size(payload):
     pct_finer_no10 = _num(vals.get("hydro_pct_finer_no10"))
     if pct_finer_no10 is None:
         pct_finer_no10 = 1.0
-    cal_pts = []
-    for idx in range(1, 5):
-        ct = _num(vals.get(f"hydro_cal_t{idx}"))
-        cc = _num(vals.get(f"hydro_cal_c{idx}"))
-        if ct is not None and cc is not None:
-            cal_pts.append((ct, cc))
-    m_cal, b_cal = _linear_fit(cal_pts)
+    # A library calibration carries its fitted line; inline points are fitted here.
+    if cal_fit is not None:
+        m_cal, b_cal = cal_fit
+    else:
+        cal_pts = []
+        for idx in range(1, 5):
+            ct = _num(vals.get(f"hydro_cal_t{idx}"))
+            cc = _num(vals.get(f"hydro_cal_c{idx}"))
+            if ct is not None and cc is not None:
+                cal_pts.append((ct, cc))
+        m_cal, b_cal = linear_fit(cal_pts)
     out["hydro_cal_slope"] = m_cal
     out["hydro_cal_intercept"] = b_cal
     hydro_points = []
@@ -1084,6 +1071,11 @@ def has_dry_sieve_entries(payload):
     return False
 
 
+def grain_hydrometer_enabled(payload):
+    raw = str((payload or {}).get("hydro_enabled", "")).strip().lower()
+    return raw in {"yes", "y", "true", "1"}
+
+
 def parse_hydro_points(raw_text):
     text = (raw_text or "").strip()
     if not text:
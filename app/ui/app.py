@@ -13,7 +13,12 @@ from app.ui.map_view import MapTab
 from app.ui.worksheets import WorksheetsTab
 from app.ui.calculations import CalculationsTab
 from app.ui.settings import SettingsTab
-from app.db import get_connection
+from app.services.working_set import WORKING_SET
+from app.services.concurrency import changes_since, latest_seq, prune_change_feed
+from app.services.nearby_results import invalidate_nearby_results
+from app.services.calibrations import invalidate_calibrations
+
+CHANGE_POLL_MS = 3000
 
 
 class GeoLabApp(tk.Tk):
@@ -27,6 +32,10 @@ class GeoLabApp(tk.Tk):
 
         self._build_ui()
 
+        prune_change_feed()
+        self._feed_seq = latest_seq()
+        self.after(CHANGE_POLL_MS, self._poll_changes)
+
     def _build_ui(self):
         style = ttk.Style(self)
 
@@ -150,19 +159,11 @@ class GeoLabApp(tk.Tk):
             get_project_id=self._get_project_id,
             on_samples_changed=self._on_samples_changed,
         )
-        self.tests_tab = TestsTab(
-            self.notebook,
-            get_project_id=self._get_project_id,
-            on_tests_changed=self._on_tests_changed,
-        )
+        self.tests_tab = TestsTab(self.notebook, get_project_id=self._get_project_id)
         self.billing_tab = BillingTab(self.notebook, get_project_id=self._get_project_id)
         self.rates_tab = RatesTab(self.notebook, on_rates_changed=self._on_rates_changed)
         self.results_tab = ResultsTab(self.notebook, get_project_id=self._get_project_id)
-        self.worksheets_tab = WorksheetsTab(
-            self.notebook,
-            get_project_id=self._get_project_id,
-            on_saved=self._on_worksheets_saved,
-        )
+        self.worksheets_tab = WorksheetsTab(self.notebook, get_project_id=self._get_project_id)
         self.calculations_tab = CalculationsTab(self.notebook, get_project_id=self._get_project_id)
         self.map_tab = MapTab(self.notebook)
         self.settings_tab = SettingsTab(self.notebook)
@@ -182,14 +183,11 @@ class GeoLabApp(tk.Tk):
 
     def _on_project_selected(self, project_id):
         self.selected_project_id = project_id
+        # Tabs that list samples and tests redraw themselves from the load.
+        WORKING_SET.load(project_id)
         self._update_project_label()
         self._set_project_enabled(bool(project_id))
-        self.samples_tab.refresh()
-        self.tests_tab.refresh()
-        self.results_tab.refresh()
-        self.worksheets_tab.refresh()
         self.calculations_tab.refresh()
-        self.billing_tab.refresh()
         self.rates_tab.refresh()
         self.map_tab.refresh()
         self.settings_tab.refresh()
@@ -206,19 +204,11 @@ class GeoLabApp(tk.Tk):
         self.notebook.tab(self.billing_tab, state=state)
 
     def _update_project_label(self):
-        if not self.selected_project_id:
+        project = WORKING_SET.project
+        if not self.selected_project_id or project is None:
             self.project_label_var.set("Selected Project: None")
             return
-        conn = get_connection()
-        row = conn.execute(
-            "SELECT file_number, job_name FROM projects WHERE id = ?",
-            (self.selected_project_id,),
-        ).fetchone()
-        conn.close()
-        if not row:
-            self.project_label_var.set("Selected Project: None")
-            return
-        self.project_label_var.set(f"Selected Project: {row['file_number']} - {row['job_name']}")
+        self.project_label_var.set(f"Selected Project: {project.file_number} - {project.job_name}")
 
     def _on_rates_changed(self):
         self.projects_tab.refresh_rates()
@@ -229,23 +219,59 @@ class GeoLabApp(tk.Tk):
         self.calculations_tab.refresh()
         self.map_tab.refresh()
 
-    def _on_tests_changed(self):
-        self.tests_tab.refresh()
-        self.results_tab.refresh()
-        self.billing_tab.refresh()
-        self.worksheets_tab.refresh()
-        self.calculations_tab.refresh()
-
     def _on_samples_changed(self):
-        self.tests_tab.refresh()
-        self.results_tab.refresh()
-        self.worksheets_tab.refresh()
-        self.billing_tab.refresh()
-        self.calculations_tab.refresh()
         self.map_tab.refresh()
 
-    def _on_worksheets_saved(self):
-        self.results_tab.refresh()
-        self.billing_tab.refresh()
-        self.tests_tab.refresh()
-        self.calculations_tab.refresh()
+    def _poll_changes(self):
+        # Picks up writes from other workstations sharing this database file.
+        try:
+            changes, self._feed_seq, complete = changes_since(self._feed_seq)
+        except Exception:
+            changes, complete = {}, True
+        if not complete:
+            invalidate_nearby_results()
+            invalidate_calibrations()
+            self.projects_tab.refresh()
+            self._on_project_selected(self.selected_project_id)
+        elif changes:
+            self._apply_changes(changes)
+        self.after(CHANGE_POLL_MS, self._poll_changes)
+
+    def _apply_changes(self, changes):
+        project_id = self.selected_project_id
+
+        def ids_for_project(entity):
+            # Rows removed by a cascade report no project; tabs ignore ids they do not show.
+            return {
+                entity_id
+                for entity_id, (_op, pid) in changes.get(entity, {}).items()
+                if pid is None or pid == project_id
+            }
+
+        touched_projects = set(changes.get("projects", {}))
+        for entity in ("samples", "sample_tests"):
+            touched_projects.update(pid for _op, pid in changes.get(entity, {}).values() if pid is not None)
+        self.projects_tab.apply_changes(touched_projects)
+        # Project edits can move coordinates, which affects every cached cell.
+        if "projects" in changes:
+            invalidate_nearby_results()
+        elif touched_projects:
+            invalidate_nearby_results(touched_projects)
+        if "calibrations" in changes:
+            invalidate_calibrations()
+
+        if not project_id:
+            return
+        sample_ids = ids_for_project("samples")
+        sample_test_ids = (
+            ids_for_project("sample_tests") | ids_for_project("worksheet_runs") | ids_for_project("astm1557_runs")
+        )
+        # One notification, so subscribed tabs redraw once per poll.
+        with WORKING_SET.batch():
+            if project_id in changes.get("projects", {}):
+                WORKING_SET.reload("projects", [project_id])
+            if sample_ids:
+                WORKING_SET.reload("samples", sample_ids)
+            if sample_test_ids:
+                WORKING_SET.reload("sample_tests", sample_test_ids)
+        self._update_project_label()
@@ -1,15 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
-from app.db import get_connection
 from app.services.billing_export import export_billing_xlsx, export_billing_pdf
+from app.services.repository import ProjectRepository, SampleTestRepository
+from app.services.working_set import WORKING_SET
 
 
 class BillingTab(ttk.Frame):
     def __init__(self, parent, get_project_id):
         super().__init__(parent)
         self.get_project_id = get_project_id
+        self.sample_tests = SampleTestRepository()
         self._build_ui()
+        WORKING_SET.subscribe(self._on_working_set_changed)
+
+    def _on_working_set_changed(self, changes):
+        if "samples" in changes or "sample_tests" in changes:
+            self.refresh()
 
     def _build_ui(self):
         top = ttk.Frame(self)
@@ -40,42 +47,29 @@ class BillingTab(ttk.Frame):
         ttk.Button(footer, text="Export PDF", command=self._export_pdf).pack(side=tk.RIGHT, padx=8)
 
     def refresh(self):
+        project_id = self.get_project_id()
+        # Repricing reloads the working set, which redraws this tab first.
+        if project_id:
+            self._sync_rate_prices(project_id)
+
         for item in self.tree.get_children():
             self.tree.delete(item)
-
-        project_id = self.get_project_id()
         if not project_id:
             self.total_var.set("Total: $0.00")
             return
 
-        self._sync_rate_prices(project_id)
-
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT s.sample_name, s.depth_raw, t.code, t.name, st.cost
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            ORDER BY s.sample_name, t.code
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
-
         total = 0.0
-        for row in rows:
-            cost = float(row["cost"])
+        for record in WORKING_SET.sample_test_list():
+            cost = float(record.cost)
             total += cost
             self.tree.insert(
                 "",
                 tk.END,
                 values=(
-                    row["sample_name"],
-                    row["depth_raw"] or "",
-                    row["code"],
-                    row["name"],
+                    record.sample_name,
+                    record.depth_raw or "",
+                    record.code,
+                    record.name,
                     f"{cost:.2f}",
                 ),
             )
@@ -83,30 +77,8 @@ class BillingTab(ttk.Frame):
         self.total_var.set(f"Total: ${total:.2f}")
 
     def _sync_rate_prices(self, project_id):
-        conn = get_connection()
-        conn.execute(
-            """
-            UPDATE sample_tests
-            SET cost = (
-                SELECT tr.price
-                FROM test_rates tr
-                JOIN projects p ON p.billing_rate_id = tr.rate_id
-                WHERE p.id = ?
-                  AND tr.test_id = sample_tests.test_id
-            )
-            WHERE sample_id IN (SELECT id FROM samples WHERE project_id = ?)
-              AND EXISTS (
-                SELECT 1
-                FROM test_rates tr
-                JOIN projects p ON p.billing_rate_id = tr.rate_id
-                WHERE p.id = ?
-                  AND tr.test_id = sample_tests.test_id
-              )
-            """,
-            (project_id, project_id, project_id),
-        )
-        conn.commit()
-        conn.close()
+        if self.sample_tests.reprice(project_id) > 0:
+            WORKING_SET.reload("sample_tests")
 
     def _fetch_export_data(self):
         project_id = self.get_project_id()
@@ -114,24 +86,9 @@ class BillingTab(ttk.Frame):
             messagebox.showerror("No Project", "Select a project first.")
             return None
 
-        conn = get_connection()
-        project = conn.execute(
-            "SELECT file_number, job_name, client_type, billing_rate_id FROM projects WHERE id = ?",
-            (project_id,),
-        ).fetchone()
-
-        line_items = conn.execute(
-            """
-            SELECT s.sample_name, s.depth_raw, t.code, t.name, st.cost
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            ORDER BY s.sample_name, t.code
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
+        project = ProjectRepository().get(project_id)
+        # The same lines the tab lists.
+        line_items = WORKING_SET.sample_test_list()
 
         if not line_items:
             messagebox.showerror("Empty", "No tests assigned for this project.")
@@ -139,11 +96,11 @@ class BillingTab(ttk.Frame):
 
         return dict(project), [
             {
-                "sample_name": r["sample_name"],
-                "depth_raw": r["depth_raw"] or "",
-                "test_code": r["code"],
-                "test_name": r["name"],
-                "cost": r["cost"],
+                "sample_name": r.sample_name,
+                "depth_raw": r.depth_raw or "",
+                "test_code": r.code,
+                "test_name": r.name,
+                "cost": r.cost,
             }
             for r in line_items
         ]
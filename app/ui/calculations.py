@@ -2,8 +2,9 @@ import json
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
-from app.db import get_connection, now_iso
 from app.services.calculations_pti import default_payload, compute_pti, export_pti_pdf
+from app.services.concurrency import ConflictError
+from app.services.repository import ProjectRepository, WorksheetRunRepository
 
 
 class CalculationsTab(ttk.Frame):
@@ -13,6 +14,9 @@ class CalculationsTab(ttk.Frame):
         self.input_vars = {}
         self.output_vars = {}
         self._last_computed = {}
+        self.loaded_version = None
+        self.projects = ProjectRepository()
+        self.runs = WorksheetRunRepository()
         self._build_ui()
 
     def _build_ui(self):
@@ -229,20 +233,10 @@ class CalculationsTab(ttk.Frame):
             self.summary_var.set("Select a project and enter PTI inputs.")
             self._set_outputs({})
             return
-        conn = get_connection()
-        row = conn.execute(
-            """
-            SELECT payload_json, computed_json
-            FROM calculations_runs
-            WHERE project_id = ? AND calc_key = 'pti_shrink'
-            """,
-            (project_id,),
-        ).fetchone()
-        proj = conn.execute(
-            "SELECT file_number, job_name FROM projects WHERE id = ?",
-            (project_id,),
-        ).fetchone()
-        conn.close()
+        run = self.runs.calculation_run(project_id)
+        proj = self.projects.get(project_id)
+        self.loaded_version = run["row_version"] if run else None
+        row = run if run and run["calc_key"] == "pti_shrink" else None
 
         data = default_payload()
         computed = {}
@@ -280,21 +274,13 @@ class CalculationsTab(ttk.Frame):
             return
         payload = self._collect_payload()
         computed = compute_pti(payload)
-        conn = get_connection()
-        conn.execute(
-            """
-            INSERT INTO calculations_runs (project_id, calc_key, payload_json, computed_json, updated_at)
-            VALUES (?, 'pti_shrink', ?, ?, ?)
-            ON CONFLICT(project_id) DO UPDATE SET
-                calc_key = excluded.calc_key,
-                payload_json = excluded.payload_json,
-                computed_json = excluded.computed_json,
-                updated_at = excluded.updated_at
-            """,
-            (project_id, json.dumps(payload), json.dumps(computed), now_iso()),
-        )
-        conn.commit()
-        conn.close()
+        try:
+            self.loaded_version = self.runs.save_calculation(
+                project_id, "pti_shrink", json.dumps(payload), json.dumps(computed), self.loaded_version
+            )
+        except ConflictError as exc:
+            messagebox.showerror("Save Conflict", f"{exc}\nYour inputs were kept; refresh the tab to see the saved values.")
+            return
         self._set_outputs(computed)
         messagebox.showinfo("Saved", "PTI shrink/swell calculation saved.")
 
@@ -305,12 +291,7 @@ class CalculationsTab(ttk.Frame):
             return
         payload = self._collect_payload()
         computed = compute_pti(payload)
-        conn = get_connection()
-        project = conn.execute(
-            "SELECT file_number, job_name FROM projects WHERE id = ?",
-            (project_id,),
-        ).fetchone()
-        conn.close()
+        project = self.projects.get(project_id)
         if not project:
             messagebox.showerror("Missing", "Project not found.")
             return
@@ -0,0 +1,145 @@
+import tkinter as tk
+from datetime import date
+from tkinter import messagebox, ttk
+
+from app.services.calibration_runs import calibrated_run_counts, recompute_calibrated_runs
+from app.services.calibrations import CALIBRATION_KINDS, list_calibrations, save_calibration
+from app.services.working_set import WORKING_SET
+
+
+class CalibrationLibrary(tk.Toplevel):
+    """
+    Lists the shared equipment calibrations and adds or edits one. Saving
+    recomputes the results of the runs that reference the calibration.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Calibration Library")
+        self.geometry("980x560")
+        self.kind_var = tk.StringVar(value="hydrometer")
+        self.equipment_var = tk.StringVar()
+        self.date_var = tk.StringVar(value=date.today().isoformat())
+        self.notes_var = tk.StringVar()
+        self.status_var = tk.StringVar(value="Select a calibration to edit it, or enter a new one.")
+        self.value_vars = {}
+        self._calibrations = {}
+        self._build_ui()
+        self._render_value_fields()
+        self.refresh()
+
+    def _build_ui(self):
+        columns = ("id", "kind", "equipment", "effective", "values", "fit")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=12)
+        for col, title, width in (
+            ("id", "ID", 50),
+            ("kind", "Kind", 120),
+            ("equipment", "Equipment", 110),
+            ("effective", "Effective", 90),
+            ("values", "Values", 420),
+            ("fit", "Fit (m, b)", 160),
+        ):
+            self.tree.heading(col, text=title)
+            self.tree.column(col, width=width, anchor=tk.W)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 6))
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+
+        form = ttk.LabelFrame(self, text="Calibration")
+        form.pack(fill=tk.X, padx=10, pady=(0, 6))
+        head = ttk.Frame(form)
+        head.pack(fill=tk.X, padx=8, pady=6)
+        ttk.Label(head, text="Kind").pack(side=tk.LEFT)
+        kind = ttk.Combobox(
+            head, textvariable=self.kind_var, values=list(CALIBRATION_KINDS), state="readonly", width=12
+        )
+        kind.pack(side=tk.LEFT, padx=(4, 12))
+        kind.bind("<<ComboboxSelected>>", lambda _e: self._render_value_fields())
+        ttk.Label(head, text="Equipment ID").pack(side=tk.LEFT)
+        ttk.Entry(head, textvariable=self.equipment_var, width=14).pack(side=tk.LEFT, padx=(4, 12))
+        ttk.Label(head, text="Effective (YYYY-MM-DD)").pack(side=tk.LEFT)
+        ttk.Entry(head, textvariable=self.date_var, width=12).pack(side=tk.LEFT, padx=(4, 12))
+        ttk.Label(head, text="Notes").pack(side=tk.LEFT)
+        ttk.Entry(head, textvariable=self.notes_var, width=30).pack(side=tk.LEFT, padx=(4, 0))
+        self.values_frame = ttk.Frame(form)
+        self.values_frame.pack(fill=tk.X, padx=8, pady=(0, 6))
+
+        actions = ttk.Frame(self)
+        actions.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(actions, text="New", command=self._new).pack(side=tk.LEFT)
+        ttk.Button(actions, text="Save and Recompute", command=self._save).pack(side=tk.LEFT, padx=(8, 0))
+        ttk.Label(actions, textvariable=self.status_var).pack(side=tk.LEFT, padx=(16, 0))
+
+    def _render_value_fields(self, values=None):
+        for child in self.values_frame.winfo_children():
+            child.destroy()
+        self.value_vars = {}
+        for i, key in enumerate(CALIBRATION_KINDS[self.kind_var.get()][1]):
+            var = tk.StringVar(value=(values or {}).get(key, ""))
+            self.value_vars[key] = var
+            ttk.Label(self.values_frame, text=key).grid(
+                row=i // 4, column=(i % 4) * 2, sticky=tk.W, padx=(0, 4), pady=2
+            )
+            ttk.Entry(self.values_frame, textvariable=var, width=12).grid(
+                row=i // 4, column=(i % 4) * 2 + 1, sticky=tk.W, padx=(0, 14), pady=2
+            )
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        self._calibrations = {}
+        for c in list_calibrations():
+            self._calibrations[str(c["id"])] = c
+            values = ", ".join(f"{k}={v}" for k, v in c["fields"].items())
+            fit = f"{c['slope']:.6g}, {c['intercept']:.6g}" if c["slope"] is not None else ""
+            self.tree.insert(
+                "",
+                tk.END,
+                iid=str(c["id"]),
+                values=(c["id"], CALIBRATION_KINDS[c["kind"]][0], c["equipment_id"], c["effective_date"], values, fit),
+            )
+
+    def _on_select(self, _event):
+        sel = self.tree.selection()
+        if not sel:
+            return
+        c = self._calibrations[sel[0]]
+        self.kind_var.set(c["kind"])
+        self.equipment_var.set(c["equipment_id"])
+        self.date_var.set(c["effective_date"])
+        self.notes_var.set(c["notes"] or "")
+        self._render_value_fields(c["fields"])
+        counts = calibrated_run_counts(c["id"])
+        self.status_var.set(
+            f"Calibration {c['id']} is used by {counts['grain_size']} grain-size "
+            f"and {counts['worksheets']} worksheet run(s)."
+        )
+
+    def _new(self):
+        self.tree.selection_remove(*self.tree.selection())
+        self.equipment_var.set("")
+        self.date_var.set(date.today().isoformat())
+        self.notes_var.set("")
+        self._render_value_fields()
+        self.status_var.set("Enter the new calibration.")
+
+    def _save(self):
+        values = {k: v.get() for k, v in self.value_vars.items()}
+        try:
+            cal_id = save_calibration(
+                self.kind_var.get(),
+                self.equipment_var.get(),
+                self.date_var.get(),
+                values,
+                self.notes_var.get().strip() or None,
+            )
+        except ValueError as exc:
+            messagebox.showerror("Calibration Not Saved", str(exc), parent=self)
+            return
+        counts = recompute_calibrated_runs(cal_id)
+        if counts["grain_size"] or counts["worksheets"]:
+            # The change feed skips this workstation's own writes.
+            WORKING_SET.reload("sample_tests")
+        self.refresh()
+        self.status_var.set(
+            f"Saved calibration {cal_id}; recomputed {counts['grain_size']} grain-size "
+            f"and {counts['worksheets']} worksheet run(s)."
+        )
@@ -0,0 +1,163 @@
+import tkinter as tk
+
+from app.services.compaction_chart import CompactionChart
+
+# Typing bursts are drawn once, after this long without a change.
+REDRAW_DELAY_MS = 120
+
+
+def _zav_color(index):
+    blue = 0.7 - index * 0.1 if index < 3 else 0.4
+    return f"#{int(0.2 * 255):02x}{int(0.45 * 255):02x}{int(blue * 255):02x}"
+
+
+class CompactionCanvas(tk.Canvas):
+    """
+    Live compaction curve for the D1557 editor: test points, the fitted
+    curve, the peak and zero-air-voids lines, laid out by CompactionChart.
+    Redraws are debounced; canvas items are created once and only those
+    whose coordinates or text changed are updated. Axes are redrawn only
+    when the canvas size or axis ranges change.
+    """
+
+    LEFT, RIGHT, TOP, BOTTOM = 56, 18, 14, 40
+
+    def __init__(self, parent, height=280):
+        super().__init__(parent, bg="#f7fbff", highlightthickness=0, height=height)
+        self._state = None
+        self._job = None
+        self._layout = None
+        self._placed = {}
+        self._texts = {}
+        self._points = []
+        self._zav = []
+        self._fit_line = self._hidden(self.create_line(0, 0, 0, 0, fill="#0d5999", width=2, smooth=True))
+        self._peak_lines = [
+            self._hidden(self.create_line(0, 0, 0, 0, fill="#c0392b", dash=(3, 3))) for _ in range(2)
+        ]
+        self._peak_dot = self._hidden(self.create_oval(0, 0, 0, 0, fill="#c0392b", outline=""))
+        self.bind("<Configure>", lambda _e: self._schedule())
+
+    def show(self, points, fit, g_values, peak=None):
+        """
+        points: (moisture, dry density) or None per test column; fit: the
+        quadratic (a, b, c) or None; peak: (opt moisture, max dry density).
+        """
+        self._state = (list(points), fit, tuple(g_values), peak)
+        self._schedule()
+
+    def _schedule(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+        self._job = self.after(REDRAW_DELAY_MS, self._redraw)
+
+    def _hidden(self, item):
+        self.itemconfigure(item, state=tk.HIDDEN)
+        self._placed[item] = ()
+        return item
+
+    def _place(self, item, coords):
+        # Moves or hides one item, skipping it when nothing changed.
+        coords = tuple(round(v, 1) for v in coords)
+        last = self._placed.get(item)
+        if coords == last:
+            return
+        if coords:
+            self.coords(item, *coords)
+            if not last:
+                self.itemconfigure(item, state=tk.NORMAL)
+        elif last:
+            self.itemconfigure(item, state=tk.HIDDEN)
+        self._placed[item] = coords
+
+    def _set_text(self, item, text):
+        if self._texts.get(item) != text:
+            self.itemconfigure(item, text=text)
+            self._texts[item] = text
+
+    def _redraw(self):
+        self._job = None
+        if self._state is None:
+            return
+        points, fit, g_values, peak = self._state
+        chart = CompactionChart([p for p in points if p is not None], g_values, fit)
+        w, h = max(240, self.winfo_width()), max(160, self.winfo_height())
+        gx, gy = self.LEFT, self.TOP
+        gw, gh = w - self.LEFT - self.RIGHT, h - self.TOP - self.BOTTOM
+        if (w, h, chart.ranges) != self._layout:
+            self._layout = (w, h, chart.ranges)
+            self._draw_axes(chart, gx, gy, gw, gh)
+
+        def px(u, v):
+            return gx + u * gw, gy + (1.0 - v) * gh
+
+        def flat(curve):
+            return [c for u, v in curve for c in px(u, v)] if len(curve) > 1 else []
+
+        while len(self._zav) < len(chart.zav):
+            color = _zav_color(len(self._zav))
+            line = self._hidden(self.create_line(0, 0, 0, 0, fill=color, dash=(2, 2)))
+            label = self._hidden(self.create_text(0, 0, fill=color, anchor=tk.E, font=("Segoe UI", 8)))
+            self._zav.append((line, label))
+        for i, (line, label) in enumerate(self._zav):
+            curve = chart.zav[i][1] if i < len(chart.zav) else ()
+            self._place(line, flat(curve))
+            if len(curve) > 1:
+                lx, ly = px(*curve[-1])
+                self._place(label, (lx - 4, ly - 8))
+                self._set_text(label, f"G={chart.zav[i][0]:g}")
+            else:
+                self._place(label, ())
+
+        while len(self._points) < len(points):
+            self._points.append(self._hidden(self.create_oval(0, 0, 0, 0, fill="#003366", outline="#003366")))
+        for item, point in zip(self._points, points + [None] * (len(self._points) - len(points))):
+            if point is None:
+                self._place(item, ())
+                continue
+            x, y = px(*chart.unit(*point))
+            self._place(item, (x - 3, y - 3, x + 3, y + 3))
+
+        self._place(self._fit_line, flat(chart.fit))
+
+        minx, maxx, miny, maxy = chart.ranges
+        if peak and None not in peak and minx <= peak[0] <= maxx and miny <= peak[1] <= maxy:
+            x, y = px(*chart.unit(*peak))
+            self._place(self._peak_lines[0], (x, y, x, gy + gh))
+            self._place(self._peak_lines[1], (gx, y, x, y))
+            self._place(self._peak_dot, (x - 4, y - 4, x + 4, y + 4))
+        else:
+            for item in self._peak_lines + [self._peak_dot]:
+                self._place(item, ())
+
+    def _draw_axes(self, chart, gx, gy, gw, gh):
+        self.delete("axes")
+        self.create_rectangle(gx, gy, gx + gw, gy + gh, outline="#6b8aa8", tags="axes")
+        for value, u in chart.x_ticks:
+            x = gx + u * gw
+            self.create_line(x, gy, x, gy + gh, fill="#d4e1ee", tags="axes")
+            self.create_text(x, gy + gh + 10, text=f"{value:g}", fill="#23496f", font=("Segoe UI", 8), tags="axes")
+        for value, v in chart.y_ticks:
+            y = gy + (1.0 - v) * gh
+            self.create_line(gx, y, gx + gw, y, fill="#d4e1ee", tags="axes")
+            self.create_text(
+                gx - 6, y, text=f"{value:g}", anchor=tk.E, fill="#23496f", font=("Segoe UI", 8), tags="axes"
+            )
+        self.create_text(
+            gx + gw / 2,
+            gy + gh + 28,
+            text="Moisture Content (%)",
+            fill="#8a1f1f",
+            font=("Segoe UI", 9, "bold"),
+            tags="axes",
+        )
+        self.create_text(
+            16,
+            gy + gh / 2,
+            text="Dry Density (pcf)",
+            angle=90,
+            fill="#8a1f1f",
+            font=("Segoe UI", 9, "bold"),
+            tags="axes",
+        )
+        self.tag_lower("axes")
@@ -0,0 +1,281 @@
+import math
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+from app.services.gradation import project_curves
+
+# Pointer motion is handled at most once per display frame.
+GRAPH_FRAME_MS = 16
+GRAPH_HOVER_PX = 14
+# Point markers and thick lines are only drawn for this many curves or fewer.
+DETAIL_CURVES = 20
+# Pixel polylines kept for recently used canvas sizes and zooms.
+POLYLINE_CACHE_SIZE = 8
+MIN_LOG_SPAN = 0.3
+COLORS = ("#0f4f8a", "#b54a4a", "#1a7f55", "#c47f12", "#6a3d9a", "#2b8cbe", "#8c564b", "#d6458f", "#4d6b2f", "#5a5a5a")
+TICK_SIZES = (100, 50, 25, 10, 4.75, 2.0, 0.85, 0.425, 0.25, 0.15, 0.075, 0.02, 0.005, 0.002)
+
+
+class GradationOverlay(tk.Toplevel):
+    """
+    All of a project's grain-size curves on one log-scale chart, filtered by
+    boring or depth. Curves are kept in log space once; pixel polylines are
+    cached per plot size and zoom and applied to existing canvas items, so
+    resizing, zooming and filtering do not recreate them.
+    """
+
+    LEFT, RIGHT, TOP, BOTTOM = 78, 24, 26, 54
+
+    def __init__(self, parent, project_id, title="Project Gradation Curves"):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("1000x640")
+        self.records = project_curves(project_id)
+        lows = [c["curve"].log_sizes[0] for c in self.records]
+        highs = [c["curve"].log_sizes[-1] for c in self.records]
+        self.full_range = (min(lows, default=-3.0), max(highs, default=2.0))
+        if self.full_range[1] - self.full_range[0] < 1.0:
+            self.full_range = (self.full_range[0] - 0.5, self.full_range[1] + 0.5)
+        self.view_range = self.full_range
+        self._polylines = OrderedDict()
+        self._items = []
+        self._visible = list(range(len(self.records)))
+        self._highlight = None
+        self._plot = None
+        self._hover_xy = None
+        self._hover_job = None
+        self._build_ui()
+
+    def _build_ui(self):
+        bar = ttk.Frame(self)
+        bar.pack(fill=tk.X, padx=10, pady=(8, 2))
+        borings = sorted({r["sample_name"] for r in self.records})
+        self.boring_var = tk.StringVar(value="All")
+        self.depth_from_var = tk.StringVar()
+        self.depth_to_var = tk.StringVar()
+        ttk.Label(bar, text="Boring").pack(side=tk.LEFT)
+        boring = ttk.Combobox(bar, textvariable=self.boring_var, values=["All"] + borings, state="readonly", width=10)
+        boring.pack(side=tk.LEFT, padx=(4, 12))
+        boring.bind("<<ComboboxSelected>>", lambda _e: self._apply_filter())
+        ttk.Label(bar, text="Depth from").pack(side=tk.LEFT)
+        ttk.Entry(bar, textvariable=self.depth_from_var, width=7).pack(side=tk.LEFT, padx=4)
+        ttk.Label(bar, text="to").pack(side=tk.LEFT)
+        ttk.Entry(bar, textvariable=self.depth_to_var, width=7).pack(side=tk.LEFT, padx=4)
+        ttk.Button(bar, text="Apply", command=self._apply_filter).pack(side=tk.LEFT, padx=(4, 12))
+        ttk.Button(bar, text="Reset Zoom", command=self._reset_zoom).pack(side=tk.RIGHT)
+
+        self.info_var = tk.StringVar(value="Hover a curve to identify it; scroll to zoom the size axis.")
+        ttk.Label(self, textvariable=self.info_var).pack(fill=tk.X, padx=10, pady=(2, 2))
+        self.canvas = tk.Canvas(self, bg="#f7fbff", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=(2, 10))
+        self.canvas.bind("<Configure>", lambda _e: self._redraw())
+        self.canvas.bind("<Motion>", self._on_motion)
+        self.canvas.bind("<Leave>", self._on_leave)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self._zoom_at(e.x, 0.8))
+        self.canvas.bind("<Button-5>", lambda e: self._zoom_at(e.x, 1.25))
+
+    def destroy(self):
+        if self._hover_job is not None:
+            self.after_cancel(self._hover_job)
+            self._hover_job = None
+        super().destroy()
+
+    # Drawing
+
+    def _redraw(self):
+        c = self.canvas
+        w, h = max(300, c.winfo_width()), max(220, c.winfo_height())
+        gw = max(100, w - self.LEFT - self.RIGHT)
+        gh = max(100, h - self.TOP - self.BOTTOM)
+        self._plot = (self.LEFT, self.TOP, gw, gh)
+        self._draw_axes()
+        if not self.records:
+            c.create_text(20, 20, anchor=tk.NW, text="No grain-size curves saved for this project.", tags="axes")
+            return
+        detail = len(self._visible) <= DETAIL_CURVES
+        if not self._items:
+            for i, record in enumerate(self.records):
+                color = COLORS[i % len(COLORS)]
+                line = c.create_line(0, 0, 0, 0, fill=color, width=1, tags="curve")
+                self._items.append((line, color))
+        # Restores the base colour; the loop below resets widths and visibility.
+        self._set_highlight(None)
+        polylines = self._pixel_polylines(gw, gh)
+        visible = set(self._visible)
+        c.delete("marker")
+        for i, (line, _color) in enumerate(self._items):
+            if i not in visible or len(polylines[i]) < 4:
+                c.itemconfigure(line, state=tk.HIDDEN)
+                continue
+            c.coords(line, *polylines[i])
+            c.itemconfigure(line, state=tk.NORMAL, width=2 if detail else 1)
+            if detail:
+                self._draw_markers(polylines[i], self._items[i][1])
+        c.tag_raise("curve")
+        c.tag_raise("marker")
+        self.info_var.set(f"{len(self._visible)} of {len(self.records)} curve(s). Hover a curve to identify it.")
+
+    def _draw_axes(self):
+        c = self.canvas
+        c.delete("axes")
+        gx, gy, gw, gh = self._plot
+        lo, hi = self.view_range
+        c.create_rectangle(gx, gy, gx + gw, gy + gh, outline="#6b8aa8", tags="axes")
+        for yp in range(0, 101, 10):
+            py = gy + gh - (yp / 100.0) * gh
+            c.create_line(gx, py, gx + gw, py, fill="#d4e1ee", tags="axes")
+            c.create_text(gx - 8, py, text=f"{yp}", anchor=tk.E, fill="#23496f", font=("Segoe UI", 8), tags="axes")
+        for size in TICK_SIZES:
+            lx = math.log10(size)
+            if lo <= lx <= hi:
+                px = gx + (hi - lx) / (hi - lo) * gw
+                c.create_line(px, gy, px, gy + gh, fill="#d4e1ee", tags="axes")
+                c.create_text(
+                    px, gy + gh + 12, text=f"{size:g}", anchor=tk.N, fill="#23496f", font=("Segoe UI", 8), tags="axes"
+                )
+        c.create_text(
+            gx + gw / 2,
+            gy + gh + 30,
+            text="Particle Size (mm, log scale)",
+            fill="#8a1f1f",
+            font=("Segoe UI", 9, "bold"),
+            tags="axes",
+        )
+        c.create_text(
+            24, gy + gh / 2, text="Percent Finer (%)", angle=90, fill="#8a1f1f", font=("Segoe UI", 9, "bold"), tags="axes"
+        )
+        c.tag_lower("axes")
+
+    def _draw_markers(self, coords, color):
+        for i in range(0, len(coords), 2):
+            x, y = coords[i], coords[i + 1]
+            self.canvas.create_oval(x - 2, y - 2, x + 2, y + 2, fill=color, outline="", tags="marker")
+
+    def _pixel_polylines(self, gw, gh):
+        # Projection is linear in log size, so one pass per size/zoom; points
+        # less than a pixel apart are dropped.
+        gx, gy = self.LEFT, self.TOP
+        lo, hi = self.view_range
+        key = (gw, gh, lo, hi)
+        cached = self._polylines.get(key)
+        if cached is not None:
+            self._polylines.move_to_end(key)
+            return cached
+        x_scale = gw / (hi - lo)
+        y_scale = gh / 100.0
+        polylines = []
+        for record in self.records:
+            curve = record["curve"]
+            coords = []
+            last_x = last_y = None
+            for lx, pct in zip(curve.log_sizes, curve.percents):
+                px = gx + (hi - lx) * x_scale
+                py = gy + gh - max(0.0, min(100.0, pct)) * y_scale
+                if last_x is not None and abs(px - last_x) < 1 and abs(py - last_y) < 1:
+                    continue
+                coords.extend((px, py))
+                last_x, last_y = px, py
+            polylines.append(coords)
+        self._polylines[key] = polylines
+        if len(self._polylines) > POLYLINE_CACHE_SIZE:
+            self._polylines.popitem(last=False)
+        return polylines
+
+    # Filtering and zoom
+
+    def _apply_filter(self):
+        boring = self.boring_var.get()
+        try:
+            depth_from = float(self.depth_from_var.get()) if self.depth_from_var.get().strip() else None
+            depth_to = float(self.depth_to_var.get()) if self.depth_to_var.get().strip() else None
+        except ValueError:
+            self.info_var.set("Depths must be numbers.")
+            return
+        visible = []
+        for i, r in enumerate(self.records):
+            if boring != "All" and r["sample_name"] != boring:
+                continue
+            top = r["depth_from"]
+            bottom = r["depth_to"] if r["depth_to"] is not None else top
+            if depth_from is not None and (bottom is None or bottom < depth_from):
+                continue
+            if depth_to is not None and (top is None or top > depth_to):
+                continue
+            visible.append(i)
+        self._visible = visible
+        self._redraw()
+
+    def _on_wheel(self, event):
+        self._zoom_at(event.x, 0.8 if event.delta > 0 else 1.25)
+
+    def _zoom_at(self, x, factor):
+        if not self._plot:
+            return
+        gx, _gy, gw, _gh = self._plot
+        lo, hi = self.view_range
+        anchor = hi - (min(max(x, gx), gx + gw) - gx) / gw * (hi - lo)
+        span = max(MIN_LOG_SPAN, (hi - lo) * factor)
+        span = min(span, self.full_range[1] - self.full_range[0])
+        new_hi = anchor + (hi - anchor) * span / (hi - lo)
+        new_hi = min(self.full_range[1], max(self.full_range[0] + span, new_hi))
+        self.view_range = (new_hi - span, new_hi)
+        self._redraw()
+
+    def _reset_zoom(self):
+        self.view_range = self.full_range
+        self._redraw()
+
+    # Hover
+
+    def _on_motion(self, event):
+        self._hover_xy = (event.x, event.y)
+        if self._hover_job is None:
+            self._hover_job = self.after(GRAPH_FRAME_MS, self._hover_frame)
+
+    def _hover_frame(self):
+        self._hover_job = None
+        if not self._plot or self._hover_xy is None:
+            return
+        gx, gy, gw, gh = self._plot
+        x, y = self._hover_xy
+        if not (gx <= x <= gx + gw and gy <= y <= gy + gh):
+            self._set_highlight(None)
+            return
+        lo, hi = self.view_range
+        log_size = hi - (x - gx) / gw * (hi - lo)
+        best, best_dist, best_pct = None, GRAPH_HOVER_PX + 1, None
+        for i in self._visible:
+            curve = self.records[i]["curve"]
+            if not curve.log_sizes[0] <= log_size <= curve.log_sizes[-1]:
+                continue
+            pct = curve.percent_at_log(log_size)
+            dist = abs(y - (gy + gh - max(0.0, min(100.0, pct)) / 100.0 * gh))
+            if dist < best_dist:
+                best, best_dist, best_pct = i, dist, pct
+        self._set_highlight(best)
+        if best is not None:
+            label = self.records[best]["curve"].label
+            self.info_var.set(f"{label}   |   Particle Size: {10 ** log_size:.4g} mm   |   Percent Finer: {best_pct:.2f}%")
+
+    def _set_highlight(self, index):
+        # Only the previously and newly highlighted lines are touched.
+        if index == self._highlight:
+            return
+        detail = len(self._visible) <= DETAIL_CURVES
+        if self._highlight is not None:
+            line, color = self._items[self._highlight]
+            self.canvas.itemconfigure(line, fill=color, width=2 if detail else 1)
+        if index is not None:
+            line, _color = self._items[index]
+            self.canvas.itemconfigure(line, fill="#e8590c", width=3)
+            self.canvas.tag_raise(line)
+        self._highlight = index
+
+    def _on_leave(self, _event):
+        if self._hover_job is not None:
+            self.after_cancel(self._hover_job)
+            self._hover_job = None
+        self._hover_xy = None
+        self._set_highlight(None)
@@ -1,17 +1,26 @@
-import json
 import os
 import webbrowser
-from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from app.db import get_connection
+from app.services.map_export import export_map
+from app.services.nearby_results import nearby_result_stats
+from app.services.project_browser import count_projects, fetch_projects_page
+from app.services.spatial import (
+    DEFAULT_NEAREST,
+    DEFAULT_RADIUS_MILES,
+    nearest_projects,
+    projects_within,
+    resolve_center,
+)
 
 
 class MapTab(ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
-        self.points = []
+        self._page_cursor = None
+        self._has_more = False
+        self._loading_page = False
         self._build_ui()
         self.refresh()
 
@@ -28,30 +37,81 @@ class MapTab(ttk.Frame):
         ttk.Button(header, text="Refresh", command=self.refresh).pack(side=tk.RIGHT, padx=(8, 0))
         ttk.Button(header, text="Open Interactive Map", command=self.open_interactive_map).pack(side=tk.RIGHT)
 
-        self.listbox = tk.Listbox(wrapper, height=28)
+        nearby = ttk.LabelFrame(wrapper, text="Nearby Jobs")
+        nearby.pack(fill=tk.X, pady=(0, 8))
+        self.center_var = tk.StringVar()
+        self.radius_var = tk.StringVar(value=f"{DEFAULT_RADIUS_MILES:g}")
+        self.nearest_var = tk.StringVar(value=str(DEFAULT_NEAREST))
+        ttk.Label(nearby, text="Center (file # or lat, lon)").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        center_entry = ttk.Entry(nearby, textvariable=self.center_var, width=24)
+        center_entry.grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+        center_entry.bind("<Return>", lambda _e: self._find_within())
+        ttk.Label(nearby, text="Radius (mi)").grid(row=0, column=2, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(nearby, textvariable=self.radius_var, width=8).grid(row=0, column=3, sticky=tk.W, padx=5, pady=5)
+        ttk.Button(nearby, text="Within Radius", command=self._find_within).grid(row=0, column=4, padx=5, pady=5)
+        ttk.Label(nearby, text="Count").grid(row=0, column=5, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(nearby, textvariable=self.nearest_var, width=6).grid(row=0, column=6, sticky=tk.W, padx=5, pady=5)
+        ttk.Button(nearby, text="Nearest", command=self._find_nearest).grid(row=0, column=7, padx=5, pady=5)
+        ttk.Button(nearby, text="Lab Data...", command=self._show_lab_data).grid(row=0, column=8, padx=5, pady=5)
+
+        self.nearby_tree = ttk.Treeview(
+            nearby,
+            columns=("miles", "file", "job", "client", "location"),
+            show="headings",
+            height=6,
+        )
+        for col, text, width in [
+            ("miles", "Miles", 70),
+            ("file", "File #", 90),
+            ("job", "Job Name", 260),
+            ("client", "Client", 90),
+            ("location", "Location", 280),
+        ]:
+            self.nearby_tree.heading(col, text=text)
+            self.nearby_tree.column(col, width=width, anchor=tk.W)
+        self.nearby_tree.grid(row=1, column=0, columnspan=10, sticky=tk.EW, padx=5, pady=(0, 5))
+        nearby.columnconfigure(9, weight=1)
+        self.nearby_var = tk.StringVar(value="")
+        ttk.Label(nearby, textvariable=self.nearby_var).grid(row=2, column=0, columnspan=10, sticky=tk.W, padx=5, pady=(0, 5))
+
+        self.count_var = tk.StringVar(value="")
+        ttk.Label(wrapper, textvariable=self.count_var).pack(side=tk.BOTTOM, anchor=tk.W, pady=(6, 0))
+
+        list_wrap = ttk.Frame(wrapper)
+        list_wrap.pack(fill=tk.BOTH, expand=True)
+        self.listbox = tk.Listbox(list_wrap, height=28, yscrollcommand=self._on_list_yview)
+        self.list_scroll = ttk.Scrollbar(list_wrap, orient=tk.VERTICAL, command=self.listbox.yview)
+        self.list_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.listbox.pack(fill=tk.BOTH, expand=True)
 
     def refresh(self):
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT file_number, job_name, client_type, location_text, latitude, longitude
-            FROM projects
-            ORDER BY created_at DESC
-            """
-        ).fetchall()
-        conn.close()
-
-        self.points = [dict(r) for r in rows]
-        self._fill_list(self.points)
+        self.listbox.delete(0, tk.END)
+        self._page_cursor = None
+        self._has_more = True
+        self._load_next_page()
+        total, mapped = count_projects()
+        self.count_var.set(f"Mapped points: {mapped} / {total}")
+
+    def _load_next_page(self):
+        if self._loading_page or not self._has_more:
+            return
+        self._loading_page = True
+        try:
+            rows, cursor = fetch_projects_page(after=self._page_cursor)
+        finally:
+            self._loading_page = False
+        self._page_cursor = cursor
+        self._has_more = cursor is not None
+        self._fill_list(rows)
+
+    def _on_list_yview(self, first, last):
+        self.list_scroll.set(first, last)
+        if self._has_more and float(last) >= 0.95:
+            self.after_idle(self._load_next_page)
 
     def _fill_list(self, points):
-        self.listbox.delete(0, tk.END)
-        mapped = 0
         for p in points:
             has_coords = p["latitude"] is not None and p["longitude"] is not None
-            if has_coords:
-                mapped += 1
             location = p["location_text"] or "No location text"
             coord_text = (
                 f"({p['latitude']:.5f}, {p['longitude']:.5f})"
@@ -60,104 +120,122 @@ class MapTab(ttk.Frame):
             )
             self.listbox.insert(
                 tk.END,
-                f"{p['file_number']} | {p['job_name']} | {p.get('client_type') or 'Custom'} | {location} {coord_text}",
+                f"{p['file_number']} | {p['job_name']} | {p['client_type'] or 'Custom'} | {location} {coord_text}",
+            )
+
+    def _find_within(self):
+        center = self._nearby_center()
+        if center is None:
+            return
+        try:
+            radius = float(self.radius_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Invalid", "Radius must be a number of miles.")
+            return
+        lat, lon, project_id = center
+        rows = projects_within(lat, lon, radius, exclude_id=project_id)
+        self._show_nearby(rows, f"{len(rows)} job(s) within {radius:g} mi of {lat:.5f}, {lon:.5f}")
+
+    def _find_nearest(self):
+        center = self._nearby_center()
+        if center is None:
+            return
+        try:
+            count = int(self.nearest_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Invalid", "Count must be a whole number.")
+            return
+        lat, lon, project_id = center
+        rows = nearest_projects(lat, lon, count, exclude_id=project_id)
+        self._show_nearby(rows, f"{len(rows)} nearest job(s) to {lat:.5f}, {lon:.5f}")
+
+    def _show_lab_data(self):
+        center = self._nearby_center()
+        if center is None:
+            return
+        try:
+            radius = float(self.radius_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Invalid", "Radius must be a number of miles.")
+            return
+        lat, lon, project_id = center
+        stats = nearby_result_stats(lat, lon, radius, exclude_project_id=project_id)
+
+        win = tk.Toplevel(self)
+        win.title("Nearby Lab Data")
+        win.transient(self.winfo_toplevel())
+        ttk.Label(
+            win, text=f"Results from jobs within {radius:g} mi of {lat:.5f}, {lon:.5f}"
+        ).pack(anchor=tk.W, padx=10, pady=(10, 4))
+        tree = ttk.Treeview(
+            win,
+            columns=("metric", "count", "jobs", "mean", "min", "p10", "median", "p90", "max"),
+            show="headings",
+            height=max(3, len(stats)),
+        )
+        for col, text, width in [
+            ("metric", "Metric", 200),
+            ("count", "Results", 70),
+            ("jobs", "Jobs", 60),
+            ("mean", "Mean", 80),
+            ("min", "Min", 80),
+            ("p10", "P10", 80),
+            ("median", "Median", 80),
+            ("p90", "P90", 80),
+            ("max", "Max", 80),
+        ]:
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor=tk.W)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=4)
+        for st in stats:
+            label = f"{st['metric']} ({st['unit']})" if st["unit"] else st["metric"]
+            tree.insert(
+                "",
+                tk.END,
+                values=(label, st["count"], st["projects"])
+                + tuple(f"{st[k]:.1f}" for k in ("mean", "min", "p10", "median", "p90", "max")),
+            )
+        if not stats:
+            ttk.Label(win, text="No results recorded for jobs in this radius.").pack(anchor=tk.W, padx=10)
+        ttk.Button(win, text="Close", command=win.destroy).pack(anchor=tk.E, padx=10, pady=(4, 10))
+
+    def _nearby_center(self):
+        try:
+            return resolve_center(self.center_var.get())
+        except ValueError as exc:
+            messagebox.showerror("Nearby Jobs", str(exc))
+            return None
+
+    def _show_nearby(self, rows, summary):
+        for item in self.nearby_tree.get_children():
+            self.nearby_tree.delete(item)
+        for r in rows:
+            self.nearby_tree.insert(
+                "",
+                tk.END,
+                iid=r["id"],
+                values=(
+                    f"{r['distance_miles']:.2f}",
+                    r["file_number"],
+                    r["job_name"],
+                    r["client_type"] or "Custom",
+                    r["location_text"] or "",
+                ),
             )
-        self.listbox.insert(tk.END, "")
-        self.listbox.insert(tk.END, f"Mapped points: {mapped} / {len(points)}")
+        self.nearby_var.set(summary)
 
     def open_interactive_map(self):
-        points_with_coords = [
-            p for p in self.points if p["latitude"] is not None and p["longitude"] is not None
-        ]
-        if not points_with_coords:
+        try:
+            result = export_map()
+        except OSError as exc:
+            messagebox.showerror("Map Export Failed", f"Could not write the map:\n{exc}")
+            return
+        if not result["points"]:
             messagebox.showerror("No Coordinates", "No projects have latitude/longitude yet.")
             return
 
-        html = self._build_leaflet_html(points_with_coords)
-        out_path = Path(__file__).resolve().parent.parent.parent / "data" / "project_map.html"
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        out_path.write_text(html, encoding="utf-8")
-
+        out_path = result["path"]
         try:
             os.startfile(str(out_path))  # type: ignore[attr-defined]
         except Exception:
             webbrowser.open(out_path.as_uri())
-
-    def _build_leaflet_html(self, points):
-        marker_data = [
-            {
-                "file_number": p["file_number"],
-                "job_name": p["job_name"],
-                "client_type": p.get("client_type") or "Custom",
-                "location_text": p["location_text"] or "",
-                "lat": float(p["latitude"]),
-                "lon": float(p["longitude"]),
-            }
-            for p in points
-        ]
-        json_data = json.dumps(marker_data)
-
-        return f"""<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8"/>
-  <title>GeoLab Project Map</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
-  <style>
-    html, body, #map {{ height: 100%; margin: 0; padding: 0; }}
-    .legend {{
-      position: absolute; z-index: 9999; right: 10px; top: 10px;
-      background: rgba(255,255,255,0.95); padding: 10px 12px;
-      border: 1px solid #ccc; border-radius: 8px; font-family: Segoe UI, sans-serif; font-size: 13px;
-    }}
-  </style>
-</head>
-<body>
-  <div id="map"></div>
-  <div class="legend">
-    <div><strong>GeoLab Jobs</strong></div>
-    <div>Default extent: California + Arizona</div>
-    <div style="margin-top:6px;"><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#3d82f6;margin-right:6px;"></span>TCI</div>
-    <div><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#23a26d;margin-right:6px;"></span>GCI</div>
-    <div><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#f0a42c;margin-right:6px;"></span>SBCI</div>
-    <div><span style="display:inline-block;width:10px;height:10px;border-radius:50%;background:#8b96a8;margin-right:6px;"></span>Custom/Other</div>
-  </div>
-  <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-  <script>
-    const points = {json_data};
-    const map = L.map('map').setView([34.2, -115.5], 6);
-    const clientColors = {{
-      TCI: {{ stroke: '#2c63bf', fill: '#3d82f6' }},
-      GCI: {{ stroke: '#1a7f55', fill: '#23a26d' }},
-      SBCI: {{ stroke: '#c47f12', fill: '#f0a42c' }},
-      CUSTOM: {{ stroke: '#6f7888', fill: '#8b96a8' }}
-    }};
-
-    L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
-      maxZoom: 19,
-      attribution: '&copy; OpenStreetMap contributors'
-    }}).addTo(map);
-
-    const bounds = [];
-    for (const p of points) {{
-      const key = (p.client_type || 'Custom').toUpperCase();
-      const clr = clientColors[key] || clientColors.CUSTOM;
-      const marker = L.circleMarker([p.lat, p.lon], {{
-        radius: 6,
-        color: clr.stroke,
-        fillColor: clr.fill,
-        fillOpacity: 0.85
-      }}).addTo(map);
-      marker.bindPopup(
-        `<strong>${{p.file_number}}</strong><br/>${{p.job_name}}<br/>Client: ${{p.client_type || 'Custom'}}<br/>${{p.location_text || 'No location text'}}<br/>${{p.lat.toFixed(5)}}, ${{p.lon.toFixed(5)}}`
-      );
-      bounds.push([p.lat, p.lon]);
-    }}
-    if (bounds.length > 0) {{
-      map.fitBounds(bounds, {{ padding: [40, 40], maxZoom: 12 }});
-    }}
-  </script>
-</body>
-</html>
-"""
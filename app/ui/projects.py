@@ -1,7 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from app.db import get_connection, now_iso
+from app.services.nearby_results import invalidate_nearby_results
+from app.services.project_browser import fetch_projects_by_id, fetch_projects_page
+from app.services.repository import ProjectRepository, RateRepository
 from app.services.validators import is_valid_file_number
 
 
@@ -9,6 +11,13 @@ class ProjectsTab(ttk.Frame):
     def __init__(self, parent, on_project_selected):
         super().__init__(parent)
         self.on_project_selected = on_project_selected
+        self.projects = ProjectRepository()
+        self.sort_key = "created"
+        self.sort_desc = True
+        self._page_cursor = None
+        self._has_more = False
+        self._loading_page = False
+        self._order_keys = {}
         self._build_ui()
         self.refresh()
 
@@ -21,6 +30,7 @@ class ProjectsTab(ttk.Frame):
             columns=("file", "job", "client", "rate", "location", "status", "remaining"),
             show="headings",
         )
+        self.heading_text = {}
         for col, text, width in [
             ("file", "File #", 100),
             ("job", "Job Name", 260),
@@ -30,9 +40,13 @@ class ProjectsTab(ttk.Frame):
             ("status", "Status", 140),
             ("remaining", "Tests Remaining", 140),
         ]:
-            self.tree.heading(col, text=text)
+            self.heading_text[col] = text
+            self.tree.heading(col, text=text, command=lambda c=col: self._sort_by(c))
             self.tree.column(col, width=width, anchor=tk.W)
 
+        self.tree_scroll = ttk.Scrollbar(top, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.configure(yscrollcommand=self._on_tree_yview)
         self.tree.bind("<<TreeviewSelect>>", self._on_select)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
@@ -105,42 +119,105 @@ class ProjectsTab(ttk.Frame):
     def refresh(self):
         for item in self.tree.get_children():
             self.tree.delete(item)
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT p.id, p.file_number, p.job_name, p.client_type, p.billing_rate_id, p.location_text, p.status,
-                   SUM(CASE WHEN st.status IS NULL OR st.status != 'completed' THEN 1 ELSE 0 END) AS remaining
-            FROM projects p
-            LEFT JOIN samples s ON s.project_id = p.id
-            LEFT JOIN sample_tests st ON st.sample_id = s.id
-            GROUP BY p.id
-            ORDER BY p.created_at DESC
-            """
-        ).fetchall()
-        conn.close()
-        for row in rows:
-            remaining = row["remaining"] if row["remaining"] is not None else 0
-            self.tree.insert(
-                "",
-                tk.END,
-                iid=row["id"],
-                values=(
-                    row["file_number"],
-                    row["job_name"],
-                    row["client_type"],
-                    row["billing_rate_id"],
-                    row["location_text"] or "",
-                    row["status"] or "Not Scheduled",
-                    remaining,
-                ),
-            )
+        self._order_keys = {}
+        self._page_cursor = None
+        self._has_more = True
+        self._update_headings()
+        self._load_next_page()
         self.refresh_rates()
 
+    def _load_next_page(self):
+        if self._loading_page or not self._has_more:
+            return
+        self._loading_page = True
+        try:
+            rows, cursor = fetch_projects_page(self.sort_key, self.sort_desc, after=self._page_cursor)
+        finally:
+            self._loading_page = False
+        self._page_cursor = cursor
+        self._has_more = cursor is not None
+        for row in rows:
+            self.tree.insert("", tk.END, iid=row["id"], values=self._row_values(row))
+            self._order_keys[str(row["id"])] = self._order_key(row)
+
+    def apply_changes(self, project_ids):
+        """
+        Brings the list up to date after another workstation changed projects:
+        listed rows are updated or removed, and new ones are inserted in sort
+        order when they fall within the pages already loaded.
+        """
+        if not project_ids:
+            return
+        rows = fetch_projects_by_id(project_ids, self.sort_key)
+        for pid in project_ids:
+            iid = str(pid)
+            row = rows.get(pid)
+            if self.tree.exists(iid):
+                if row is None:
+                    self.tree.delete(iid)
+                    self._order_keys.pop(iid, None)
+                else:
+                    self.tree.item(iid, values=self._row_values(row))
+                    self._order_keys[iid] = self._order_key(row)
+            elif row is not None:
+                self._insert_in_order(row)
+
+    def _order_key(self, row):
+        # Mirrors the SQL ORDER BY (value, id), with NULLs first.
+        value = row["sort_value"]
+        return (value is not None, value, row["id"])
+
+    def _insert_in_order(self, row):
+        key = self._order_key(row)
+        if self._page_cursor is not None:
+            cursor_key = (self._page_cursor[0] is not None, self._page_cursor[0], self._page_cursor[1])
+            # Rows past the last loaded page arrive with the next page.
+            if (key > cursor_key) != self.sort_desc:
+                return
+        index = 0
+        for iid in self.tree.get_children():
+            if (self._order_keys[iid] < key) != self.sort_desc:
+                index += 1
+            else:
+                break
+        self.tree.insert("", index, iid=row["id"], values=self._row_values(row))
+        self._order_keys[str(row["id"])] = key
+
+    def _row_values(self, row):
+        return (
+            row["file_number"],
+            row["job_name"],
+            row["client_type"],
+            row["billing_rate_id"],
+            row["location_text"] or "",
+            row["status"] or "Not Scheduled",
+            row["remaining"] if row["remaining"] is not None else 0,
+        )
+
+    def _on_tree_yview(self, first, last):
+        self.tree_scroll.set(first, last)
+        # Infinite scroll: fetch the next page once the view nears the end.
+        if self._has_more and float(last) >= 0.95:
+            self.after_idle(self._load_next_page)
+
+    def _sort_by(self, col):
+        # Clicking a header cycles ascending -> descending -> default (newest first).
+        if self.sort_key != col:
+            self.sort_key, self.sort_desc = col, False
+        elif not self.sort_desc:
+            self.sort_desc = True
+        else:
+            self.sort_key, self.sort_desc = "created", True
+        self.refresh()
+
+    def _update_headings(self):
+        for col, text in self.heading_text.items():
+            if col == self.sort_key:
+                text = f"{text} {'v' if self.sort_desc else '^'}"
+            self.tree.heading(col, text=text)
+
     def refresh_rates(self):
-        conn = get_connection()
-        rows = conn.execute("SELECT rate_id FROM billing_rates ORDER BY rate_id").fetchall()
-        conn.close()
-        self.rate_choices = [r["rate_id"] for r in rows]
+        self.rate_choices = [r["rate_id"] for r in RateRepository().list_rates()]
         self.billing_rate_combo["values"] = self.rate_choices
 
     def _on_select(self, _event):
@@ -152,57 +229,16 @@ class ProjectsTab(ttk.Frame):
         self.on_project_selected(project_id)
 
     def _save_project(self):
-        file_number = self.file_number.get().strip()
-        if not is_valid_file_number(file_number):
-            messagebox.showerror("Invalid", "File number must be NN-NNN (e.g., 26-112).")
-            return
-        job_name = self.job_name.get().strip()
-        client_type = self.client_type.get().strip() or "CUSTOM"
-        client_name = client_type
-        billing_rate_id = self.billing_rate.get().strip()
-        status = self.status_var.get().strip() or "Not Scheduled"
-        location_text = self.location_text.get().strip() or None
-        latitude = self._parse_optional_float(self.latitude.get().strip(), "Latitude")
-        if latitude == "error":
-            return
-        longitude = self._parse_optional_float(self.longitude.get().strip(), "Longitude")
-        if longitude == "error":
-            return
-
-        if not job_name or not billing_rate_id:
-            messagebox.showerror("Missing", "Job name and billing rate are required.")
+        values = self._form_values()
+        if values is None:
             return
-
-        conn = get_connection()
         try:
-            conn.execute(
-                """
-                INSERT INTO projects (
-                    file_number, job_name, client_type, client_name, billing_rate_id, billing_year, billing_kind,
-                    location_text, latitude, longitude, status, created_at
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    file_number,
-                    job_name,
-                    client_type,
-                    client_name,
-                    billing_rate_id,
-                    self.billing_year.get().strip() or None,
-                    self.billing_kind.get().strip() or None,
-                    location_text,
-                    latitude,
-                    longitude,
-                    status,
-                    now_iso(),
-                ),
-            )
-            conn.commit()
+            self.projects.insert(values)
         except Exception as exc:
             messagebox.showerror("Error", f"Failed to save project: {exc}")
-        finally:
-            conn.close()
+        if values["latitude"] is not None and values["longitude"] is not None:
+            # A new located project belongs in cached cells around it.
+            invalidate_nearby_results()
 
         self.refresh()
         self._clear_form()
@@ -222,27 +258,14 @@ class ProjectsTab(ttk.Frame):
         )
         if not messagebox.askyesno("Confirm Project Deletion", prompt):
             return
-        conn = get_connection()
-        try:
-            conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-            conn.commit()
-        finally:
-            conn.close()
+        self.projects.delete_many([project_id])
+        invalidate_nearby_results([project_id])
         self.refresh()
         self.on_project_selected(None)
         self._clear_form()
 
     def _load_project(self, project_id):
-        conn = get_connection()
-        row = conn.execute(
-            """
-            SELECT id, file_number, job_name, client_type, client_name, billing_rate_id, billing_year, billing_kind,
-                   location_text, latitude, longitude, status
-            FROM projects WHERE id = ?
-            """,
-            (project_id,),
-        ).fetchone()
-        conn.close()
+        row = self.projects.get(project_id)
         if not row:
             return
         self.editing_project_id = row["id"]
@@ -264,61 +287,51 @@ class ProjectsTab(ttk.Frame):
             messagebox.showerror("No Selection", "Select a project to update.")
             return
         project_id = int(sel[0])
+        values = self._form_values()
+        if values is None:
+            return
+        try:
+            self.projects.update(project_id, values)
+        except Exception as exc:
+            messagebox.showerror("Error", f"Failed to update project: {exc}")
+        # Moved coordinates change which cached cells the project belongs to.
+        invalidate_nearby_results()
 
+        self.refresh()
+        self._clear_form()
+
+    def _form_values(self):
+        """The form as PROJECT_COLUMNS values, or None after reporting invalid input."""
         file_number = self.file_number.get().strip()
         if not is_valid_file_number(file_number):
             messagebox.showerror("Invalid", "File number must be NN-NNN (e.g., 26-112).")
-            return
+            return None
         job_name = self.job_name.get().strip()
         client_type = self.client_type.get().strip() or "CUSTOM"
-        client_name = client_type
         billing_rate_id = self.billing_rate.get().strip()
-        status = self.status_var.get().strip() or "Not Scheduled"
-        location_text = self.location_text.get().strip() or None
         latitude = self._parse_optional_float(self.latitude.get().strip(), "Latitude")
         if latitude == "error":
-            return
+            return None
         longitude = self._parse_optional_float(self.longitude.get().strip(), "Longitude")
         if longitude == "error":
-            return
+            return None
 
         if not job_name or not billing_rate_id:
             messagebox.showerror("Missing", "Job name and billing rate are required.")
-            return
-
-        conn = get_connection()
-        try:
-            conn.execute(
-                """
-                UPDATE projects
-                SET file_number = ?, job_name = ?, client_type = ?, client_name = ?,
-                    billing_rate_id = ?, billing_year = ?, billing_kind = ?,
-                    location_text = ?, latitude = ?, longitude = ?, status = ?
-                WHERE id = ?
-                """,
-                (
-                    file_number,
-                    job_name,
-                    client_type,
-                    client_name,
-                    billing_rate_id,
-                    self.billing_year.get().strip() or None,
-                    self.billing_kind.get().strip() or None,
-                    location_text,
-                    latitude,
-                    longitude,
-                    status,
-                    project_id,
-                ),
-            )
-            conn.commit()
-        except Exception as exc:
-            messagebox.showerror("Error", f"Failed to update project: {exc}")
-        finally:
-            conn.close()
-
-        self.refresh()
-        self._clear_form()
+            return None
+        return {
+            "file_number": file_number,
+            "job_name": job_name,
+            "client_type": client_type,
+            "client_name": client_type,
+            "billing_rate_id": billing_rate_id,
+            "billing_year": self.billing_year.get().strip() or None,
+            "billing_kind": self.billing_kind.get().strip() or None,
+            "status": self.status_var.get().strip() or "Not Scheduled",
+            "location_text": self.location_text.get().strip() or None,
+            "latitude": latitude,
+            "longitude": longitude,
+        }
 
     def _clear_form(self):
         self.editing_project_id = None
@@ -1,13 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from app.db import get_connection
+from app.services.repository import RateRepository
 
 
 class RatesTab(ttk.Frame):
     def __init__(self, parent, on_rates_changed):
         super().__init__(parent)
         self.on_rates_changed = on_rates_changed
+        self.rates = RateRepository()
         self._build_ui()
         self.refresh()
 
@@ -100,12 +101,7 @@ class RatesTab(ttk.Frame):
     def _refresh_rates(self):
         for item in self.rate_tree.get_children():
             self.rate_tree.delete(item)
-        conn = get_connection()
-        rows = conn.execute(
-            "SELECT id, rate_id, client_type, year, kind FROM billing_rates ORDER BY rate_id"
-        ).fetchall()
-        conn.close()
-        for row in rows:
+        for row in self.rates.list_rates():
             self.rate_tree.insert(
                 "",
                 tk.END,
@@ -114,9 +110,7 @@ class RatesTab(ttk.Frame):
             )
 
     def _refresh_tests(self):
-        conn = get_connection()
-        tests = conn.execute("SELECT id, code, name FROM tests ORDER BY code").fetchall()
-        conn.close()
+        tests = self.rates.list_tests()
         self.test_map = {f"{t['code']} - {t['name']}": t["id"] for t in tests}
         self.test_combo["values"] = list(self.test_map.keys())
 
@@ -128,19 +122,7 @@ class RatesTab(ttk.Frame):
             self.selected_rate_var.set("Selected Rate: None")
             return
         self.selected_rate_var.set(f"Selected Rate: {rate_id}")
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT tr.id, t.code, t.name, tr.price
-            FROM test_rates tr
-            JOIN tests t ON t.id = tr.test_id
-            WHERE tr.rate_id = ?
-            ORDER BY t.code
-            """,
-            (rate_id,),
-        ).fetchall()
-        conn.close()
-        for row in rows:
+        for row in self.rates.prices(rate_id):
             self.price_tree.insert(
                 "",
                 tk.END,
@@ -168,17 +150,10 @@ class RatesTab(ttk.Frame):
         kind = self.rate_kind.get().strip() or None
         notes = self.rate_notes.get().strip() or None
 
-        conn = get_connection()
         try:
-            conn.execute(
-                "INSERT INTO billing_rates (rate_id, client_type, year, kind, notes) VALUES (?, ?, ?, ?, ?)",
-                (rate_id, client_type, year, kind, notes),
-            )
-            conn.commit()
+            self.rates.add_rate(rate_id, client_type, year, kind, notes)
         except Exception as exc:
             messagebox.showerror("Error", f"Failed to save rate: {exc}")
-        finally:
-            conn.close()
         self._refresh_rates()
         self.on_rates_changed()
 
@@ -188,10 +163,7 @@ class RatesTab(ttk.Frame):
             return
         if not messagebox.askyesno("Confirm", f"Delete rate {rate_id} and all its prices?"):
             return
-        conn = get_connection()
-        conn.execute("DELETE FROM billing_rates WHERE rate_id = ?", (rate_id,))
-        conn.commit()
-        conn.close()
+        self.rates.delete_rate(rate_id)
         self._refresh_rates()
         self._refresh_prices()
         self.on_rates_changed()
@@ -211,18 +183,7 @@ class RatesTab(ttk.Frame):
             messagebox.showerror("Invalid", "Price must be a number.")
             return
 
-        test_id = self.test_map[test_key]
-        conn = get_connection()
-        conn.execute(
-            """
-            INSERT INTO test_rates (rate_id, test_id, price)
-            VALUES (?, ?, ?)
-            ON CONFLICT(rate_id, test_id) DO UPDATE SET price = excluded.price
-            """,
-            (rate_id, test_id, price),
-        )
-        conn.commit()
-        conn.close()
+        self.rates.set_prices(rate_id, {self.test_map[test_key]: price})
         self._refresh_prices()
         self.on_rates_changed()
 
@@ -233,10 +194,7 @@ class RatesTab(ttk.Frame):
         price_id = int(sel[0])
         if not messagebox.askyesno("Confirm", "Delete this test price?"):
             return
-        conn = get_connection()
-        conn.execute("DELETE FROM test_rates WHERE id = ?", (price_id,))
-        conn.commit()
-        conn.close()
+        self.rates.delete_price(price_id)
         self._refresh_prices()
         self.on_rates_changed()
 
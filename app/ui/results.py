@@ -1,15 +1,30 @@
 import tkinter as tk
+from datetime import date
 from tkinter import ttk, messagebox, filedialog
 
-from app.db import get_connection
+from app.services.change_log import history, result_as_of
+from app.services.concurrency import ConflictError
+from app.services.nearby_results import invalidate_nearby_results
+from app.services.repository import ProjectRepository, SampleTestRepository
 from app.services.results_export import export_results_matrix_xlsx, export_results_matrix_pdf
+from app.services.working_set import WORKING_SET, changed_sample_tests
 
 
 class ResultsTab(ttk.Frame):
     def __init__(self, parent, get_project_id):
         super().__init__(parent)
         self.get_project_id = get_project_id
+        self.projects = ProjectRepository()
+        self.sample_tests = SampleTestRepository()
         self._build_ui()
+        WORKING_SET.subscribe(self._on_working_set_changed)
+
+    def _on_working_set_changed(self, changes):
+        sample_test_ids = changed_sample_tests(changes)
+        if sample_test_ids is not None:
+            self.apply_changes(sample_test_ids)
+        elif "samples" in changes or "sample_tests" in changes:
+            self.refresh()
         self._test_labels = {}
 
     def _build_ui(self):
@@ -150,8 +165,10 @@ class ResultsTab(ttk.Frame):
         self.chem_combo.bind("<<ComboboxSelected>>", self._on_chem_mode)
 
         ttk.Button(form, text="Save Result", command=self._save).grid(row=0, column=10, rowspan=3, padx=5, pady=5)
+        ttk.Button(form, text="History...", command=self._show_history).grid(row=0, column=11, rowspan=3, padx=5, pady=5)
 
         self.selected_id = None
+        self.selected_version = None
 
     def refresh(self):
         for item in self.tree.get_children():
@@ -161,75 +178,65 @@ class ResultsTab(ttk.Frame):
         if not project_id:
             return
 
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT st.id, s.sample_name, s.depth_raw, t.code, t.name, st.status,
-                   st.result_value, st.result_unit, st.result_value2, st.result_unit2,
-                   st.result_value3, st.result_unit3, st.result_value4, st.result_unit4
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            ORDER BY s.sample_name, t.code
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
-
-        for row in rows:
-            self.tree.insert(
-                "",
-                tk.END,
-                iid=row["id"],
-                values=(
-                    row["sample_name"],
-                    row["depth_raw"] or "",
-                    row["code"],
-                    row["name"],
-                    row["status"] or "",
-                    self._fmt1(row["result_value"]),
-                    row["result_unit"] or "",
-                    self._fmt1(row["result_value2"]),
-                    row["result_unit2"] or "",
-                    self._fmt1(row["result_value3"]),
-                    row["result_unit3"] or "",
-                    self._fmt1(row["result_value4"]),
-                    row["result_unit4"] or "",
-                ),
-            )
+        for record in WORKING_SET.sample_test_list():
+            self.tree.insert("", tk.END, iid=record.id, values=self._row_values(record))
+
+    def apply_changes(self, sample_test_ids):
+        """Redraws only the given assignments after another workstation changed them."""
+        project_id = self.get_project_id()
+        if not project_id or not sample_test_ids:
+            return
+        rows = WORKING_SET.sample_tests
+        added = False
+        for sid in sample_test_ids:
+            row = rows.get(sid)
+            if row is None:
+                if self.tree.exists(str(sid)):
+                    self.tree.delete(str(sid))
+            elif self.tree.exists(str(sid)):
+                self.tree.item(str(sid), values=self._row_values(row))
+            else:
+                added = True
+        if added:
+            self.refresh()
+
+    def _row_values(self, record):
+        return (
+            record.sample_name,
+            record.depth_raw or "",
+            record.code,
+            record.name,
+            record.status or "",
+            self._fmt1(record.result_value),
+            record.result_unit or "",
+            self._fmt1(record.result_value2),
+            record.result_unit2 or "",
+            self._fmt1(record.result_value3),
+            record.result_unit3 or "",
+            self._fmt1(record.result_value4),
+            record.result_unit4 or "",
+        )
 
     def _on_select(self, _event):
         sel = self.tree.selection()
         if not sel:
             return
         self.selected_id = int(sel[0])
-        conn = get_connection()
-        row = conn.execute(
-            """
-            SELECT st.result_value, st.result_unit, st.result_value2, st.result_unit2,
-                   st.result_value3, st.result_unit3, st.result_value4, st.result_unit4,
-                   st.result_notes, st.status, t.name
-            FROM sample_tests st
-            JOIN tests t ON t.id = st.test_id
-            WHERE st.id = ?
-            """,
-            (self.selected_id,),
-        ).fetchone()
-        conn.close()
+        row = WORKING_SET.sample_tests.get(self.selected_id)
         if not row:
             return
-        self.value_var.set(self._fmt1(row["result_value"]))
-        self.unit_var.set(row["result_unit"] or "")
-        self.value2_var.set(self._fmt1(row["result_value2"]))
-        self.unit2_var.set(row["result_unit2"] or "")
-        self.value3_var.set(self._fmt1(row["result_value3"]))
-        self.unit3_var.set(row["result_unit3"] or "")
-        self.value4_var.set(self._fmt1(row["result_value4"]))
-        self.unit4_var.set(row["result_unit4"] or "")
-        self.notes_var.set(row["result_notes"] or "")
-        self.status_var.set(row["status"] or "completed")
-        self._apply_labels(row["name"])
+        self.selected_version = row.row_version
+        self.value_var.set(self._fmt1(row.result_value))
+        self.unit_var.set(row.result_unit or "")
+        self.value2_var.set(self._fmt1(row.result_value2))
+        self.unit2_var.set(row.result_unit2 or "")
+        self.value3_var.set(self._fmt1(row.result_value3))
+        self.unit3_var.set(row.result_unit3 or "")
+        self.value4_var.set(self._fmt1(row.result_value4))
+        self.unit4_var.set(row.result_unit4 or "")
+        self.notes_var.set(row.result_notes or "")
+        self.status_var.set(row.status or "completed")
+        self._apply_labels(row.name)
 
     def _save(self):
         if not self.selected_id:
@@ -283,20 +290,79 @@ class ResultsTab(ttk.Frame):
                     unit3 = "%"
                     self.unit3_var.set(unit3)
 
-        conn = get_connection()
-        conn.execute(
-            """
-            UPDATE sample_tests
-            SET result_value = ?, result_unit = ?, result_value2 = ?, result_unit2 = ?,
-                result_value3 = ?, result_unit3 = ?, result_value4 = ?, result_unit4 = ?,
-                result_notes = ?, status = ?
-            WHERE id = ?
-            """,
-            (value, unit, value2, unit2, value3, unit3, value4, unit4, notes, status, self.selected_id),
-        )
-        conn.commit()
-        conn.close()
-        self.refresh()
+        values = {
+            "result_value": value,
+            "result_unit": unit,
+            "result_value2": value2,
+            "result_unit2": unit2,
+            "result_value3": value3,
+            "result_unit3": unit3,
+            "result_value4": value4,
+            "result_unit4": unit4,
+            "result_notes": notes,
+            "status": status,
+        }
+        try:
+            self.sample_tests.save_results(self.selected_id, values, self.selected_version)
+        except ConflictError as exc:
+            messagebox.showerror("Save Conflict", f"{exc}\nThe latest values have been reloaded; re-enter your changes.")
+            WORKING_SET.reload("sample_tests", [self.selected_id])
+            self._reselect(self.selected_id)
+            return
+        invalidate_nearby_results([self.get_project_id()])
+        WORKING_SET.reload("sample_tests", [self.selected_id])
+        self._reselect(self.selected_id)
+
+    def _reselect(self, sample_test_id):
+        if sample_test_id and self.tree.exists(str(sample_test_id)):
+            self.tree.selection_set(str(sample_test_id))
+            self.tree.see(str(sample_test_id))
+            self._on_select(None)
+
+    def _show_history(self):
+        if not self.selected_id:
+            messagebox.showerror("No Selection", "Select a test row to see its history.")
+            return
+        sample_test_id = self.selected_id
+        actions = {"I": "Assigned", "U": "Changed", "D": "Deleted"}
+
+        win = tk.Toplevel(self)
+        win.title("Result History")
+        win.transient(self.winfo_toplevel())
+
+        tree = ttk.Treeview(win, columns=("when", "action", "fields"), show="headings", height=10)
+        for col, text, width in [("when", "When", 150), ("action", "Action", 80), ("fields", "Previous Values", 420)]:
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor=tk.W)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 4))
+        for entry in history("sample_tests", sample_test_id):
+            delta = entry["delta"] or {}
+            fields = ", ".join(f"{k}={v}" for k, v in delta.items()) if entry["op"] == "U" else ""
+            tree.insert("", tk.END, values=(entry["changed_at"].replace("T", " "), actions.get(entry["op"], entry["op"]), fields))
+
+        as_of_var = tk.StringVar(value=date.today().isoformat())
+        bar = ttk.Frame(win)
+        bar.pack(fill=tk.X, padx=10)
+        ttk.Label(bar, text="Result as of (YYYY-MM-DD [HH:MM:SS])").pack(side=tk.LEFT)
+        ttk.Entry(bar, textvariable=as_of_var, width=22).pack(side=tk.LEFT, padx=6)
+        out = tk.Text(win, height=8, width=80, state=tk.DISABLED)
+
+        def show():
+            try:
+                state = result_as_of(sample_test_id, as_of_var.get())
+            except Exception as exc:
+                messagebox.showerror("History", f"Could not read history:\n{exc}", parent=win)
+                return
+            text = "Test was not assigned at that time." if state is None else "\n".join(
+                f"{k}: {'' if v is None else v}" for k, v in state.items()
+            )
+            out.configure(state=tk.NORMAL)
+            out.delete("1.0", tk.END)
+            out.insert(tk.END, text)
+            out.configure(state=tk.DISABLED)
+
+        ttk.Button(bar, text="Show", command=show).pack(side=tk.LEFT)
+        out.pack(fill=tk.BOTH, expand=True, padx=10, pady=(4, 10))
 
     def _apply_labels(self, test_name):
         label_map = {
@@ -431,60 +497,25 @@ class ResultsTab(ttk.Frame):
         except Exception:
             return str(value)
 
-    def _export_results_table(self):
+    def _fetch_matrix(self):
+        """Project, samples, tests and results for the results table, or None after reporting why not."""
         project_id = self.get_project_id()
         if not project_id:
             messagebox.showerror("No Project", "Select a project first.")
-            return
+            return None
 
-        conn = get_connection()
-        project = conn.execute(
-            "SELECT file_number, job_name FROM projects WHERE id = ?",
-            (project_id,),
-        ).fetchone()
-        samples = conn.execute(
-            """
-            SELECT id, sample_name, sample_type, depth_raw
-            FROM samples
-            WHERE project_id = ?
-            ORDER BY sample_name, id
-            """,
-            (project_id,),
-        ).fetchall()
-        tests = conn.execute(
-            """
-            SELECT DISTINCT t.id, t.name, t.code
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            ORDER BY t.code, t.name
-            """,
-            (project_id,),
-        ).fetchall()
-        results = conn.execute(
-            """
-            SELECT st.sample_id, st.test_id, t.name AS test_name,
-                   st.result_value, st.result_unit, st.result_value2, st.result_unit2,
-                   st.result_value3, st.result_unit3, st.result_value4, st.result_unit4
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
+        project = self.projects.get(project_id)
+        samples, tests, results = self.projects.result_matrix(project_id)
 
         if not project:
             messagebox.showerror("Missing Project", "Project record not found.")
-            return
+            return None
         if not samples:
             messagebox.showerror("No Samples", "No samples found for this project.")
-            return
+            return None
         if not tests:
             messagebox.showerror("No Tests", "No tests assigned for this project.")
-            return
+            return None
         has_data = False
         for r in results:
             for key in ("result_value", "result_value2", "result_value3", "result_value4"):
@@ -501,7 +532,14 @@ class ResultsTab(ttk.Frame):
                 break
         if not has_data:
             messagebox.showerror("No Entered Data", "Enter at least one result value before export.")
+            return None
+        return project, samples, tests, results
+
+    def _export_results_table(self):
+        data = self._fetch_matrix()
+        if not data:
             return
+        project, samples, tests, results = data
 
         default_name = f"Results_{project['file_number']}.xlsx"
         path = filedialog.asksaveasfilename(defaultextension=".xlsx", initialfile=default_name)
@@ -518,76 +556,10 @@ class ResultsTab(ttk.Frame):
         messagebox.showinfo("Exported", f"Results table exported to:\n{path}")
 
     def _export_results_table_pdf(self):
-        project_id = self.get_project_id()
-        if not project_id:
-            messagebox.showerror("No Project", "Select a project first.")
-            return
-
-        conn = get_connection()
-        project = conn.execute(
-            "SELECT file_number, job_name FROM projects WHERE id = ?",
-            (project_id,),
-        ).fetchone()
-        samples = conn.execute(
-            """
-            SELECT id, sample_name, sample_type, depth_raw
-            FROM samples
-            WHERE project_id = ?
-            ORDER BY sample_name, id
-            """,
-            (project_id,),
-        ).fetchall()
-        tests = conn.execute(
-            """
-            SELECT DISTINCT t.id, t.name, t.code
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            ORDER BY t.code, t.name
-            """,
-            (project_id,),
-        ).fetchall()
-        results = conn.execute(
-            """
-            SELECT st.sample_id, st.test_id, t.name AS test_name,
-                   st.result_value, st.result_unit, st.result_value2, st.result_unit2,
-                   st.result_value3, st.result_unit3, st.result_value4, st.result_unit4
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
-
-        if not project:
-            messagebox.showerror("Missing Project", "Project record not found.")
-            return
-        if not samples:
-            messagebox.showerror("No Samples", "No samples found for this project.")
-            return
-        if not tests:
-            messagebox.showerror("No Tests", "No tests assigned for this project.")
-            return
-        has_data = False
-        for r in results:
-            for key in ("result_value", "result_value2", "result_value3", "result_value4"):
-                if r[key] is not None:
-                    has_data = True
-                    break
-            if has_data:
-                break
-            for key in ("result_unit", "result_unit2", "result_unit3", "result_unit4"):
-                if isinstance(r[key], str) and r[key].strip():
-                    has_data = True
-                    break
-            if has_data:
-                break
-        if not has_data:
-            messagebox.showerror("No Entered Data", "Enter at least one result value before export.")
+        data = self._fetch_matrix()
+        if not data:
             return
+        project, samples, tests, results = data
 
         default_name = f"Results_{project['file_number']}.pdf"
         path = filedialog.asksaveasfilename(defaultextension=".pdf", initialfile=default_name)
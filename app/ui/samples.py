@@ -1,8 +1,10 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 
-from app.db import get_connection
+from app.services.sample_import import import_samples
+from app.services.test_assignment import list_templates, template_test_ids
 from app.services.validators import is_valid_sample_name, parse_depth
+from app.services.working_set import WORKING_SET
 
 
 class SamplesTab(ttk.Frame):
@@ -11,6 +13,11 @@ class SamplesTab(ttk.Frame):
         self.get_project_id = get_project_id
         self.on_samples_changed = on_samples_changed
         self._build_ui()
+        WORKING_SET.subscribe(self._on_working_set_changed)
+
+    def _on_working_set_changed(self, changes):
+        if "samples" in changes:
+            self.refresh()
 
     def _build_ui(self):
         top = ttk.Frame(self)
@@ -76,6 +83,7 @@ class SamplesTab(ttk.Frame):
         ttk.Button(form, text="Save Sample", command=self._save_sample).grid(row=row, column=4, sticky=tk.E, padx=5, pady=5)
         ttk.Button(form, text="Update Selected", command=self._update_selected).grid(row=row, column=5, sticky=tk.E, padx=5, pady=5)
         ttk.Button(form, text="Delete Selected", command=self._delete_selected).grid(row=row, column=6, sticky=tk.E, padx=5, pady=5)
+        ttk.Button(form, text="Import CSV/XLSX...", command=self._import_file).grid(row=row, column=7, sticky=tk.E, padx=5, pady=5)
 
         self.tree.bind("<<TreeviewSelect>>", self._on_select)
 
@@ -87,29 +95,19 @@ class SamplesTab(ttk.Frame):
         if not project_id:
             return
 
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT id, sample_name, sample_type, depth_raw, received_date, storage_location, disposal_date, status
-            FROM samples WHERE project_id = ? ORDER BY id DESC
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
-
-        for row in rows:
+        for sample in WORKING_SET.sample_list("newest"):
             self.tree.insert(
                 "",
                 tk.END,
-                iid=row["id"],
+                iid=sample.id,
                 values=(
-                    row["sample_name"],
-                    row["sample_type"] or "",
-                    row["depth_raw"] or "",
-                    row["received_date"] or "",
-                    row["storage_location"] or "",
-                    row["disposal_date"] or "",
-                    row["status"] or "",
+                    sample.sample_name,
+                    sample.sample_type or "",
+                    sample.depth_raw or "",
+                    sample.received_date or "",
+                    sample.storage_location or "",
+                    sample.disposal_date or "",
+                    sample.status or "",
                 ),
             )
 
@@ -124,32 +122,7 @@ class SamplesTab(ttk.Frame):
             messagebox.showerror("Invalid", "Sample name must be B-#, T-#, HA-#, or C-#.")
             return
 
-        depth_raw = self.depth_raw.get().strip()
-        depth_from, depth_to, depth_unit = parse_depth(depth_raw)
-
-        conn = get_connection()
-        conn.execute(
-            """
-            INSERT INTO samples (project_id, sample_name, sample_type, depth_raw, depth_from, depth_to, depth_unit, received_date, storage_location, disposal_date, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                project_id,
-                sample_name,
-                (self.sample_type.get().strip() or "SB").upper(),
-                depth_raw or None,
-                depth_from,
-                depth_to,
-                depth_unit,
-                self.received_date.get().strip() or None,
-                self.storage_location.get().strip() or None,
-                self.disposal_date.get().strip() or None,
-                self.status.get().strip() or None,
-            ),
-        )
-        conn.commit()
-        conn.close()
-        self.refresh()
+        WORKING_SET.add_sample(self._form_values(sample_name))
         self._clear_form()
         if self.on_samples_changed:
             self.on_samples_changed()
@@ -161,11 +134,7 @@ class SamplesTab(ttk.Frame):
         sample_id = int(sel[0])
         if not messagebox.askyesno("Confirm", "Delete this sample and its tests?"):
             return
-        conn = get_connection()
-        conn.execute("DELETE FROM samples WHERE id = ?", (sample_id,))
-        conn.commit()
-        conn.close()
-        self.refresh()
+        WORKING_SET.delete_samples([sample_id])
         if self.on_samples_changed:
             self.on_samples_changed()
 
@@ -177,25 +146,17 @@ class SamplesTab(ttk.Frame):
         self._load_sample(sample_id)
 
     def _load_sample(self, sample_id):
-        conn = get_connection()
-        row = conn.execute(
-            """
-            SELECT id, sample_name, sample_type, depth_raw, received_date, storage_location, disposal_date, status
-            FROM samples WHERE id = ?
-            """,
-            (sample_id,),
-        ).fetchone()
-        conn.close()
-        if not row:
+        sample = WORKING_SET.samples.get(sample_id)
+        if not sample:
             return
-        self.editing_sample_id = row["id"]
-        self.sample_name.set(row["sample_name"])
-        self.sample_type.set((row["sample_type"] or "SB").upper())
-        self.depth_raw.set(row["depth_raw"] or "")
-        self.received_date.set(row["received_date"] or "")
-        self.storage_location.set(row["storage_location"] or "")
-        self.disposal_date.set(row["disposal_date"] or "")
-        self.status.set(row["status"] or "")
+        self.editing_sample_id = sample.id
+        self.sample_name.set(sample.sample_name)
+        self.sample_type.set((sample.sample_type or "SB").upper())
+        self.depth_raw.set(sample.depth_raw or "")
+        self.received_date.set(sample.received_date or "")
+        self.storage_location.set(sample.storage_location or "")
+        self.disposal_date.set(sample.disposal_date or "")
+        self.status.set(sample.status or "")
 
     def _update_selected(self):
         sel = self.tree.selection()
@@ -209,38 +170,27 @@ class SamplesTab(ttk.Frame):
             messagebox.showerror("Invalid", "Sample name must be B-#, T-#, HA-#, or C-#.")
             return
 
-        depth_raw = self.depth_raw.get().strip()
-        depth_from, depth_to, depth_unit = parse_depth(depth_raw)
-
-        conn = get_connection()
-        conn.execute(
-            """
-            UPDATE samples
-            SET sample_name = ?, sample_type = ?, depth_raw = ?, depth_from = ?, depth_to = ?, depth_unit = ?,
-                received_date = ?, storage_location = ?, disposal_date = ?, status = ?
-            WHERE id = ?
-            """,
-            (
-                sample_name,
-                (self.sample_type.get().strip() or "SB").upper(),
-                depth_raw or None,
-                depth_from,
-                depth_to,
-                depth_unit,
-                self.received_date.get().strip() or None,
-                self.storage_location.get().strip() or None,
-                self.disposal_date.get().strip() or None,
-                self.status.get().strip() or None,
-                sample_id,
-            ),
-        )
-        conn.commit()
-        conn.close()
-        self.refresh()
+        WORKING_SET.update_sample(sample_id, self._form_values(sample_name))
         self._clear_form()
         if self.on_samples_changed:
             self.on_samples_changed()
 
+    def _form_values(self, sample_name):
+        depth_raw = self.depth_raw.get().strip()
+        depth_from, depth_to, depth_unit = parse_depth(depth_raw)
+        return {
+            "sample_name": sample_name,
+            "sample_type": (self.sample_type.get().strip() or "SB").upper(),
+            "depth_raw": depth_raw or None,
+            "depth_from": depth_from,
+            "depth_to": depth_to,
+            "depth_unit": depth_unit,
+            "received_date": self.received_date.get().strip() or None,
+            "storage_location": self.storage_location.get().strip() or None,
+            "disposal_date": self.disposal_date.get().strip() or None,
+            "status": self.status.get().strip() or None,
+        }
+
     def _clear_form(self):
         self.editing_sample_id = None
         self.sample_name.set("")
@@ -250,3 +200,76 @@ class SamplesTab(ttk.Frame):
         self.storage_location.set("")
         self.disposal_date.set("")
         self.status.set("Inventory")
+
+    def _import_file(self):
+        project_id = self.get_project_id()
+        if not project_id:
+            messagebox.showerror("No Project", "Select a project first.")
+            return
+        path = filedialog.askopenfilename(
+            filetypes=[("Boring logs", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Excel", "*.xlsx"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        tests = WORKING_SET.test_list()
+
+        win = tk.Toplevel(self)
+        win.title("Import Samples")
+        win.transient(self.winfo_toplevel())
+        ttk.Label(win, text=f"File: {path}").pack(anchor=tk.W, padx=10, pady=(10, 4))
+        ttk.Label(win, text="Assign these tests to every imported sample (optional):").pack(anchor=tk.W, padx=10)
+        template_map = {t["name"]: t["id"] for t in list_templates()}
+        template_choice = tk.StringVar()
+        template_combo = ttk.Combobox(
+            win, textvariable=template_choice, values=list(template_map.keys()), state="readonly", width=30
+        )
+        template_combo.pack(anchor=tk.W, padx=10, pady=(4, 0))
+        test_list = tk.Listbox(win, selectmode=tk.MULTIPLE, height=12, exportselection=False)
+        test_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=4)
+        test_ids = []
+        for t in tests:
+            test_list.insert(tk.END, f"{t.code} - {t.name}")
+            test_ids.append(t.id)
+
+        def use_template(_event=None):
+            wanted = set(template_test_ids(template_map[template_choice.get()]))
+            test_list.selection_clear(0, tk.END)
+            for idx, test_id in enumerate(test_ids):
+                if test_id in wanted:
+                    test_list.selection_set(idx)
+
+        template_combo.bind("<<ComboboxSelected>>", use_template)
+
+        def run_import():
+            chosen = [test_ids[i] for i in test_list.curselection()]
+            win.destroy()
+            self._run_import(project_id, path, chosen)
+
+        btns = ttk.Frame(win)
+        btns.pack(fill=tk.X, padx=10, pady=(4, 10))
+        ttk.Button(btns, text="Import", command=run_import).pack(side=tk.RIGHT)
+        ttk.Button(btns, text="Cancel", command=win.destroy).pack(side=tk.RIGHT, padx=(0, 8))
+
+    def _run_import(self, project_id, path, test_ids):
+        try:
+            result = import_samples(project_id, path, test_ids=test_ids or None)
+        except Exception as exc:
+            messagebox.showerror("Import Failed", f"Could not import samples:\n{exc}")
+            return
+        lines = [f"Imported {result['imported']} sample(s)."]
+        if result["assigned"]:
+            lines.append(f"Assigned {result['assigned']} test(s).")
+        errors = result["errors"]
+        if errors:
+            lines.append(f"\n{len(errors)} issue(s):")
+            lines.extend(f"Row {n}: {msg}" for n, msg in errors[:20])
+            if len(errors) > 20:
+                lines.append(f"...and {len(errors) - 20} more")
+        WORKING_SET.reload("samples")
+        if self.on_samples_changed:
+            self.on_samples_changed()
+        if errors:
+            messagebox.showwarning("Import Complete", "\n".join(lines))
+        else:
+            messagebox.showinfo("Import Complete", "\n".join(lines))
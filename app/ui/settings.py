@@ -1,16 +1,44 @@
+import queue
+import threading
 import tkinter as tk
+from datetime import datetime, timedelta
 from pathlib import Path
 from tkinter import filedialog, messagebox, ttk
 
-from app.db import DB_PATH, backup_database, get_app_setting, set_app_setting
+from app.db import (
+    backfill_sample_depths,
+    check_project_progress,
+    describe_backend,
+    get_app_setting,
+    is_local_backend,
+    now_iso,
+    rebuild_project_progress,
+    set_app_setting,
+)
+from app.services.backup import DEFAULT_KEEP, run_backup
+from app.services.change_log import compact_change_log
+from app.services.profiler import PROFILER
+from app.ui.calibrations_view import CalibrationLibrary
+
+AUTO_BACKUP_CHECK_MS = 60_000
+DIAGNOSTICS_ROWS = 200
 
 
 class SettingsTab(ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
         self.backup_dir_var = tk.StringVar(value="")
+        self.backup_keep_var = tk.StringVar(value=str(DEFAULT_KEEP))
+        self.backup_interval_var = tk.StringVar(value="24")
+        self.backup_status_var = tk.StringVar(value="")
+        self.profile_enabled_var = tk.BooleanVar(value=PROFILER.enabled)
+        self.slow_ms_var = tk.StringVar(value=f"{PROFILER.slow_ms:g}")
+        self.diagnostics_status_var = tk.StringVar(value="")
+        self._backup_thread = None
+        self._backup_events = queue.Queue()
         self._build_ui()
         self.refresh()
+        self.after(AUTO_BACKUP_CHECK_MS, self._auto_backup_tick)
 
     def _build_ui(self):
         wrap = ttk.Frame(self)
@@ -18,7 +46,22 @@ class SettingsTab(ttk.Frame):
 
         db_box = ttk.LabelFrame(wrap, text="Database")
         db_box.pack(fill=tk.X, pady=(0, 10))
-        ttk.Label(db_box, text=f"Active DB: {DB_PATH}").pack(anchor=tk.W, padx=8, pady=8)
+        ttk.Label(db_box, text=f"Active DB: {describe_backend()}").pack(anchor=tk.W, padx=8, pady=8)
+        db_actions = ttk.Frame(db_box)
+        db_actions.pack(anchor=tk.W, padx=8, pady=(0, 8))
+        ttk.Button(db_actions, text="Check Project Counters", command=self._check_progress).pack(side=tk.LEFT)
+        ttk.Button(db_actions, text="Rebuild Project Counters", command=self._rebuild_progress).pack(
+            side=tk.LEFT, padx=(8, 0)
+        )
+        ttk.Button(db_actions, text="Re-parse Sample Depths", command=self._backfill_depths).pack(
+            side=tk.LEFT, padx=(8, 0)
+        )
+        ttk.Button(db_actions, text="Compact Result History", command=self._compact_history).pack(
+            side=tk.LEFT, padx=(8, 0)
+        )
+        ttk.Button(db_actions, text="Calibration Library...", command=lambda: CalibrationLibrary(self)).pack(
+            side=tk.LEFT, padx=(8, 0)
+        )
 
         backup_box = ttk.LabelFrame(wrap, text="Backup")
         backup_box.pack(fill=tk.X)
@@ -27,20 +70,73 @@ class SettingsTab(ttk.Frame):
         ttk.Entry(backup_box, textvariable=self.backup_dir_var, width=70).grid(row=0, column=1, sticky=tk.W, padx=8, pady=8)
         ttk.Button(backup_box, text="Browse", command=self._browse_backup_dir).grid(row=0, column=2, sticky=tk.W, padx=8, pady=8)
 
+        policy = ttk.Frame(backup_box)
+        policy.grid(row=1, column=1, sticky=tk.W, padx=8, pady=(0, 8))
+        ttk.Label(policy, text="Keep full backups").pack(side=tk.LEFT)
+        ttk.Spinbox(policy, from_=1, to=100, textvariable=self.backup_keep_var, width=5).pack(side=tk.LEFT, padx=(6, 16))
+        ttk.Label(policy, text="Automatic backup every (hours, 0 = off)").pack(side=tk.LEFT)
+        ttk.Entry(policy, textvariable=self.backup_interval_var, width=6).pack(side=tk.LEFT, padx=(6, 0))
+
         actions = ttk.Frame(backup_box)
-        actions.grid(row=1, column=1, sticky=tk.W, padx=8, pady=(0, 10))
-        ttk.Button(actions, text="Save Backup Folder", command=self._save_backup_dir).pack(side=tk.LEFT)
-        ttk.Button(actions, text="Backup Now", command=self._backup_now).pack(side=tk.LEFT, padx=(8, 0))
+        actions.grid(row=2, column=1, sticky=tk.W, padx=8, pady=(0, 10))
+        ttk.Button(actions, text="Save Backup Settings", command=self._save_backup_dir).pack(side=tk.LEFT)
+        self.backup_button = ttk.Button(actions, text="Backup Now", command=self._backup_now)
+        self.backup_button.pack(side=tk.LEFT, padx=(8, 0))
+
+        self.backup_progress = ttk.Progressbar(backup_box, mode="determinate", length=420)
+        self.backup_progress.grid(row=3, column=1, sticky=tk.W, padx=8)
+        ttk.Label(backup_box, textvariable=self.backup_status_var).grid(row=4, column=1, sticky=tk.W, padx=8, pady=(2, 8))
 
         tip = (
             "Recommended: pick a cloud-synced folder (OneDrive/Dropbox) "
-            "or a network share so backups are resilient."
+            "or a network share so backups are resilient. Backups are compressed; "
+            "after each full backup only changed pages are stored until the next full one."
         )
-        ttk.Label(backup_box, text=tip).grid(row=2, column=0, columnspan=3, sticky=tk.W, padx=8, pady=(0, 8))
+        ttk.Label(backup_box, text=tip, wraplength=700).grid(row=5, column=0, columnspan=3, sticky=tk.W, padx=8, pady=(0, 8))
+
+        diag_box = ttk.LabelFrame(wrap, text="Diagnostics")
+        diag_box.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        diag_actions = ttk.Frame(diag_box)
+        diag_actions.pack(fill=tk.X, padx=8, pady=8)
+        ttk.Checkbutton(
+            diag_actions, text="Record query timings", variable=self.profile_enabled_var, command=self._apply_profiler
+        ).pack(side=tk.LEFT)
+        ttk.Label(diag_actions, text="Capture plans slower than (ms)").pack(side=tk.LEFT, padx=(16, 0))
+        ttk.Entry(diag_actions, textvariable=self.slow_ms_var, width=6).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Button(diag_actions, text="Apply", command=self._apply_profiler).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Button(diag_actions, text="Refresh", command=self._refresh_diagnostics).pack(side=tk.LEFT, padx=(16, 0))
+        ttk.Button(diag_actions, text="Show Plan", command=self._show_plan).pack(side=tk.LEFT, padx=(8, 0))
+        ttk.Button(diag_actions, text="Clear", command=self._clear_diagnostics).pack(side=tk.LEFT, padx=(8, 0))
+        ttk.Button(diag_actions, text="Save JSON...", command=self._dump_diagnostics).pack(side=tk.LEFT, padx=(8, 0))
+
+        columns = ("calls", "total", "avg", "max", "rows", "caller", "sql")
+        self.diag_tree = ttk.Treeview(diag_box, columns=columns, show="headings", height=8)
+        for col, title, width in (
+            ("calls", "Calls", 60),
+            ("total", "Total ms", 80),
+            ("avg", "Avg ms", 70),
+            ("max", "Max ms", 70),
+            ("rows", "Rows", 70),
+            ("caller", "Caller", 200),
+            ("sql", "Statement", 520),
+        ):
+            self.diag_tree.heading(col, text=title)
+            self.diag_tree.column(col, width=width, anchor=tk.W if col in ("caller", "sql") else tk.E)
+        self.diag_tree.pack(fill=tk.BOTH, expand=True, padx=8)
+        ttk.Label(diag_box, textvariable=self.diagnostics_status_var).pack(anchor=tk.W, padx=8, pady=(2, 8))
+        self._diagnostics = {}
 
     def refresh(self):
         saved = get_app_setting("backup_dir", "")
         self.backup_dir_var.set(saved or "")
+        self.backup_keep_var.set(get_app_setting("backup_keep", str(DEFAULT_KEEP)) or str(DEFAULT_KEEP))
+        self.backup_interval_var.set(get_app_setting("backup_interval_hours", "24") or "0")
+        if self._backup_thread is None:
+            last = get_app_setting("last_backup_at", "")
+            self.backup_status_var.set(f"Last backup: {last.replace('T', ' ')}" if last else "No backup yet.")
+        self.profile_enabled_var.set(get_app_setting("profiler_enabled", "1" if PROFILER.enabled else "0") != "0")
+        self.slow_ms_var.set(get_app_setting("profiler_slow_ms", f"{PROFILER.slow_ms:g}") or f"{PROFILER.slow_ms:g}")
+        self._apply_profiler(save=False)
 
     def _browse_backup_dir(self):
         initial = self.backup_dir_var.get().strip() or str(Path.home())
@@ -53,20 +149,220 @@ class SettingsTab(ttk.Frame):
         if not folder:
             messagebox.showerror("Missing Folder", "Select a backup folder first.")
             return
+        policy = self._backup_policy()
+        if policy is None:
+            return
+        keep, interval = policy
         set_app_setting("backup_dir", folder)
-        messagebox.showinfo("Saved", f"Backup folder saved:\n{folder}")
+        set_app_setting("backup_keep", str(keep))
+        set_app_setting("backup_interval_hours", str(interval))
+        messagebox.showinfo("Saved", f"Backup settings saved:\n{folder}")
+
+    def _backup_policy(self):
+        try:
+            keep = int(self.backup_keep_var.get())
+            interval = float(self.backup_interval_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("Invalid", "Keep and interval must be numbers.")
+            return None
+        if keep < 1 or interval < 0:
+            messagebox.showerror("Invalid", "Keep at least one backup; the interval cannot be negative.")
+            return None
+        return keep, interval
 
     def _backup_now(self):
         folder = self.backup_dir_var.get().strip() or get_app_setting("backup_dir", "")
         if not folder:
             messagebox.showerror("Missing Folder", "Select and save a backup folder first.")
             return
-        try:
-            out_path = backup_database(folder)
-        except Exception as exc:
-            messagebox.showerror("Backup Failed", f"Could not create backup:\n{exc}")
+        policy = self._backup_policy()
+        if policy is None:
             return
         if self.backup_dir_var.get().strip() != folder:
             self.backup_dir_var.set(folder)
         set_app_setting("backup_dir", folder)
-        messagebox.showinfo("Backup Complete", f"Database backup created:\n{out_path}")
+        self._start_backup(folder, policy[0], manual=True)
+
+    def _auto_backup_tick(self):
+        try:
+            folder = get_app_setting("backup_dir", "")
+            interval = float(get_app_setting("backup_interval_hours", "24") or 0)
+            keep = int(get_app_setting("backup_keep", str(DEFAULT_KEEP)) or DEFAULT_KEEP)
+            last = get_app_setting("last_backup_at", "")
+            due = not last or datetime.fromisoformat(last) + timedelta(hours=interval) <= datetime.now()
+            # A served database is backed up by the server, not by each client.
+            if folder and interval > 0 and due and self._backup_thread is None and is_local_backend():
+                self._start_backup(folder, keep, manual=False)
+        except Exception:
+            pass
+        self.after(AUTO_BACKUP_CHECK_MS, self._auto_backup_tick)
+
+    def _start_backup(self, folder, keep, manual):
+        if self._backup_thread is not None:
+            if manual:
+                messagebox.showinfo("Backup Running", "A backup is already in progress.")
+            return
+        events = self._backup_events
+
+        def work():
+            # Runs off the Tk thread; results go back through the queue.
+            try:
+                result = run_backup(folder, keep=keep, progress=lambda *p: events.put(("progress", p)))
+                events.put(("done", result))
+            except Exception as exc:
+                events.put(("error", exc))
+
+        self.backup_button.state(["disabled"])
+        self.backup_progress["value"] = 0
+        self.backup_status_var.set("Backing up...")
+        self._backup_manual = manual
+        self._backup_thread = threading.Thread(target=work, name="geolab-backup", daemon=True)
+        self._backup_thread.start()
+        self.after(100, self._poll_backup)
+
+    def _poll_backup(self):
+        finished = None
+        while True:
+            try:
+                kind, payload = self._backup_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                phase, done, total = payload
+                self.backup_progress["value"] = 100.0 * done / total if total else 100.0
+                self.backup_status_var.set(f"Backing up: {phase} {done}/{total} pages")
+            else:
+                finished = (kind, payload)
+        if finished is None:
+            self.after(100, self._poll_backup)
+            return
+
+        self._backup_thread = None
+        self.backup_button.state(["!disabled"])
+        kind, payload = finished
+        if kind == "error":
+            self.backup_status_var.set(f"Backup failed: {payload}")
+            if self._backup_manual:
+                messagebox.showerror("Backup Failed", f"Could not create backup:\n{payload}")
+            return
+        set_app_setting("last_backup_at", now_iso())
+        self.backup_progress["value"] = 100
+        summary = (
+            f"{'Full' if payload['kind'] == 'full' else 'Incremental'} backup verified: "
+            f"{payload['pages_written']} of {payload['page_count']} pages stored"
+        )
+        self.backup_status_var.set(f"{summary} ({payload['created_at'].replace('T', ' ')})")
+        if self._backup_manual:
+            messagebox.showinfo("Backup Complete", f"{summary}.\n{payload['path']}")
+
+    def _check_progress(self):
+        mismatches = check_project_progress()
+        if not mismatches:
+            messagebox.showinfo("Project Counters", "All project counters are consistent.")
+            return
+        listed = "\n".join(m["file_number"] for m in mismatches[:15])
+        more = f"\n...and {len(mismatches) - 15} more" if len(mismatches) > 15 else ""
+        if messagebox.askyesno(
+            "Project Counters",
+            f"{len(mismatches)} project(s) have stale counters:\n{listed}{more}\n\nRebuild now?",
+        ):
+            self._rebuild_progress()
+
+    def _rebuild_progress(self):
+        try:
+            rebuild_project_progress()
+        except Exception as exc:
+            messagebox.showerror("Rebuild Failed", f"Could not rebuild project counters:\n{exc}")
+            return
+        messagebox.showinfo("Project Counters", "Project counters rebuilt.")
+
+    def _backfill_depths(self):
+        try:
+            updated, unparsed = backfill_sample_depths(reparse_all=True)
+        except Exception as exc:
+            messagebox.showerror("Re-parse Failed", f"Could not re-parse sample depths:\n{exc}")
+            return
+        messagebox.showinfo(
+            "Sample Depths",
+            f"Updated {updated} sample(s).\n{unparsed} depth(s) could not be parsed.",
+        )
+
+    def _compact_history(self):
+        try:
+            before, after = compact_change_log(older_than_days=30)
+        except Exception as exc:
+            messagebox.showerror("Compact Failed", f"Could not compact result history:\n{exc}")
+            return
+        messagebox.showinfo(
+            "Result History",
+            f"History older than 30 days merged to one entry per day:\n{before} entries -> {after}.",
+        )
+
+    def _apply_profiler(self, save=True):
+        try:
+            slow_ms = float(self.slow_ms_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("Invalid", "The slow query threshold must be a number of milliseconds.")
+            return
+        PROFILER.enabled = bool(self.profile_enabled_var.get())
+        PROFILER.slow_ms = max(0.0, slow_ms)
+        if save:
+            set_app_setting("profiler_enabled", "1" if PROFILER.enabled else "0")
+            set_app_setting("profiler_slow_ms", f"{PROFILER.slow_ms:g}")
+        self._refresh_diagnostics()
+
+    def _refresh_diagnostics(self):
+        for item in self.diag_tree.get_children():
+            self.diag_tree.delete(item)
+        summary = PROFILER.summary()
+        self._diagnostics = {}
+        for idx, g in enumerate(summary[:DIAGNOSTICS_ROWS]):
+            self._diagnostics[str(idx)] = g
+            self.diag_tree.insert(
+                "",
+                tk.END,
+                iid=str(idx),
+                values=(
+                    g["calls"],
+                    f"{g['total_ms']:.1f}",
+                    f"{g['avg_ms']:.2f}",
+                    f"{g['max_ms']:.1f}",
+                    g["rows"],
+                    ", ".join(g["callers"][:2]),
+                    g["sql"][:300],
+                ),
+            )
+        recorded = sum(g["calls"] for g in summary)
+        state = "on" if PROFILER.enabled else "off"
+        self.diagnostics_status_var.set(
+            f"Recording {state}: {recorded} statement(s) in the buffer, {len(summary)} distinct."
+        )
+
+    def _show_plan(self):
+        sel = self.diag_tree.selection()
+        if not sel:
+            messagebox.showinfo("Query Plan", "Select a statement first.")
+            return
+        g = self._diagnostics[sel[0]]
+        plan = "\n".join(g["plan"]) if g["plan"] else f"No plan captured (not slower than {PROFILER.slow_ms:g} ms)."
+        callers = "\n".join(g["callers"][:10])
+        messagebox.showinfo("Query Plan", f"{g['sql'][:1000]}\n\nPlan:\n{plan}\n\nCalled from:\n{callers}")
+
+    def _clear_diagnostics(self):
+        PROFILER.clear()
+        self._refresh_diagnostics()
+
+    def _dump_diagnostics(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile=f"geolab_queries_{datetime.now():%Y%m%d_%H%M%S}.json",
+            filetypes=[("JSON", "*.json")],
+        )
+        if not path:
+            return
+        try:
+            PROFILER.dump(path)
+        except OSError as exc:
+            messagebox.showerror("Save Failed", f"Could not write query log:\n{exc}")
+            return
+        messagebox.showinfo("Saved", f"Query log written to:\n{path}")
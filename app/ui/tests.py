@@ -1,15 +1,31 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 
-from app.db import get_connection
+from app.services.test_assignment import (
+    assign_template,
+    delete_template,
+    list_templates,
+    save_template,
+    template_test_ids,
+)
+from app.services.repository import SampleTestRepository
+from app.services.working_set import WORKING_SET, changed_sample_tests
 
 
 class TestsTab(ttk.Frame):
-    def __init__(self, parent, get_project_id, on_tests_changed=None):
+    def __init__(self, parent, get_project_id):
         super().__init__(parent)
         self.get_project_id = get_project_id
-        self.on_tests_changed = on_tests_changed
+        self.sample_tests = SampleTestRepository()
         self._build_ui()
+        WORKING_SET.subscribe(self._on_working_set_changed)
+
+    def _on_working_set_changed(self, changes):
+        sample_test_ids = changed_sample_tests(changes)
+        if sample_test_ids is not None:
+            self.apply_changes(sample_test_ids)
+        elif "samples" in changes or "sample_tests" in changes:
+            self.refresh()
 
     def _build_ui(self):
         top = ttk.Frame(self)
@@ -46,6 +62,24 @@ class TestsTab(ttk.Frame):
 
         ttk.Button(assign, text="Assign Selected", command=self._assign_test).grid(row=0, column=9, sticky=tk.E, padx=5, pady=5)
 
+        self.apply_all = tk.BooleanVar(value=False)
+        ttk.Checkbutton(assign, text="Apply to all samples in project", variable=self.apply_all).grid(
+            row=1, column=1, columnspan=3, sticky=tk.W, padx=5, pady=(0, 5)
+        )
+
+        templates = ttk.LabelFrame(top, text="Assignment Templates")
+        templates.pack(fill=tk.X, pady=5)
+
+        self.template_choice = tk.StringVar()
+        self.template_map = {}
+        ttk.Label(templates, text="Template").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.template_combo = ttk.Combobox(templates, textvariable=self.template_choice, width=30, state="readonly")
+        self.template_combo.grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Button(templates, text="Select Its Tests", command=self._select_template_tests).grid(row=0, column=2, padx=5, pady=5)
+        ttk.Button(templates, text="Apply Template", command=self._apply_template).grid(row=0, column=3, padx=5, pady=5)
+        ttk.Button(templates, text="Save Selected Tests as Template...", command=self._save_template).grid(row=0, column=4, padx=5, pady=5)
+        ttk.Button(templates, text="Delete Template", command=self._delete_template).grid(row=0, column=5, padx=5, pady=5)
+
         self.tree = ttk.Treeview(
             top,
             columns=("sample", "depth", "code", "name", "cost", "status"),
@@ -70,8 +104,17 @@ class TestsTab(ttk.Frame):
         if project_id:
             self._sync_rate_prices(project_id)
         self._refresh_combos()
+        self._refresh_templates()
         self._refresh_assignments()
 
+    def _refresh_templates(self):
+        self.template_map = {
+            f"{t['name']} ({t['test_count']} tests)": t["id"] for t in list_templates()
+        }
+        self.template_combo["values"] = list(self.template_map.keys())
+        if self.template_choice.get() not in self.template_map:
+            self.template_choice.set("")
+
     def _refresh_combos(self):
         project_id = self.get_project_id()
         if not project_id:
@@ -79,24 +122,16 @@ class TestsTab(ttk.Frame):
             self.test_list.delete(0, tk.END)
             return
 
-        conn = get_connection()
-        samples = conn.execute(
-            "SELECT id, sample_name, depth_raw FROM samples WHERE project_id = ? ORDER BY sample_name",
-            (project_id,),
-        ).fetchall()
-        tests = conn.execute("SELECT id, code, name, default_cost FROM tests ORDER BY code").fetchall()
-        conn.close()
-
         self.sample_map = {}
-        for s in samples:
-            depth = (s["depth_raw"] or "").strip()
-            label = f"{s['sample_name']} @ {depth}" if depth else s["sample_name"]
-            key = f"{label} (#{s['id']})"
-            self.sample_map[key] = s["id"]
+        for s in WORKING_SET.sample_list():
+            depth = (s.depth_raw or "").strip()
+            label = f"{s.sample_name} @ {depth}" if depth else s.sample_name
+            key = f"{label} (#{s.id})"
+            self.sample_map[key] = s.id
         self.test_map = {
-            f"{t['code']} - {t['name']}": (t["id"], t["default_cost"])
-            for t in tests
-            if t["name"] != "Moisture and Density"
+            f"{t.code} - {t.name}": (t.id, t.default_cost)
+            for t in WORKING_SET.test_list()
+            if t.name != "Moisture and Density"
         }
 
         self.sample_combo["values"] = list(self.sample_map.keys())
@@ -112,91 +147,154 @@ class TestsTab(ttk.Frame):
         if not project_id:
             return
 
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT st.id, s.sample_name, s.depth_raw, t.code, t.name, st.cost, st.status
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ?
-            ORDER BY s.sample_name, t.code
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
-
-        for row in rows:
-            self.tree.insert(
-                "",
-                tk.END,
-                iid=row["id"],
-                values=(
-                    row["sample_name"],
-                    row["depth_raw"] or "",
-                    row["code"],
-                    row["name"],
-                    row["cost"],
-                    row["status"],
-                ),
-            )
+        for record in WORKING_SET.sample_test_list():
+            self.tree.insert("", tk.END, iid=record.id, values=self._assignment_values(record))
 
-    def _assign_test(self):
+    def apply_changes(self, sample_test_ids):
+        """Redraws only the given assignments after another workstation changed them."""
         project_id = self.get_project_id()
-        if not project_id:
-            messagebox.showerror("No Project", "Select a project first.")
+        if not project_id or not sample_test_ids:
             return
+        rows = WORKING_SET.sample_tests
+        added = False
+        for sid in sample_test_ids:
+            row = rows.get(sid)
+            if row is None:
+                if self.tree.exists(str(sid)):
+                    self.tree.delete(str(sid))
+            elif self.tree.exists(str(sid)):
+                self.tree.item(str(sid), values=self._assignment_values(row))
+            else:
+                added = True
+        if added:
+            self._refresh_assignments()
+
+    def _assignment_values(self, record):
+        return (
+            record.sample_name,
+            record.depth_raw or "",
+            record.code,
+            record.name,
+            record.cost,
+            record.status,
+        )
 
-        sample_key = self.sample_choice.get()
-        if sample_key not in self.sample_map:
-            messagebox.showerror("Missing", "Select a sample.")
+    def _assign_test(self):
+        target = self._target_samples()
+        if target is None:
             return
 
-        sample_id = self.sample_map[sample_key]
-        selected_indices = list(self.test_list.curselection())
-        if not selected_indices:
+        selected = self._selected_test_ids()
+        if not selected:
             messagebox.showerror("Missing", "Select one or more tests.")
             return
 
+        options = self._assignment_options()
+        if options is None:
+            return
+
+        try:
+            WORKING_SET.assign_tests(target, selected, *options)
+        except Exception as exc:
+            messagebox.showerror("Assign Failed", f"Could not assign tests:\n{exc}")
+
+    def _apply_template(self):
+        template_id = self.template_map.get(self.template_choice.get())
+        if template_id is None:
+            messagebox.showerror("Missing", "Select a template.")
+            return
+        target = self._target_samples()
+        if target is None:
+            return
+        options = self._assignment_options()
+        if options is None:
+            return
+
+        try:
+            written = assign_template(template_id, target, *options)
+        except Exception as exc:
+            messagebox.showerror("Assign Failed", f"Could not apply template:\n{exc}")
+            return
+        WORKING_SET.reload("samples", target)
+        messagebox.showinfo("Template Applied", f"Assigned {written} test(s) to {len(target)} sample(s).")
+
+    def _select_template_tests(self):
+        template_id = self.template_map.get(self.template_choice.get())
+        if template_id is None:
+            return
+        wanted = set(template_test_ids(template_id))
+        self.test_list.selection_clear(0, tk.END)
+        for idx in range(self.test_list.size()):
+            entry = self.test_map.get(self.test_list.get(idx))
+            if entry and entry[0] in wanted:
+                self.test_list.selection_set(idx)
+
+    def _save_template(self):
+        selected = self._selected_test_ids()
+        if not selected:
+            messagebox.showerror("Missing", "Select the tests to save in the template.")
+            return
+        current = self.template_choice.get().rsplit(" (", 1)[0]
+        name = simpledialog.askstring("Save Template", "Template name:", initialvalue=current, parent=self)
+        if not name:
+            return
+        try:
+            save_template(name, selected)
+        except ValueError as exc:
+            messagebox.showerror("Invalid", str(exc))
+            return
+        self._refresh_templates()
+        for key, template_id in self.template_map.items():
+            if key.rsplit(" (", 1)[0] == name.strip():
+                self.template_choice.set(key)
+                break
+
+    def _delete_template(self):
+        template_id = self.template_map.get(self.template_choice.get())
+        if template_id is None:
+            return
+        if not messagebox.askyesno("Confirm", f"Delete template {self.template_choice.get()}?"):
+            return
+        delete_template(template_id)
+        self._refresh_templates()
+
+    def _target_samples(self):
+        project_id = self.get_project_id()
+        if not project_id:
+            messagebox.showerror("No Project", "Select a project first.")
+            return None
+        if self.apply_all.get():
+            target = list(self.sample_map.values())
+            if not target:
+                messagebox.showerror("Missing", "This project has no samples.")
+                return None
+            return target
+        sample_key = self.sample_choice.get()
+        if sample_key not in self.sample_map:
+            messagebox.showerror("Missing", "Select a sample.")
+            return None
+        return [self.sample_map[sample_key]]
+
+    def _selected_test_ids(self):
+        ids = []
+        for idx in self.test_list.curselection():
+            entry = self.test_map.get(self.test_list.get(idx))
+            if entry:
+                ids.append(entry[0])
+        return ids
+
+    def _assignment_options(self):
         override_cost = self.assign_cost.get().strip()
         if override_cost:
             try:
                 override_cost = float(override_cost)
             except ValueError:
                 messagebox.showerror("Invalid", "Override cost must be a number.")
-                return
+                return None
         else:
             override_cost = None
-
         status = self.assign_status.get().strip() or "scheduled"
-
-        conn = get_connection()
-        existing = conn.execute(
-            "SELECT test_id FROM sample_tests WHERE sample_id = ?",
-            (sample_id,),
-        ).fetchall()
-        existing_ids = {r["test_id"] for r in existing}
-
-        for idx in selected_indices:
-            test_key = self.test_list.get(idx)
-            if test_key not in self.test_map:
-                continue
-            test_id, default_cost = self.test_map[test_key]
-            if test_id in existing_ids:
-                continue
-            if override_cost is not None:
-                cost = override_cost
-            else:
-                cost = float(self._get_rate_price(test_id, default_cost))
-            conn.execute(
-                "INSERT INTO sample_tests (sample_id, test_id, cost, status) VALUES (?, ?, ?, ?)",
-                (sample_id, test_id, cost, status),
-            )
-        conn.commit()
-        conn.close()
-        self._refresh_assignments()
-        if self.on_tests_changed:
-            self.on_tests_changed()
+        return status, override_cost
 
     def _delete_selected(self):
         sel = self.tree.selection()
@@ -205,61 +303,11 @@ class TestsTab(ttk.Frame):
         assignment_id = int(sel[0])
         if not messagebox.askyesno("Confirm", "Delete this test assignment?"):
             return
-        conn = get_connection()
-        conn.execute("DELETE FROM sample_tests WHERE id = ?", (assignment_id,))
-        conn.commit()
-        conn.close()
-        self._refresh_assignments()
-        if self.on_tests_changed:
-            self.on_tests_changed()
-
-    def _get_rate_price(self, test_id, fallback):
-        project_id = self.get_project_id()
-        if not project_id:
-            return fallback
-        conn = get_connection()
-        row = conn.execute(
-            "SELECT billing_rate_id FROM projects WHERE id = ?",
-            (project_id,),
-        ).fetchone()
-        if not row or not row["billing_rate_id"]:
-            conn.close()
-            return fallback
-        rate_id = row["billing_rate_id"]
-        price_row = conn.execute(
-            "SELECT price FROM test_rates WHERE rate_id = ? AND test_id = ?",
-            (rate_id, test_id),
-        ).fetchone()
-        conn.close()
-        if price_row:
-            return price_row["price"]
-        return fallback
+        WORKING_SET.delete_sample_tests([assignment_id])
 
     def _sync_rate_prices(self, project_id):
-        conn = get_connection()
-        conn.execute(
-            """
-            UPDATE sample_tests
-            SET cost = (
-                SELECT tr.price
-                FROM test_rates tr
-                JOIN projects p ON p.billing_rate_id = tr.rate_id
-                WHERE p.id = ?
-                  AND tr.test_id = sample_tests.test_id
-            )
-            WHERE sample_id IN (SELECT id FROM samples WHERE project_id = ?)
-              AND EXISTS (
-                SELECT 1
-                FROM test_rates tr
-                JOIN projects p ON p.billing_rate_id = tr.rate_id
-                WHERE p.id = ?
-                  AND tr.test_id = sample_tests.test_id
-              )
-            """,
-            (project_id, project_id, project_id),
-        )
-        conn.commit()
-        conn.close()
+        if self.sample_tests.reprice(project_id) > 0:
+            WORKING_SET.reload("sample_tests")
 
     def _on_test_selected(self, _event):
         return
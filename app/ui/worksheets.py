@@ -3,8 +3,19 @@ import math
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
-from app.db import get_connection, now_iso
+from app.services.calibrations import (
+    CALIBRATED_WORKSHEETS,
+    calibrated_fields,
+    current_calibration_id,
+    strip_calibrated,
+)
+from app.services.concurrency import ConflictError
+from app.services.gradation import GradationCurve, refresh_gradation_metrics
+from app.services.nearby_results import invalidate_nearby_results
+from app.services.repository import ProjectRepository, WorksheetRunRepository
+from app.services.working_set import WORKING_SET, changed_sample_tests
 from app.services.worksheet_d1557 import (
+    QuadraticFit,
     calculate_d1557,
     compute_d1557_rows,
     export_d1557_pdf,
@@ -19,12 +30,16 @@ from app.services.worksheet_generic import (
     grain_size_section_flags,
     compute_grain_size,
     grain_curve_points,
+    grain_hydrometer_enabled,
     get_spec,
     loads_payload,
     map_results,
 )
+from app.ui.compaction_view import CompactionCanvas
+from app.ui.gradation_view import GRAPH_FRAME_MS, GRAPH_HOVER_PX, GradationOverlay
 
 D1557_LIKE_TESTS = {"Max Density", "698 Max", "C Max"}
+WORKSHEET_STATUSES = {"scheduled", "in progress", "completed"}
 
 
 def _norm_test_name(name):
@@ -51,15 +66,16 @@ def _is_grain_test_name(name):
 
 
 class WorksheetsTab(ttk.Frame):
-    def __init__(self, parent, get_project_id, on_saved=None):
+    def __init__(self, parent, get_project_id):
         super().__init__(parent)
         self.get_project_id = get_project_id
-        self.on_saved = on_saved
+        self.runs = WorksheetRunRepository()
         self.test_cols = 6
         self.current_test_name = None
         self.current_sample_id = None
         self.current_spec = None
         self.current_mode = "none"
+        self.loaded_versions = {}
         self.grain_include_wash = False
         self.grain_include_dry_sieve = False
         self.grain_include_hydrometer = False
@@ -67,9 +83,20 @@ class WorksheetsTab(ttk.Frame):
         self.grain_graph_window = None
         self.grain_graph_canvas = None
         self.grain_graph_info_var = tk.StringVar(value="")
+        self._grain_graph_curves = []
+        self._grain_hover_xy = None
+        self._grain_hover_job = None
         self.generic_input_vars = {}
         self.generic_comp_vars = {}
         self._build_ui()
+        WORKING_SET.subscribe(self._on_working_set_changed)
+
+    def _on_working_set_changed(self, changes):
+        sample_test_ids = changed_sample_tests(changes)
+        if sample_test_ids is not None:
+            self.apply_changes(sample_test_ids)
+        elif "samples" in changes or "sample_tests" in changes:
+            self.refresh()
 
     def _build_ui(self):
         wrap = ttk.Frame(self)
@@ -191,6 +218,16 @@ class WorksheetsTab(ttk.Frame):
             state=tk.DISABLED,
         )
         self.graph_btn.pack(side=tk.RIGHT, padx=(8, 0))
+        tk.Button(
+            btns,
+            text="Project Curves",
+            command=self._open_project_curves,
+            bg=action_bg,
+            fg=action_fg,
+            relief=tk.FLAT,
+            padx=10,
+            pady=6,
+        ).pack(side=tk.RIGHT, padx=(8, 0))
 
         self._set_editor_mode("none")
 
@@ -228,11 +265,21 @@ class WorksheetsTab(ttk.Frame):
         g_frame.pack(fill=tk.X, pady=4)
         ttk.Label(g_frame, text="Zero-Air-Void G values (comma separated):").pack(side=tk.LEFT)
         self.g_values_var = tk.StringVar(value="2.65,2.70,2.75")
-        ttk.Entry(g_frame, textvariable=self.g_values_var, width=20).pack(side=tk.LEFT, padx=6)
+        g_entry = ttk.Entry(g_frame, textvariable=self.g_values_var, width=20)
+        g_entry.pack(side=tk.LEFT, padx=6)
+        g_entry.bind("<KeyRelease>", lambda _e: self._show_d1557_chart())
 
         self.calc_var = tk.StringVar(value="Computed: -")
         ttk.Label(parent, textvariable=self.calc_var).pack(anchor=tk.W, pady=4)
 
+        # Points per test column and their running fit, updated one column at a time.
+        self._d1557_points = [None] * self.test_cols
+        self._d1557_fit = QuadraticFit()
+        self._d1557_g_values = [2.65]
+        self._d1557_calc = {}
+        self.d1557_chart = CompactionCanvas(parent)
+        self.d1557_chart.pack(fill=tk.X, pady=(2, 8))
+
     def _build_generic_editor(self, parent):
         self.generic_spec_var = tk.StringVar(value="")
         ttk.Label(parent, textvariable=self.generic_spec_var).pack(anchor=tk.W, pady=(2, 6))
@@ -285,7 +332,7 @@ class WorksheetsTab(ttk.Frame):
                     self.raw_vars[key].append(var)
                     e = ttk.Entry(parent, textvariable=var, width=10)
                     e.grid(row=r, column=c + 1, padx=2, pady=2)
-                    e.bind("<KeyRelease>", lambda _e: self._recompute_d1557())
+                    e.bind("<KeyRelease>", lambda _e, col=c: self._recompute_d1557(col))
                 else:
                     var = tk.StringVar()
                     self.calc_vars[key].append(var)
@@ -319,46 +366,82 @@ class WorksheetsTab(ttk.Frame):
     def refresh(self):
         for i in self.tree.get_children():
             self.tree.delete(i)
+        if not self.get_project_id():
+            return
+        for record in self._worksheet_records():
+            self.tree.insert("", tk.END, iid=record.id, tags=self._row_tags(record), values=self._row_values(record))
+
+    def apply_changes(self, sample_test_ids):
+        """
+        Redraws only the given worksheet rows after they changed, and flags
+        the open worksheet if another workstation saved over it.
+        """
         project_id = self.get_project_id()
-        if not project_id:
+        if not project_id or not sample_test_ids:
             return
-        conn = get_connection()
-        rows = conn.execute(
-            """
-            SELECT st.id, t.name AS test_name, s.sample_name, s.depth_raw, st.status,
-                   w.max_dry_density, w.opt_moisture,
-                   st.result_value, st.result_value2, st.result_unit2
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            LEFT JOIN astm1557_runs w ON w.sample_test_id = st.id
-            WHERE s.project_id = ?
-              AND (st.status IS NULL OR st.status IN ('scheduled', 'in progress', 'completed'))
-            ORDER BY s.sample_name
-            """,
-            (project_id,),
-        ).fetchall()
-        conn.close()
-        for r in rows:
-            tags = ("completed",) if (r["status"] or "").lower() == "completed" else ()
-            metric1 = r["max_dry_density"] if r["max_dry_density"] is not None else r["result_value"]
-            metric2 = r["opt_moisture"] if r["opt_moisture"] is not None else r["result_value2"]
-            if metric2 is None and (r["result_unit2"] or "").strip():
-                metric2 = r["result_unit2"]
-            self.tree.insert(
-                "",
-                tk.END,
-                iid=r["id"],
-                tags=tags,
-                values=(
-                    r["test_name"],
-                    r["sample_name"],
-                    r["depth_raw"] or "",
-                    r["status"],
-                    "" if metric1 is None else f"{metric1}",
-                    "" if metric2 is None else f"{metric2}",
-                ),
+        rows = {r.id: r for r in self._worksheet_records(sample_test_ids)}
+        stale = False
+        sid = self._selected_sample_test()
+        if sid in sample_test_ids and self.loaded_versions:
+            keys = self._version_checks(sid)
+            stale = any(
+                current != self.loaded_versions.get(table)
+                for (table, _key_col, _key), current in zip(keys, self.runs.versions(keys))
             )
+        added = False
+        for st_id in sample_test_ids:
+            row = rows.get(st_id)
+            if row is None:
+                if self.tree.exists(str(st_id)):
+                    self.tree.delete(str(st_id))
+            elif self.tree.exists(str(st_id)):
+                self.tree.item(str(st_id), tags=self._row_tags(row), values=self._row_values(row))
+            else:
+                added = True
+        if added:
+            self.refresh()
+        if stale:
+            self.mode_var.set("This worksheet was changed on another workstation. Reselect it to load the latest values.")
+
+    def _worksheet_records(self, ids=None):
+        return [r for r in WORKING_SET.sample_test_list(ids) if r.status is None or r.status in WORKSHEET_STATUSES]
+
+    def _row_tags(self, r):
+        return ("completed",) if (r.status or "").lower() == "completed" else ()
+
+    def _row_values(self, r):
+        # D1557 saves copy max dry density and optimum moisture into results 1 and 2.
+        metric1 = r.result_value
+        metric2 = r.result_value2
+        if metric2 is None and (r.result_unit2 or "").strip():
+            metric2 = r.result_unit2
+        return (
+            r.name,
+            r.sample_name,
+            r.depth_raw or "",
+            r.status,
+            "" if metric1 is None else f"{metric1}",
+            "" if metric2 is None else f"{metric2}",
+        )
+
+    def _version_checks(self, sid):
+        # Rows whose versions a save of this worksheet must still match.
+        checks = [("sample_tests", "id", sid)]
+        if self.current_mode == "grain" and self.current_sample_id:
+            checks.append(("grain_size_runs", "sample_id", self.current_sample_id))
+        elif self.current_mode == "generic":
+            checks.append(("worksheet_runs", "sample_test_id", sid))
+        return checks
+
+    def _save_checks(self, sid):
+        """Version checks that make a save fail if anybody saved this worksheet since it was loaded."""
+        return [
+            (table, key_col, key, self.loaded_versions.get(table))
+            for table, key_col, key in self._version_checks(sid)
+        ]
+
+    def _show_conflict(self, exc):
+        messagebox.showerror("Save Conflict", f"{exc}\nReselect the worksheet to load the latest values.")
 
     def _selected_sample_test(self):
         sel = self.tree.selection()
@@ -370,51 +453,21 @@ class WorksheetsTab(ttk.Frame):
         sid = self._selected_sample_test()
         if not sid:
             return
-        conn = get_connection()
-        test_row = conn.execute(
-            """
-            SELECT t.name AS test_name, st.sample_id
-            FROM sample_tests st JOIN tests t ON t.id = st.test_id
-            WHERE st.id = ?
-            """,
-            (sid,),
-        ).fetchone()
-        d1557_row = conn.execute(
-            "SELECT points_json FROM astm1557_runs WHERE sample_test_id = ?",
-            (sid,),
-        ).fetchone()
-        generic_row = conn.execute(
-            "SELECT worksheet_key, payload_json FROM worksheet_runs WHERE sample_test_id = ?",
-            (sid,),
-        ).fetchone()
-        grain_row = None
-        sample_test_names = []
-        if test_row:
-            sample_test_names = [
-                r["name"]
-                for r in conn.execute(
-                    """
-                    SELECT t.name
-                    FROM sample_tests st
-                    JOIN tests t ON t.id = st.test_id
-                    WHERE st.sample_id = ?
-                    """,
-                    (test_row["sample_id"],),
-                ).fetchall()
-            ]
-            grain_row = conn.execute(
-                "SELECT payload_json FROM grain_size_runs WHERE sample_id = ?",
-                (test_row["sample_id"],),
-            ).fetchone()
-        conn.close()
-
-        self.current_test_name = test_row["test_name"] if test_row else None
-        self.current_sample_id = int(test_row["sample_id"]) if test_row and test_row["sample_id"] is not None else None
+        # Which sample and test the row is comes from the working set; only
+        # the saved worksheet itself is read from the database.
+        record = WORKING_SET.sample_tests.get(sid)
+        self.current_test_name = record.name if record else None
+        self.current_sample_id = record.sample_id if record else None
         self.current_spec = get_spec(self.current_test_name) if self.current_test_name else None
+        self.loaded_versions = {
+            "sample_tests": record.row_version if record else None,
+            "worksheet_runs": None,
+            "grain_size_runs": None,
+        }
 
         self._clear_d1557_grid()
         self._clear_generic_grid()
-        if not test_row:
+        if not record:
             self._set_editor_mode("none")
             return
 
@@ -422,6 +475,7 @@ class WorksheetsTab(ttk.Frame):
             meta = self._d1557_meta(self.current_test_name)
             self._set_editor_mode("d1557")
             self.mode_var.set(f"{meta['astm']} worksheet mode (A/B/D/E/F -> C/G/H/I).")
+            d1557_row = self.runs.d1557_run(sid)
             if d1557_row and d1557_row["points_json"]:
                 self._load_saved_d1557_json(d1557_row["points_json"])
                 self._recompute_d1557()
@@ -430,6 +484,9 @@ class WorksheetsTab(ttk.Frame):
             return
 
         if _is_grain_test_name(self.current_test_name):
+            sample_test_names = [r.name for r in WORKING_SET.tests_for_sample(self.current_sample_id)]
+            grain_row = self.runs.grain_run(self.current_sample_id)
+            self.loaded_versions["grain_size_runs"] = grain_row["row_version"] if grain_row else None
             has_wash = any(_is_washed_sieve_name(name) for name in sample_test_names)
             has_sieve = any(_is_dry_sieve_name(name) for name in sample_test_names)
             has_hydrometer = any(_is_hydrometer_name(name) for name in sample_test_names)
@@ -437,6 +494,8 @@ class WorksheetsTab(ttk.Frame):
             payload = None
             if grain_row and grain_row["payload_json"]:
                 payload = loads_payload(grain_row["payload_json"])
+                # Runs saved without a library reference keep their own values.
+                payload.setdefault("calibration_id", "")
                 if self._grain_hydrometer_enabled(payload):
                     include_hydro = True
             self.grain_include_wash = include_wash
@@ -457,8 +516,12 @@ class WorksheetsTab(ttk.Frame):
             self._set_editor_mode("generic")
             self.mode_var.set(f"{self.current_test_name} worksheet mode.")
             self._render_generic_fields(self.current_spec)
+            generic_row = self.runs.worksheet_run(sid)
+            self.loaded_versions["worksheet_runs"] = generic_row["row_version"] if generic_row else None
             if generic_row and generic_row["payload_json"]:
-                self._load_generic_payload(loads_payload(generic_row["payload_json"]))
+                payload = loads_payload(generic_row["payload_json"])
+                payload.setdefault("calibration_id", "")
+                self._load_generic_payload(payload)
             self._recompute_generic()
             return
 
@@ -472,6 +535,10 @@ class WorksheetsTab(ttk.Frame):
         for key in self.calc_vars:
             for v in self.calc_vars[key]:
                 v.set("")
+        self._d1557_fit.clear()
+        self._d1557_points = [None] * self.test_cols
+        self._d1557_calc = {}
+        self._show_d1557_chart()
 
     def _load_saved_d1557_json(self, text):
         try:
@@ -490,35 +557,62 @@ class WorksheetsTab(ttk.Frame):
                         self.raw_vars[key][idx].set(f"{val}")
 
     def _collect_d1557_raw_rows(self):
-        rows = []
-        for i in range(self.test_cols):
-            rows.append(
-                {
-                    "A": self.raw_vars["A"][i].get().strip(),
-                    "B": self.raw_vars["B"][i].get().strip(),
-                    "D": self.raw_vars["D"][i].get().strip(),
-                    "E": self.raw_vars["E"][i].get().strip(),
-                    "F": self.raw_vars["F"][i].get().strip(),
-                }
-            )
-        return rows
+        return [self._d1557_raw_row(i) for i in range(self.test_cols)]
+
+    def _d1557_raw_row(self, i):
+        return {key: self.raw_vars[key][i].get().strip() for key in ("A", "B", "D", "E", "F")}
 
-    def _recompute_d1557(self):
+    def _recompute_d1557(self, column=None):
+        # A keystroke recomputes only its column. A new point is added to the
+        # running fit; replacing or dropping one rebuilds the fit from the
+        # remaining points, since subtracting a far-off point (a half-typed
+        # F can give G in the thousands) leaves rounding in the x^4 sums.
+        columns = range(self.test_cols) if column is None else (column,)
         try:
-            rows = compute_d1557_rows(self._collect_d1557_raw_rows())
+            rows = compute_d1557_rows([self._d1557_raw_row(i) for i in columns])
         except Exception:
             return
-        for i, r in enumerate(rows):
+        rebuild = column is None
+        if rebuild:
+            self._d1557_points = [None] * self.test_cols
+        for i, r in zip(columns, rows):
             self.calc_vars["C"][i].set("" if r["C"] is None else f"{r['C']:.2f}")
             self.calc_vars["G"][i].set("" if r["G"] is None else f"{r['G']:.2f}")
             self.calc_vars["H"][i].set("" if r["H"] is None else f"{r['H']:.2f}")
             self.calc_vars["I"][i].set("" if r["I"] is None else f"{r['I']:.2f}")
-        points = extract_points(rows)
-        calc = calculate_d1557(points)
+            old = self._d1557_points[i]
+            new = extract_points([r])[0] if r["G"] is not None and r["I"] is not None else None
+            if new != old:
+                if old is not None:
+                    rebuild = True
+                elif new is not None and not rebuild:
+                    self._d1557_fit.add(*new)
+                self._d1557_points[i] = new
+        points = [p for p in self._d1557_points if p is not None]
+        if rebuild:
+            self._d1557_fit.clear()
+            for p in points:
+                self._d1557_fit.add(*p)
+        calc = calculate_d1557(points, self._d1557_fit)
+        self._d1557_calc = calc
         self.calc_var.set(
             f"Computed: Max Dry Density={calc.get('max_dry_density') or '-'} pcf, "
             f"Opt Moisture={calc.get('opt_moisture') or '-'} %"
         )
+        self._show_d1557_chart()
+
+    def _show_d1557_chart(self):
+        try:
+            self._d1557_g_values = self._parse_g_values()
+        except ValueError:
+            pass
+        calc = self._d1557_calc
+        self.d1557_chart.show(
+            self._d1557_points,
+            self._d1557_fit.solve(),
+            self._d1557_g_values,
+            (calc.get("opt_moisture"), calc.get("max_dry_density")),
+        )
 
     def _render_generic_fields(self, spec):
         for child in self.generic_fields_container.winfo_children():
@@ -537,6 +631,10 @@ class WorksheetsTab(ttk.Frame):
             default_val = raw_field[3] if len(raw_field) > 3 else ""
             readonly = bool(raw_field[4]) if len(raw_field) > 4 else False
             emphasis = bool(raw_field[5]) if len(raw_field) > 5 else False
+            if key == "calibration_id" and not default_val and spec.get("key") in CALIBRATED_WORKSHEETS:
+                # New worksheets start on the calibration currently in effect.
+                cal_id = current_calibration_id(CALIBRATED_WORKSHEETS[spec["key"]])
+                default_val = str(cal_id) if cal_id else ""
             ttk.Label(self.generic_fields_container, text=label).grid(row=row, column=0, sticky=tk.W, padx=4, pady=2)
             var = tk.StringVar()
             self.generic_input_vars[key] = var
@@ -605,6 +703,14 @@ class WorksheetsTab(ttk.Frame):
             if k in payload:
                 var.set(str(payload.get(k, "")))
 
+    def _sync_calibrated_fields(self, payload):
+        # Fields supplied by a referenced calibration show the library values.
+        for key, value in calibrated_fields(payload).items():
+            var = self.generic_input_vars.get(key)
+            if var is not None and var.get() != value:
+                var.set(value)
+            payload[key] = value
+
     def _recompute_generic(self):
         if self.current_mode == "grain":
             payload = self._collect_generic_payload()
@@ -626,6 +732,7 @@ class WorksheetsTab(ttk.Frame):
                 )
                 self._load_generic_payload(payload)
                 payload = self._collect_generic_payload()
+            self._sync_calibrated_fields(payload)
             computed = compute_grain_size(payload)
             for key, var in self.generic_comp_vars.items():
                 val = computed.get(key)
@@ -652,6 +759,7 @@ class WorksheetsTab(ttk.Frame):
             self.generic_calc_var.set("Computed: -")
             return
         payload = self._collect_generic_payload()
+        self._sync_calibrated_fields(payload)
         computed = compute_generic_values(self.current_test_name, payload)
         for key, var in self.generic_comp_vars.items():
             val = computed.get(key)
@@ -693,33 +801,6 @@ class WorksheetsTab(ttk.Frame):
         lx = math.log10(max(x_mm, 0.001))
         return left + ((log_max - lx) / (log_max - log_min)) * width
 
-    def _grain_px_to_x(self, px, left, width, log_min, log_max):
-        frac = (px - left) / width
-        frac = max(0.0, min(1.0, frac))
-        lx = log_max - frac * (log_max - log_min)
-        return 10 ** lx
-
-    def _grain_interpolate_y(self, x_mm, points):
-        ordered = sorted(points, key=lambda p: p[0], reverse=True)
-        if not ordered:
-            return None
-        if x_mm >= ordered[0][0]:
-            return ordered[0][1]
-        if x_mm <= ordered[-1][0]:
-            return ordered[-1][1]
-        for i in range(len(ordered) - 1):
-            x1, y1 = ordered[i]
-            x2, y2 = ordered[i + 1]
-            if x1 >= x_mm >= x2 and x1 > 0 and x2 > 0:
-                lx1 = math.log10(x1)
-                lx2 = math.log10(x2)
-                lxm = math.log10(x_mm)
-                if abs(lx2 - lx1) <= 1e-12:
-                    return y1
-                t = (lxm - lx1) / (lx2 - lx1)
-                return y1 + t * (y2 - y1)
-        return None
-
     def _open_grain_graph(self):
         if self.current_mode != "grain":
             messagebox.showerror("Unavailable", "Open a grain-size worksheet first.")
@@ -739,25 +820,37 @@ class WorksheetsTab(ttk.Frame):
         canvas = tk.Canvas(win, bg="#f7fbff", highlightthickness=0)
         canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=(2, 10))
         self.grain_graph_canvas = canvas
-        canvas.bind("<Configure>", lambda _e: self._refresh_grain_graph())
+        canvas.bind("<Configure>", lambda _e: self._refresh_grain_graph(recompute=False))
         canvas.bind("<Motion>", self._on_grain_graph_hover)
         canvas.bind("<Leave>", self._on_grain_graph_leave)
         win.protocol("WM_DELETE_WINDOW", self._close_grain_graph)
         self._refresh_grain_graph()
 
+    def _open_project_curves(self):
+        project_id = self.get_project_id()
+        if not project_id:
+            messagebox.showerror("No Project", "Select a project first.")
+            return
+        GradationOverlay(self, project_id)
+
     def _close_grain_graph(self):
         if self.grain_graph_window and self.grain_graph_window.winfo_exists():
             self.grain_graph_window.destroy()
         self.grain_graph_window = None
         self.grain_graph_canvas = None
+        self._cancel_grain_hover()
 
-    def _refresh_grain_graph(self):
+    def _refresh_grain_graph(self, recompute=True):
         c = self.grain_graph_canvas
         if not c or not c.winfo_exists():
             return
         c.delete("all")
-        points = self._current_grain_points()
+        # A resize only re-projects the curve; the worksheet has not changed.
+        if recompute or not self._grain_graph_curves:
+            self._grain_graph_curves = [GradationCurve(self._current_grain_points())]
+        points = [p for curve in self._grain_graph_curves for p in curve.points]
         if not points:
+            c._grain_meta = None
             c.create_text(20, 20, anchor=tk.NW, text="No sieve/hydrometer curve points yet.", fill="#1b3d63")
             return
         w = max(300, c.winfo_width())
@@ -782,49 +875,99 @@ class WorksheetsTab(ttk.Frame):
             px = self._grain_log_to_px(s, gx, gw, log_min, log_max)
             c.create_line(px, gy, px, gy + gh, fill="#d4e1ee")
             c.create_text(px, gy + gh + 12, text=f"{s:g}", anchor=tk.N, fill="#23496f", font=("Segoe UI", 8))
-        ordered = sorted(points, key=lambda p: p[0], reverse=True)
-        poly = []
-        for x_mm, y_pf in ordered:
-            px = self._grain_log_to_px(x_mm, gx, gw, log_min, log_max)
-            py = gy + gh - (max(0.0, min(100.0, y_pf)) / 100.0) * gh
-            poly.extend([px, py])
-        c.create_line(*poly, fill="#0f4f8a", width=2, smooth=False, tags="curve")
-        for i in range(0, len(poly), 2):
-            c.create_oval(poly[i] - 2, poly[i + 1] - 2, poly[i] + 2, poly[i + 1] + 2, fill="#0f4f8a", outline="")
+        for curve in self._grain_graph_curves:
+            poly = []
+            for x_mm, y_pf in curve.points:
+                px = self._grain_log_to_px(x_mm, gx, gw, log_min, log_max)
+                py = gy + gh - (max(0.0, min(100.0, y_pf)) / 100.0) * gh
+                poly.extend([px, py])
+            if len(poly) >= 4:
+                c.create_line(*poly, fill="#0f4f8a", width=2, smooth=False, tags="curve")
+            for i in range(0, len(poly), 2):
+                c.create_oval(poly[i] - 2, poly[i + 1] - 2, poly[i] + 2, poly[i + 1] + 2, fill="#0f4f8a", outline="")
         c.create_text(gx + gw / 2, gy + gh + 30, text="Particle Size (mm, log scale)", fill="#8a1f1f", font=("Segoe UI", 9, "bold"))
         c.create_text(24, gy + gh / 2, text="Percent Finer (%)", angle=90, fill="#8a1f1f", font=("Segoe UI", 9, "bold"))
         c.create_text(gx + 6, gy + 8, text="Hover curve for exact values", anchor=tk.NW, fill="#4f6f8f", font=("Segoe UI", 8))
-        c._grain_meta = {"gx": gx, "gy": gy, "gw": gw, "gh": gh, "log_min": log_min, "log_max": log_max, "points": ordered}
+        # Hover marks are created once and moved, not redrawn per motion event.
+        hover_items = (
+            c.create_line(0, 0, 0, 0, fill="#b54a4a", dash=(3, 3), state=tk.HIDDEN),
+            c.create_line(0, 0, 0, 0, fill="#b54a4a", dash=(3, 3), state=tk.HIDDEN),
+            c.create_oval(0, 0, 0, 0, fill="#b54a4a", outline="", state=tk.HIDDEN),
+        )
+        c._grain_meta = {
+            "gx": gx,
+            "gy": gy,
+            "gw": gw,
+            "gh": gh,
+            "log_min": log_min,
+            "log_max": log_max,
+            "hover_items": hover_items,
+        }
 
     def _on_grain_graph_hover(self, event):
+        # Keep only the latest position; it is read once per frame.
+        self._grain_hover_xy = (event.x, event.y)
+        if self._grain_hover_job is None:
+            self._grain_hover_job = self.after(GRAPH_FRAME_MS, self._grain_hover_frame)
+
+    def _grain_hover_frame(self):
+        self._grain_hover_job = None
         c = self.grain_graph_canvas
-        if not c or not c.winfo_exists() or not hasattr(c, "_grain_meta"):
+        meta = getattr(c, "_grain_meta", None) if c and c.winfo_exists() else None
+        if not meta or self._grain_hover_xy is None:
             return
-        meta = c._grain_meta
         gx, gy, gw, gh = meta["gx"], meta["gy"], meta["gw"], meta["gh"]
-        x = event.x
-        y = event.y
-        c.delete("hover")
+        x, y = self._grain_hover_xy
         if x < gx or x > gx + gw or y < gy or y > gy + gh:
+            self._hide_grain_hover(c)
             self.grain_graph_info_var.set("Hover over the curve to read particle size and % finer.")
             return
-        x_mm = self._grain_px_to_x(x, gx, gw, meta["log_min"], meta["log_max"])
-        y_interp = self._grain_interpolate_y(x_mm, meta["points"])
-        if y_interp is None:
+        # Pixel x is linear in log10(size), so no log is taken per event.
+        frac = (x - gx) / gw
+        log_size = meta["log_max"] - frac * (meta["log_max"] - meta["log_min"])
+        best = None
+        for curve in self._grain_graph_curves:
+            y_interp = curve.percent_at_log(log_size)
+            if y_interp is None:
+                continue
+            py_line = gy + gh - (max(0.0, min(100.0, y_interp)) / 100.0) * gh
+            if best is None or abs(y - py_line) < abs(y - best[1]):
+                best = (y_interp, py_line, curve)
+        if best is None:
             return
-        py_line = gy + gh - (max(0.0, min(100.0, y_interp)) / 100.0) * gh
-        if abs(y - py_line) > 14:
+        y_interp, py_line, curve = best
+        if abs(y - py_line) > GRAPH_HOVER_PX:
+            self._hide_grain_hover(c)
             self.grain_graph_info_var.set("Move closer to the blue sieve line for a reading.")
             return
-        c.create_line(x, gy, x, gy + gh, fill="#b54a4a", dash=(3, 3), tags="hover")
-        c.create_line(gx, py_line, gx + gw, py_line, fill="#b54a4a", dash=(3, 3), tags="hover")
-        c.create_oval(x - 4, py_line - 4, x + 4, py_line + 4, fill="#b54a4a", outline="", tags="hover")
-        self.grain_graph_info_var.set(f"Particle Size: {x_mm:.4g} mm   |   Percent Finer: {y_interp:.2f}%")
+        v_line, h_line, dot = meta["hover_items"]
+        c.coords(v_line, x, gy, x, gy + gh)
+        c.coords(h_line, gx, py_line, gx + gw, py_line)
+        c.coords(dot, x - 4, py_line - 4, x + 4, py_line + 4)
+        for item in meta["hover_items"]:
+            c.itemconfigure(item, state=tk.NORMAL)
+        label = f"{curve.label}   |   " if curve.label else ""
+        self.grain_graph_info_var.set(
+            f"{label}Particle Size: {10 ** log_size:.4g} mm   |   Percent Finer: {y_interp:.2f}%"
+        )
+
+    def _hide_grain_hover(self, c):
+        meta = getattr(c, "_grain_meta", None)
+        if meta:
+            for item in meta["hover_items"]:
+                c.itemconfigure(item, state=tk.HIDDEN)
+
+    def _cancel_grain_hover(self):
+        if self._grain_hover_job is not None:
+            self.after_cancel(self._grain_hover_job)
+            self._grain_hover_job = None
+        self._grain_hover_xy = None
 
     def _on_grain_graph_leave(self, _event):
+        self._cancel_grain_hover()
         c = self.grain_graph_canvas
         if c and c.winfo_exists():
-            c.delete("hover")
+            self._hide_grain_hover(c)
         self.grain_graph_info_var.set("Hover over the curve to read particle size and % finer.")
 
     def _parse_g_values(self):
@@ -840,18 +983,8 @@ class WorksheetsTab(ttk.Frame):
         return values or [2.65]
 
     def _selection_is_d1557(self, sample_test_id):
-        conn = get_connection()
-        row = conn.execute(
-            """
-            SELECT t.name AS test_name
-            FROM sample_tests st
-            JOIN tests t ON t.id = st.test_id
-            WHERE st.id = ?
-            """,
-            (sample_test_id,),
-        ).fetchone()
-        conn.close()
-        return bool(row and row["test_name"] in D1557_LIKE_TESTS)
+        record = WORKING_SET.sample_tests.get(sample_test_id)
+        return bool(record and record.name in D1557_LIKE_TESTS)
 
     def _d1557_meta(self, test_name):
         if test_name == "698 Max":
@@ -893,89 +1026,54 @@ class WorksheetsTab(ttk.Frame):
             "tests": [{"A": r["A"], "B": r["B"], "D": r["D"], "E": r["E"], "F": r["F"]} for r in rows],
             "g_values": g_values,
         }
-        conn = get_connection()
-        conn.execute(
-            """
-            INSERT INTO astm1557_runs (sample_test_id, points_json, max_dry_density, opt_moisture, updated_at)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(sample_test_id) DO UPDATE SET
-                points_json = excluded.points_json,
-                max_dry_density = excluded.max_dry_density,
-                opt_moisture = excluded.opt_moisture,
-                updated_at = excluded.updated_at
-            """,
-            (sid, json.dumps(payload), calc.get("max_dry_density"), calc.get("opt_moisture"), now_iso()),
-        )
-        conn.execute(
-            """
-            UPDATE sample_tests
-            SET result_value = ?, result_unit = 'pcf',
-                result_value2 = ?, result_unit2 = '%',
-                status = 'completed'
-            WHERE id = ?
-            """,
-            (calc.get("max_dry_density"), calc.get("opt_moisture"), sid),
-        )
-        conn.commit()
-        conn.close()
+        try:
+            self.runs.save_d1557(
+                sid,
+                json.dumps(payload),
+                calc.get("max_dry_density"),
+                calc.get("opt_moisture"),
+                self._save_checks(sid),
+            )
+        except ConflictError as exc:
+            self._show_conflict(exc)
+            return
         self._recompute_d1557()
-        self.refresh()
-        self._reselect_and_notify(sid)
+        self._reselect_after_save(sid)
 
     def _compute_save_generic(self, sid):
         payload = self._collect_generic_payload()
         computed = compute_generic_values(self.current_test_name, payload)
         mapped = map_results(self.current_test_name, payload, computed)
-        conn = get_connection()
-        conn.execute(
-            """
-            INSERT INTO worksheet_runs (sample_test_id, worksheet_key, payload_json, updated_at)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(sample_test_id) DO UPDATE SET
-                worksheet_key = excluded.worksheet_key,
-                payload_json = excluded.payload_json,
-                updated_at = excluded.updated_at
-            """,
-            (sid, self.current_spec["key"], dumps_payload(payload), now_iso()),
-        )
-        conn.execute(
-            """
-            UPDATE sample_tests
-            SET result_value = ?, result_unit = ?, result_value2 = ?, result_unit2 = ?,
-                result_value3 = ?, result_unit3 = ?, result_value4 = ?, result_unit4 = ?,
-                result_notes = ?, status = 'completed'
-            WHERE id = ?
-            """,
-            (
-                mapped["result_value"],
-                mapped["result_unit"],
-                mapped["result_value2"],
-                mapped["result_unit2"],
-                mapped["result_value3"],
-                mapped["result_unit3"],
-                mapped["result_value4"],
-                mapped["result_unit4"],
-                mapped["result_notes"],
+        try:
+            self.runs.save_worksheet(
                 sid,
-            ),
-        )
-        conn.commit()
-        conn.close()
+                self.current_spec["key"],
+                dumps_payload(strip_calibrated(payload)),
+                mapped,
+                self._save_checks(sid),
+            )
+        except ConflictError as exc:
+            self._show_conflict(exc)
+            return
         self._recompute_generic()
-        self.refresh()
-        self._reselect_and_notify(sid)
-
-    def _reselect_and_notify(self, sid):
+        self._reselect_after_save(sid)
+
+    def _reselect_after_save(self, sid, sample_ids=None):
+        # This save moved the row versions; forget them first so the reload
+        # is not taken for another workstation's change.
+        self.loaded_versions = {}
+        invalidate_nearby_results([self.get_project_id()])
+        if sample_ids:
+            WORKING_SET.reload("samples", sample_ids)
+        else:
+            WORKING_SET.reload("sample_tests", [sid])
         if self.tree.exists(str(sid)):
             self.tree.selection_set(str(sid))
             self.tree.focus(str(sid))
             self._on_select(None)
-        if self.on_saved:
-            self.on_saved()
 
     def _grain_hydrometer_enabled(self, payload):
-        raw = str(payload.get("hydro_enabled", "")).strip().lower()
-        return raw in {"yes", "y", "true", "1"}
+        return grain_hydrometer_enabled(payload)
 
     def _on_hydrometer_toggle(self, _event=None):
         if self.current_mode != "grain":
@@ -985,20 +1083,6 @@ class WorksheetsTab(ttk.Frame):
             messagebox.showerror("Not Allowed", "Hydrometer requires dry sieve data.")
         self._recompute_generic()
 
-    def _grain_test_cost(self, conn, sample_id, test_name):
-        row = conn.execute(
-            """
-            SELECT COALESCE(tr.price, t.default_cost) AS cost
-            FROM samples s
-            JOIN projects p ON p.id = s.project_id
-            JOIN tests t ON t.name = ?
-            LEFT JOIN test_rates tr ON tr.rate_id = p.billing_rate_id AND tr.test_id = t.id
-            WHERE s.id = ?
-            """,
-            (test_name, sample_id),
-        ).fetchone()
-        return float(row["cost"]) if row and row["cost"] is not None else 0.0
-
     def _compute_save_grain(self, sid):
         if not self.current_sample_id:
             messagebox.showerror("Missing", "Could not resolve sample for this worksheet.")
@@ -1009,101 +1093,50 @@ class WorksheetsTab(ttk.Frame):
             hydro_enabled = False
             payload["hydro_enabled"] = "no"
         computed = compute_grain_size(payload)
-        conn = get_connection()
-        conn.execute(
-            """
-            INSERT INTO grain_size_runs (sample_id, payload_json, updated_at)
-            VALUES (?, ?, ?)
-            ON CONFLICT(sample_id) DO UPDATE SET
-                payload_json = excluded.payload_json,
-                updated_at = excluded.updated_at
-            """,
-            (self.current_sample_id, dumps_payload(payload), now_iso()),
-        )
-        hydro_test_row = conn.execute("SELECT id FROM tests WHERE name = 'Hydrometer'").fetchone()
-        if hydro_test_row:
-            hydro_test_id = int(hydro_test_row["id"])
-            existing_hydro = conn.execute(
-                "SELECT id FROM sample_tests WHERE sample_id = ? AND test_id = ?",
-                (self.current_sample_id, hydro_test_id),
-            ).fetchone()
-            if hydro_enabled and not existing_hydro:
-                hydro_cost = self._grain_test_cost(conn, self.current_sample_id, "Hydrometer")
-                conn.execute(
-                    """
-                    INSERT INTO sample_tests (sample_id, test_id, cost, status)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (self.current_sample_id, hydro_test_id, hydro_cost, "scheduled"),
-                )
-            if not hydro_enabled and existing_hydro:
-                conn.execute("DELETE FROM sample_tests WHERE id = ?", (existing_hydro["id"],))
-        rows = conn.execute(
-            """
-            SELECT st.id, t.name
-            FROM sample_tests st
-            JOIN tests t ON t.id = st.test_id
-            WHERE st.sample_id = ?
-            """,
-            (self.current_sample_id,),
-        ).fetchall()
-        for r in rows:
-            test_name = r["name"]
-            st_id = r["id"]
-            if test_name == "-200 Washed Sieve":
-                conn.execute(
-                    """
-                    UPDATE sample_tests
-                    SET result_value = ?, result_unit = '%', result_notes = ?, status = 'completed'
-                    WHERE id = ?
-                    """,
-                    (
-                        computed.get("wash_o_passing200"),
-                        None,
-                        st_id,
-                    ),
-                )
-            elif test_name == "Sieve Part. Analysis":
-                pass_no200 = computed.get("sieve_pct_pass_no200")
-                if pass_no200 is None:
-                    pass_no200 = computed.get("wash_o_passing200")
-                conn.execute(
-                    """
-                    UPDATE sample_tests
-                    SET result_value = NULL, result_unit = ?, result_value2 = ?, result_unit2 = '%',
-                        result_notes = ?, status = 'completed'
-                    WHERE id = ?
-                    """,
-                    (
-                        (payload.get("sieve_uscs_class") or "").strip(),
-                        pass_no200,
-                        "Combined grain-size worksheet",
-                        st_id,
-                    ),
-                )
-            elif test_name == "Hydrometer":
-                if not hydro_enabled:
-                    continue
-                summary = computed.get("hydro_total_1440")
-                if summary is None:
-                    summary = computed.get("hydro_total_250")
-                conn.execute(
-                    """
-                    UPDATE sample_tests
-                    SET result_value = ?, result_unit = '%', result_notes = ?, status = 'completed'
-                    WHERE id = ?
-                    """,
-                    (
-                        summary,
-                        "Hydrometer from combined grain-size worksheet",
-                        st_id,
-                    ),
-                )
-        conn.commit()
-        conn.close()
+        pass_no200 = computed.get("sieve_pct_pass_no200")
+        if pass_no200 is None:
+            pass_no200 = computed.get("wash_o_passing200")
+        results = {
+            "-200 Washed Sieve": {
+                "result_value": computed.get("wash_o_passing200"),
+                "result_unit": "%",
+                "result_notes": None,
+                "status": "completed",
+            },
+            "Sieve Part. Analysis": {
+                "result_value": None,
+                "result_unit": (payload.get("sieve_uscs_class") or "").strip(),
+                "result_value2": pass_no200,
+                "result_unit2": "%",
+                "result_notes": "Combined grain-size worksheet",
+                "status": "completed",
+            },
+        }
+        if hydro_enabled:
+            summary = computed.get("hydro_total_1440")
+            if summary is None:
+                summary = computed.get("hydro_total_250")
+            results["Hydrometer"] = {
+                "result_value": summary,
+                "result_unit": "%",
+                "result_notes": "Hydrometer from combined grain-size worksheet",
+                "status": "completed",
+            }
+        try:
+            self.runs.save_grain(
+                self.current_sample_id,
+                dumps_payload(strip_calibrated(payload)),
+                hydro_enabled,
+                results,
+                self._save_checks(sid),
+            )
+        except ConflictError as exc:
+            self._show_conflict(exc)
+            return
+        refresh_gradation_metrics(sample_ids=[self.current_sample_id])
         self._recompute_generic()
-        self.refresh()
-        self._reselect_and_notify(sid)
+        # The save can add or drop this sample's Hydrometer assignment.
+        self._reselect_after_save(sid, [self.current_sample_id])
 
     def _export_pdf(self):
         sid = self._selected_sample_test()
@@ -1122,19 +1155,16 @@ class WorksheetsTab(ttk.Frame):
         messagebox.showerror("Not Implemented", "Worksheet PDF export is not implemented for this test.")
 
     def _worksheet_project_sample_row(self, sid):
-        conn = get_connection()
-        row = conn.execute(
-            """
-            SELECT p.file_number, p.job_name, s.sample_name, s.depth_raw
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN projects p ON p.id = s.project_id
-            WHERE st.id = ?
-            """,
-            (sid,),
-        ).fetchone()
-        conn.close()
-        return row
+        record = WORKING_SET.sample_tests.get(sid)
+        project = WORKING_SET.project
+        if record is None or project is None:
+            return None
+        return {
+            "file_number": project.file_number,
+            "job_name": project.job_name,
+            "sample_name": record.sample_name,
+            "depth_raw": record.depth_raw,
+        }
 
     def _export_d1557_pdf(self, sid):
         rows = compute_d1557_rows(self._collect_d1557_raw_rows())
@@ -1231,25 +1261,9 @@ class WorksheetsTab(ttk.Frame):
             return
         from app.services.worksheet_generic import export_grouped_results_pdf
 
-        conn = get_connection()
-        project = conn.execute(
-            "SELECT file_number, job_name FROM projects WHERE id = ?",
-            (project_id,),
-        ).fetchone()
-        rows = conn.execute(
-            """
-            SELECT s.sample_name, s.depth_raw, st.result_value, st.result_unit,
-                   st.result_value2, st.result_unit2, st.result_value3, st.result_unit3,
-                   st.result_unit4
-            FROM sample_tests st
-            JOIN samples s ON s.id = st.sample_id
-            JOIN tests t ON t.id = st.test_id
-            WHERE s.project_id = ? AND t.name = ?
-            ORDER BY s.sample_name, s.depth_raw
-            """,
-            (project_id, test_name),
-        ).fetchall()
-        conn.close()
+        projects = ProjectRepository()
+        project = projects.get(project_id)
+        rows = projects.results_for_test(project_id, test_name)
         if not project:
             messagebox.showerror("Missing Project", "Project record not found.")
             return
@@ -1369,6 +1383,7 @@ class WorksheetsTab(ttk.Frame):
                     ("hydro_hydrostatic_moisture", "Hydrostatic Moisture Content", "%"),
                     ("hydro_w", "Oven Dry Weight W (direct override)", "g", "", False, False),
                     ("hydro_pct_finer_no10", "Fraction Finer than #10", "", "1.0", False, False),
+                    ("calibration_id", "Hydrometer Calibration ID", "", "", False, False),
                     ("hydro_cal_t1", "Cal Temp 1", "C", "20.5", False, False),
                     ("hydro_cal_c1", "Cal Corr 1", "", "0.0025", False, False),
                     ("hydro_cal_t2", "Cal Temp 2", "C", "21.5", False, False),